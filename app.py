@@ -2,27 +2,37 @@ import os
 import urllib.parse
 import json
 import re
+import asyncio
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import logging.config
+from contextlib import asynccontextmanager
 
-import requests
-from fastapi import FastAPI, BackgroundTasks, Request, Form
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Request, Form
+from fastapi.responses import JSONResponse, Response
 
 from dotenv import load_dotenv
 
-from langchain.schema import SystemMessage, HumanMessage, AIMessage
-from langfuse import Langfuse
-from slack_sdk import WebClient
+from slack_sdk.web.async_client import AsyncWebClient
 from slack_sdk.signature import SignatureVerifier
 from slack_sdk.errors import SlackApiError
 
 from langfuse.callback import CallbackHandler
 
 from llm.agents import new_conversional_agent
+from llm.clients import SLACK_API_URL
 from data_models.models import *
 from llm.memory.slack_memory import slack_to_llm_memory
+from llm.callbacks.slack_streaming import SLACK_STREAMING, SlackStreamingCallbackHandler
 from data_models.constants import LOADING_INDICATOR, LOADING_BLOCK, EXAMPLE_PROMPTS
+from slack_bot.worker import EventQueue
+from slack_bot.dedup import EventDeduplicator
+from slack_bot.users import SlackUserCache
+from slack_bot.history import new_slack_history_store
+from slack_bot.feedback import FeedbackPipeline
+from slack_bot.downloads import SlackDownloadCache
+from llm.callbacks.metrics import METRICS_CALLBACK_HANDLER
+from llm.vectorstores.scope import vector_store_scope
+from monitoring.tracing import metrics_payload, span, traced
 
 
 logging.config.fileConfig("logging.conf", disable_existing_loggers=False)
@@ -37,14 +47,39 @@ load_dotenv()
 SLACK_BOT_OAUTH_TOKEN = os.getenv("SLACK_BOT_OAUTH_TOKEN")
 SLACK_BOT_ID = os.getenv("SLACK_BOT_ID")
 SLACK_SIGNING_SECRET = os.getenv("SLACK_SIGNING_SECRET")
-SLACK_CLIENT = WebClient(token=SLACK_BOT_OAUTH_TOKEN)
+SLACK_CLIENT = AsyncWebClient(token=SLACK_BOT_OAUTH_TOKEN, base_url=SLACK_API_URL)
 SLACK_BOT_DISPLAY_NAME = os.getenv("SLACK_BOT_DISPLAY_NAME")
 ENVIRONMENT = os.getenv("ENVIRONMENT", "Development")
 
+SIGNATURE_VERIFIER = SignatureVerifier(SLACK_SIGNING_SECRET)
+EVENT_QUEUE = EventQueue()
+EVENT_DEDUPLICATOR = EventDeduplicator()
+SLACK_HISTORY = new_slack_history_store(SLACK_CLIENT)
+SLACK_USER_CACHE = SlackUserCache(
+    SLACK_CLIENT, bot_display_name=SLACK_BOT_DISPLAY_NAME, bot_user_id=SLACK_BOT_ID
+)
+SLACK_DOWNLOADS = SlackDownloadCache(SLACK_BOT_OAUTH_TOKEN)
+
+FEEDBACK_PIPELINE = FeedbackPipeline(
+    fetch_chat_history=lambda channel_id: retrive_slack_messages(channel_id)
+)
+
 langfuse_handler = CallbackHandler()
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await EVENT_QUEUE.start()
+    await SLACK_USER_CACHE.start()
+    await FEEDBACK_PIPELINE.start()
+    await SLACK_DOWNLOADS.start()
+    yield
+    await EVENT_QUEUE.stop()
+    await FEEDBACK_PIPELINE.stop()
+    await SLACK_DOWNLOADS.stop()
+
+
+app = FastAPI(lifespan=lifespan)
 is_dev_env = ENVIRONMENT
 slack_history_limit = 5
 
@@ -56,6 +91,13 @@ def healthcheck():
     )
 
 
+# prometheus scrape endpoint, also without langfuse
+@app.get("/metrics")
+def metrics():
+    payload, content_type = metrics_payload()
+    return Response(content=payload, media_type=content_type)
+
+
 @app.post("/example-prompts/")
 async def get_example_prompts():
     # Sample array of strings
@@ -104,34 +146,26 @@ async def slack_rating(payload: str = Form(...)):
         if rating:
             break
     if rating:
-        langfuse_client = Langfuse()
         # Convert rating text to a numerical value (customize as needed)
         rating_value = {"Good": 3, "Ok": 2, "Bad": 1}.get(rating, 0)
 
-        # Create a trace in Langfuse
+        # Create a trace in Langfuse, batched in the background
         # On dev, all rating is logged
         # On prod, only the bad feedback + last 5 slack messages
         if is_dev_env or rating_value == 1:
-            if not is_dev_env:
-                channel_id = json_payload["container"]["channel_id"]
-                latest_slack_messages = retrive_slack_messages(channel_id)
-                metadata["chat_history"] = latest_slack_messages
-            trace = langfuse_client.trace(
-                name=f"slack-rating-{time_stamp}",
-                input={"message_text": message_text},
-                metadata=metadata,
-            )
-            # Send the score to Langfuse with the message text as a comment
-            trace.score(
-                name="quality",
-                value=rating_value,
-                comment=f"User {user_id} rated: {rating}. Message: {message_text}",
-                id=f"rating_{user_id}_{time_stamp}",  # Unique idempotency key
+            FEEDBACK_PIPELINE.submit(
+                {
+                    "name": f"slack-rating-{time_stamp}",
+                    "message_text": message_text,
+                    "metadata": metadata,
+                    "value": rating_value,
+                    "comment": f"User {user_id} rated: {rating}. Message: {message_text}",
+                    "id": f"rating_{user_id}_{time_stamp}",
+                    "channel_id": (
+                        None if is_dev_env else json_payload["container"]["channel_id"]
+                    ),
+                }
             )
-
-            # Optionally, get the trace URL for logging or debugging
-            # trace_url = trace.get_trace_url()
-            # print(f"Trace URL: {trace_url}")
     else:
         print("No rating found")
 
@@ -141,23 +175,49 @@ async def slack_rating(payload: str = Form(...)):
 # must return given payload for slack challenge:
 # slack retry behaviour
 # https://api.slack.com/apis/connections/events-api#retries
+# only verifies and enqueues the event, so slack gets its ack within 3 seconds
 @app.post("/slack/event/")
-async def new_slack_event(
-    request: Request, payload: dict, background_tasks: BackgroundTasks
-):
-    signature_verifier = SignatureVerifier(SLACK_SIGNING_SECRET)
+async def new_slack_event(request: Request, payload: dict):
     request_body = await request.body()
     timestamp = request.headers.get("x-slack-request-timestamp")
     signature = request.headers.get("x-slack-signature")
 
-    if not signature_verifier.is_valid(
-        body=request_body, timestamp=timestamp, signature=signature
-    ):
+    with span("slack_signature_verification"):
+        is_valid = SIGNATURE_VERIFIER.is_valid(
+            body=request_body, timestamp=timestamp, signature=signature
+        )
+    if not is_valid:
         return JSONResponse(
             content={"error": "Invalid signature"}, status_code=401
         )  # Unauthorized
 
+    if "event" in payload:
+        # retries of slack reuse the event_id, only the first delivery is processed
+        event_id = payload.get("event_id")
+        with span("slack_event_dedup"):
+            is_new = not event_id or await asyncio.to_thread(
+                EVENT_DEDUPLICATOR.claim, event_id
+            )
+        if not is_new:
+            logger.info(
+                f"Skipping duplicate slack event {event_id}, retry {request.headers.get('x-slack-retry-num')}"
+            )
+            return JSONResponse(content=payload)
+
+        if not EVENT_QUEUE.submit(slack_event_handler, payload):
+            if event_id:
+                await asyncio.to_thread(EVENT_DEDUPLICATOR.release, event_id)
+            # slack will retry the event later on a non 2xx response
+            return JSONResponse(content={"error": "Busy"}, status_code=503)
+
+    return JSONResponse(content=payload)
+
+
+@traced("slack_event")
+async def slack_event_handler(payload):
     try:
+        await SLACK_HISTORY.record_event(payload["event"])
+
         if "has joined the channel" in payload["event"]["text"]:
             await new_user_handler(payload)
 
@@ -166,65 +226,55 @@ async def new_slack_event(
             # Extract all user IDs from the message using the regex
             user_id_matches = re.findall(r"<@(\w+)>", payload["event"]["text"])
 
-            bot_name_mentioned = False
-
-            # call slack in parallel for each match and check if bot was mentioned
-            with ThreadPoolExecutor() as executor:
-                futures = {
-                    executor.submit(check_user, user_id): user_id
-                    for user_id in user_id_matches
-                }
-                for future in as_completed(futures):
-                    if future.result():
-                        bot_name_mentioned = True
-
-            if bot_name_mentioned:
+            # served from the user cache, slack is only asked for unknown users
+            with span("slack_check_user"):
+                is_bot_mentioned = await SLACK_USER_CACHE.is_bot_mentioned(
+                    user_id_matches
+                )
+            if is_bot_mentioned:
                 prompt_parameters = PromptParameters(
                     prompt=payload["event"]["text"],
                     space_id="~622753c759c0740069daf1e1",
                     source={"name": "slack", "id": payload["event"]["channel"]},
+                    message_ts=payload["event"].get("ts"),
+                    thread_ts=payload["event"].get("thread_ts"),
                 )
 
-                SLACK_CLIENT.chat_postMessage(
-                    channel=prompt_parameters.source.id,
-                    blocks=LOADING_BLOCK,
-                    text=LOADING_INDICATOR,
-                )
+                with span("slack_post_loading"):
+                    loading_message = await SLACK_CLIENT.chat_postMessage(
+                        channel=prompt_parameters.source.id,
+                        blocks=LOADING_BLOCK,
+                        text=LOADING_INDICATOR,
+                    )
+                prompt_parameters.loading_message_ts = loading_message["ts"]
+                await SLACK_HISTORY.record_response(loading_message)
 
                 # Check if files are attached
                 if "files" in payload["event"]:
-                    for file_info in payload["event"]["files"]:
-                        file_url = file_info["url_private_download"]
-                        file_name = file_info["name"]
+                    files = payload["event"]["files"]
+                    for file_info in files:
                         logger.info(
-                            f"Handling file: {prompt_parameters.prompt} | {file_name}"
-                        )
-                        background_tasks.add_task(
-                            download_handler,
-                            prompt_parameters,
-                            file_url,
-                            file_name,
+                            f"Handling file: {prompt_parameters.prompt} | {file_info['name']}"
                         )
+                    with span("slack_file_download"):
+                        file_paths = await SLACK_DOWNLOADS.fetch_all(files)
+                    try:
+                        await download_handler(prompt_parameters, file_paths)
+                    finally:
+                        # pinned against eviction until the agent is done with them
+                        SLACK_DOWNLOADS.release(file_paths)
                 else:
-                    # don't use endpoint function because they will not run in the background
-                    background_tasks.add_task(prompt_handler, prompt_parameters)
-            else:
-                return
+                    await prompt_handler(prompt_parameters)
 
     # slack will generate a new event for the bot message, but this except will ignore it
     except KeyError:
         pass
     except Exception as error:
-        print(error)
+        logger.error(f"Slack event error: {error}")
 
-    return JSONResponse(content=payload)
 
-
-def retrive_slack_messages(channel_id):
-    result = SLACK_CLIENT.conversations_history(
-        channel=channel_id, limit=slack_history_limit
-    )
-    messages = result["messages"]
+async def retrive_slack_messages(channel_id):
+    messages = await SLACK_HISTORY.latest(channel_id, slack_history_limit)
     formatted_messages = []
     for message in messages:
         text = message.get("text", "")
@@ -238,21 +288,11 @@ def retrive_slack_messages(channel_id):
     return formatted_messages
 
 
-def check_user(user_id):
-    response = SLACK_CLIENT.users_info(user=user_id)
-    if response["ok"]:
-        user = response["user"]
-        # Check if the user is a bot and has a specific real name
-        if user["is_bot"] and user["profile"]["real_name"] == SLACK_BOT_DISPLAY_NAME:
-            return True
-    return False
-
-
 async def new_user_handler(payload):
     examples = await get_example_prompts()
     user_id = payload["event"]["user"]
     try:
-        SLACK_CLIENT.chat_postEphemeral(
+        await SLACK_CLIENT.chat_postEphemeral(
             user=user_id,
             channel=payload["event"]["channel"],
             text=f"Welcome to the channel, <@{user_id}>!",
@@ -272,75 +312,89 @@ async def new_user_handler(payload):
         print(f"Error: {e}")
 
 
-def download_handler(prompt_parameters, file_url, file_name):
-    resp = requests.get(
-        file_url,
-        headers={"Authorization": "Bearer %s" % SLACK_BOT_OAUTH_TOKEN},
-        allow_redirects=True,
-        stream=True,
-    )
-    if resp.status_code == 200:
-        file_path = f"downloads/{file_name}"
-
-        if not os.path.exists("downloads"):
-            os.makedirs("downloads")
-
-        with open(file_path, "wb") as f:
-            for chunk in resp.iter_content(chunk_size=8192):
-                f.write(chunk)
-
+# all files of a message are handled by one agent run, the file tools take them as batch
+async def download_handler(prompt_parameters, file_paths):
+    if None in file_paths:
+        logger.error(
+            f"Couldnt obtain {file_paths.count(None)} of {len(file_paths)} files"
+        )
+    file_paths = [file_path for file_path in file_paths if file_path]
+    if file_paths:
         file_translation_params = {
             "slack_channel_id": prompt_parameters.source.id,
-            "file_path": file_path,
+            "file_paths": file_paths,
         }
 
-        memory_params = history_handler(prompt_parameters)
-        conversional_agent = new_conversional_agent(memory=memory_params[1])
+        memory = await history_handler(prompt_parameters)
+        with span("agent_construction"):
+            conversional_agent = new_conversional_agent(memory=memory)
 
         prompt = f"""
-        {memory_params[0]}
         System: Parameters for file tools: {file_translation_params}, Ignore any previous errors/warnings
         Human: {prompt_parameters.prompt}
-        Assistant:
         """
 
         try:
-            conversional_agent.run(input=prompt, callbacks=[langfuse_handler])
+            with span("agent_run"), vector_store_scope(thread_scope(prompt_parameters)):
+                await conversional_agent.arun(
+                    input=prompt,
+                    callbacks=agent_callbacks(prompt_parameters, [langfuse_handler]),
+                )
         except Exception as e:
             logger.error(f"Agent error: {str(e)}")
-            slack_error_notification(prompt_parameters)
+            await slack_error_notification(prompt_parameters)
     else:
         logger.error(f"Couldnt obtain file for agent tools")
-        slack_error_notification(prompt_parameters)
-
+        await slack_error_notification(prompt_parameters)
 
-def prompt_handler(prompt_parameters: PromptParameters):
-    memory_params = history_handler(prompt_parameters)
-    conversional_agent = new_conversional_agent(memory=memory_params[1])
 
-    prompt = f"""
-    {memory_params[0]}
-    Human: {prompt_parameters.prompt}
-    Assistant:
-    """
+async def prompt_handler(prompt_parameters: PromptParameters):
+    memory = await history_handler(prompt_parameters)
+    with span("agent_construction"):
+        conversional_agent = new_conversional_agent(memory=memory)
     # On dev, all slack message is logged
     # On prod, no slack message is logged
     try:
-        response = conversional_agent.run(
-            input=prompt, callbacks=[langfuse_handler] if is_dev_env else None
-        )
-        slack_response_handler(prompt_parameters, response)
+        with span("agent_run"), vector_store_scope(thread_scope(prompt_parameters)):
+            response = await conversional_agent.arun(
+                input=prompt_parameters.prompt,
+                callbacks=agent_callbacks(
+                    prompt_parameters, [langfuse_handler] if is_dev_env else []
+                ),
+            )
+        await slack_response_handler(prompt_parameters, response)
     except Exception as e:
         logger.error(f"Agent error: {str(e)}")
-        slack_error_notification(prompt_parameters)
+        await slack_error_notification(prompt_parameters)
+
+
+def thread_scope(prompt_parameters: PromptParameters) -> str:
+    # documents embedded by the tools are kept for follow up questions in the same thread
+    thread_ts = prompt_parameters.thread_ts or prompt_parameters.message_ts
+    return f"{prompt_parameters.source.id}:{thread_ts}"
+
+
+def agent_callbacks(prompt_parameters: PromptParameters, callbacks):
+    # llm and tool latencies are always recorded, also on prod without langfuse
+    callbacks = callbacks + [METRICS_CALLBACK_HANDLER]
+    if SLACK_STREAMING and prompt_parameters.loading_message_ts:
+        callbacks = callbacks + [
+            SlackStreamingCallbackHandler(
+                SLACK_CLIENT,
+                channel=prompt_parameters.source.id,
+                message_ts=prompt_parameters.loading_message_ts,
+            )
+        ]
+    return callbacks
 
 
-def history_handler(prompt_parameters):
+@traced("slack_to_llm_memory")
+async def history_handler(prompt_parameters):
     memory = None
 
     if prompt_parameters.source.name == "slack":
-        memory = slack_to_llm_memory(
-            slack_client=SLACK_CLIENT, prompt_parameters=prompt_parameters
+        memory = await slack_to_llm_memory(
+            slack_history=SLACK_HISTORY, prompt_parameters=prompt_parameters
         )
     else:
         logger.error(
@@ -348,32 +402,50 @@ def history_handler(prompt_parameters):
             prompt_parameters.source.name,
         )
     logger.info(f"Handling basic prompt: {prompt_parameters.prompt} | {memory}")
+    # the agent gets the history only through this memory, within its token budget
+    return memory
 
-    chat_history = ""
-    for message in memory.chat_memory.messages:
-        if isinstance(message, HumanMessage):
-            chat_history += f"user: {message.content}\n"
-        elif isinstance(message, AIMessage):
-            chat_history += f"ai: {message.content}\n"
-        elif isinstance(message, SystemMessage):
-            chat_history += f"system: {message.content}\n"
-    # due to TypeError: unhashable type: 'ConversationBufferMemory' no dict can be returned
-    return [chat_history, memory]
-
-
-def slack_response_handler(prompt_parameters: PromptParameters, response):
-    response = json.loads(response)
-    if "action_input" in response:
-        string_handler(prompt_parameters, response["action_input"])
+
+async def slack_response_handler(prompt_parameters: PromptParameters, response):
+    try:
+        parsed_response = json.loads(response)
+    except json.JSONDecodeError:
+        parsed_response = None
+    # fenced final answers are already unwrapped by the agent into plain text
+    if not isinstance(parsed_response, dict):
+        parsed_response = {"action_input": response}
+
+    if "action_input" in parsed_response:
+        await string_handler(prompt_parameters, parsed_response["action_input"])
     else:
-        SLACK_CLIENT.chat_postMessage(
-            channel=prompt_parameters.source.id,
+        await send_slack_message(
+            prompt_parameters,
             text="response",
-            blocks=response["slack_response"],
+            blocks=parsed_response["slack_response"],
+        )
+
+
+@traced("slack_post_answer")
+async def send_slack_message(prompt_parameters: PromptParameters, text, blocks):
+    # replace the loading message, so each answer is a single slack message
+    if prompt_parameters.loading_message_ts:
+        response = await SLACK_CLIENT.chat_update(
+            channel=prompt_parameters.source.id,
+            ts=prompt_parameters.loading_message_ts,
+            text=text,
+            blocks=blocks,
         )
+    else:
+        response = await SLACK_CLIENT.chat_postMessage(
+            channel=prompt_parameters.source.id,
+            text=text,
+            blocks=blocks,
+        )
+    await SLACK_HISTORY.record_response(response)
+    return response
 
 
-def string_handler(prompt_parameters: PromptParameters, response):
+async def string_handler(prompt_parameters: PromptParameters, response):
     link_blocks = [
         {
             "type": "section",
@@ -420,8 +492,8 @@ def string_handler(prompt_parameters: PromptParameters, response):
     ]
 
     try:
-        SLACK_CLIENT.chat_postMessage(
-            channel=prompt_parameters.source.id,
+        await send_slack_message(
+            prompt_parameters,
             text=response,
             blocks=link_blocks,
         )
@@ -432,7 +504,7 @@ def string_handler(prompt_parameters: PromptParameters, response):
         print(f"Got an error: {e.response['error']}")
 
 
-def slack_error_notification(prompt_parameters: PromptParameters):
+async def slack_error_notification(prompt_parameters: PromptParameters):
     ERROR_MESSAGE = "An error occurred. Sry about that!"
     link_blocks = [
         {
@@ -446,8 +518,8 @@ def slack_error_notification(prompt_parameters: PromptParameters):
     ]
 
     try:
-        SLACK_CLIENT.chat_postMessage(
-            channel=prompt_parameters.source.id,
+        await send_slack_message(
+            prompt_parameters,
             text=ERROR_MESSAGE,
             blocks=link_blocks,
         )
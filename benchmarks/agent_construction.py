@@ -0,0 +1,91 @@
+"""
+Per request cost of building the conversational agent, before and after the agent factory.
+
+    python -m benchmarks.agent_construction --iterations 50
+
+No api calls are made, dummy keys are set for clients which validate them on construction.
+"""
+
+import os
+import argparse
+import statistics
+import time
+
+for key in ("OPENAI_API_KEY", "ANTHROPIC_API_KEY", "GOOGLE_API_KEY", "GOOGLE_CSE_ID"):
+    os.environ.setdefault(key, "benchmark")
+
+from langchain_community.agent_toolkits.load_tools import load_tools
+from langchain.agents import initialize_agent, AgentType
+from langchain.memory import ConversationBufferMemory
+from langchain.schema import SystemMessage
+
+from llm import agents
+from llm.config import GPT_4_CHAT_MODEL
+from llm.tools import load_custom_tools
+
+
+def new_memory():
+    return ConversationBufferMemory(memory_key="chat_history", return_messages=True)
+
+
+def build_per_request(memory):
+    # construction as it was done before the factory, on every slack message
+    tools = (
+        load_tools(["google-search", "llm-math"], llm=GPT_4_CHAT_MODEL)
+        + load_custom_tools()
+    )
+    memory.chat_memory.add_message(
+        SystemMessage(
+            content=agents.SYSTEM_MESSAGE.format(current_date=agents.current_date())
+        )
+    )
+    return initialize_agent(
+        tools,
+        GPT_4_CHAT_MODEL,
+        agent=AgentType.STRUCTURED_CHAT_ZERO_SHOT_REACT_DESCRIPTION,
+        verbose=True,
+        memory=memory,
+        max_iterations=3,
+    )
+
+
+def build_from_factory(memory):
+    return agents.new_conversional_agent(memory=memory)
+
+
+def measure(build, iterations):
+    durations = []
+    for _ in range(iterations):
+        memory = new_memory()
+        start = time.perf_counter()
+        build(memory)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def report(name, durations):
+    durations_ms = [duration * 1000 for duration in durations]
+    print(
+        f"{name:<12} mean {statistics.mean(durations_ms):8.3f} ms | "
+        f"median {statistics.median(durations_ms):8.3f} ms | "
+        f"max {max(durations_ms):8.3f} ms"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    # first factory call builds the shared agent, reported separately
+    start = time.perf_counter()
+    agents.get_agent_factory()
+    print(
+        f"factory warmup {(time.perf_counter() - start) * 1000:.3f} ms (once per process)"
+    )
+
+    before = measure(build_per_request, args.iterations)
+    after = measure(build_from_factory, args.iterations)
+    report("per request", before)
+    report("factory", after)
+    print(f"speedup x{statistics.mean(before) / statistics.mean(after):.1f}")
@@ -0,0 +1,105 @@
+"""
+Ingestion throughput of the embedding scheduler at different concurrency levels, against the
+fake openai embeddings api of the load test (no api costs, no database).
+
+    python -m benchmarks.embedding_throughput --chunks 2000 --concurrency 1 2 4 8
+
+The fake answers after --latency seconds per request, --rate-limit makes it answer 429 above
+that many requests per second, so the backoff of the scheduler is part of the measurement.
+Finished batches go into an in memory vector store, as they would go into pgvector.
+"""
+
+import asyncio
+import argparse
+import threading
+import time
+
+from langchain_core.documents import Document
+from langchain_openai import OpenAIEmbeddings
+
+from benchmarks.load_test.fake_openai import FakeOpenAIConfig, new_fake_openai_app
+from benchmarks.load_test.run import start_site
+from llm.embedding_scheduler import EmbeddingScheduler, get_token_encoding
+from llm.vectorstores.ephemeral import EphemeralVectorStore
+
+WORDS = ("ship", "passenger", "cabin", "ticket", "harbour", "lifeboat", "crew", "deck")
+
+
+def start_fake_openai(config: FakeOpenAIConfig, port: int) -> str:
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    asyncio.run_coroutine_threadsafe(
+        start_site(new_fake_openai_app(config), port), loop
+    ).result()
+    return f"http://127.0.0.1:{port}/v1"
+
+
+def new_chunks(count: int, words_per_chunk: int):
+    # distinct texts of ~words_per_chunk * 1.3 tokens
+    return [
+        Document(
+            page_content=f"chunk {index}: "
+            + " ".join(
+                WORDS[(index + word) % len(WORDS)] for word in range(words_per_chunk)
+            ),
+            metadata={"index": index},
+        )
+        for index in range(count)
+    ]
+
+
+def run(embeddings, chunks, args, concurrency: int):
+    scheduler = EmbeddingScheduler(
+        embeddings,
+        concurrency=concurrency,
+        rpm_limit=args.rpm,
+        tpm_limit=args.tpm,
+        max_batch_inputs=args.batch_inputs,
+    )
+    vector_store = EphemeralVectorStore(embeddings)
+    start = time.perf_counter()
+    embedded = scheduler.embed_into(
+        chunks,
+        [str(index) for index in range(len(chunks))],
+        sink=vector_store.add_embeddings,
+    )
+    elapsed = time.perf_counter() - start
+    print(
+        f"concurrency {concurrency:>3} | {embedded} chunks in {elapsed:7.2f} s | "
+        f"{embedded / elapsed:8.1f} chunks/s"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--words-per-chunk", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--batch-inputs", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--rate-limit", type=float, default=0)
+    parser.add_argument("--rpm", type=int, default=3000)
+    parser.add_argument("--tpm", type=int, default=5000000)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    openai_url = start_fake_openai(
+        FakeOpenAIConfig(
+            embedding_latency=args.latency, embedding_rate_limit=args.rate_limit
+        ),
+        args.port,
+    )
+    # without the tiktoken encoding langchain sends one request per text instead of batches
+    check_embedding_ctx_length = get_token_encoding() is not None
+    if not check_embedding_ctx_length:
+        print("no tiktoken encoding, every text is a request of its own")
+    # retries are left to the scheduler
+    embeddings = OpenAIEmbeddings(
+        api_key="benchmark",
+        base_url=openai_url,
+        max_retries=0,
+        check_embedding_ctx_length=check_embedding_ctx_length,
+    )
+    chunks = new_chunks(args.chunks, args.words_per_chunk)
+    for concurrency in args.concurrency:
+        run(embeddings, chunks, args, concurrency)
@@ -0,0 +1,88 @@
+"""
+Cold start of a worker: import time and memory of `import app`, and of the first agent build.
+
+    python -m benchmarks.import_time --top 25
+
+Each measurement runs in a fresh interpreter (python -X importtime), the report lists the
+top level packages with the most own import time. No api calls are made, dummy keys are set
+for clients which validate them on construction.
+"""
+
+import os
+import re
+import sys
+import json
+import argparse
+import subprocess
+from collections import defaultdict
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_TIME_PATTERN = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+MEASURE_SCRIPT = """
+import json, resource, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+if sys.argv[1] == "agent":
+    app.new_conversional_agent()
+built = time.perf_counter()
+print(json.dumps({
+    "import_seconds": imported - start,
+    "agent_seconds": built - imported,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "modules": len(sys.modules),
+}))
+"""
+
+
+def run(mode: str):
+    env = dict(os.environ)
+    for key in (
+        "OPENAI_API_KEY",
+        "ANTHROPIC_API_KEY",
+        "GOOGLE_API_KEY",
+        "GOOGLE_CSE_ID",
+    ):
+        env.setdefault(key, "benchmark")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", MEASURE_SCRIPT, mode],
+        cwd=ROOT_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def packages_by_import_time(importtime_output: str):
+    # self times are exclusive, so their sum per top level package adds up to the total
+    totals = defaultdict(int)
+    for line in importtime_output.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if match:
+            self_time, _, _, module = match.groups()
+            totals[module.split(".")[0]] += int(self_time)
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    for mode in ("import", "agent"):
+        stats, importtime_output = run(mode)
+        print(
+            f"{mode:<6} import app {stats['import_seconds'] * 1000:8.1f} ms | "
+            f"first agent {stats['agent_seconds'] * 1000:8.1f} ms | "
+            f"max rss {stats['max_rss_mb']:7.1f} MiB | modules {stats['modules']}"
+        )
+        if mode == "import":
+            print(f"\nslowest packages of `import app` (own import time):")
+            for package, microseconds in packages_by_import_time(importtime_output)[
+                : args.top
+            ]:
+                print(f"  {package:<32} {microseconds / 1000:8.1f} ms")
+            print()
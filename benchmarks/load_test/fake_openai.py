@@ -0,0 +1,213 @@
+"""
+Deterministic stand-in for the openai chat completions and embeddings api.
+
+The agent (structured chat) gets a tool call or a final answer depending on the prompt:
+- "Parameters for file tools: {...}" in the prompt -> document_vector_store with the given file paths
+- "[rag]" in the prompt -> pgvector_search
+- otherwise -> Final Answer
+Every other chat call (retrieval chains, summaries) is answered with plain text.
+"""
+
+import ast
+import json
+import time
+import uuid
+import base64
+import random
+import struct
+import asyncio
+import hashlib
+from dataclasses import dataclass
+
+from aiohttp import web
+
+EMBEDDING_DIMENSIONS = 1536
+FILE_PARAMETERS_MARKER = "Parameters for file tools:"
+RAG_MARKER = "[rag]"
+
+
+@dataclass
+class FakeOpenAIConfig:
+    # latency until the first token/the response
+    chat_latency: float = 0.5
+    # latency between streamed chunks
+    token_latency: float = 0.01
+    embedding_latency: float = 0.05
+    # embeddings requests per second before answering 429, 0 is unlimited
+    embedding_rate_limit: float = 0
+
+
+def fake_embedding(text: str, dimensions: int = EMBEDDING_DIMENSIONS):
+    """
+    Unit vector derived from the text, equal texts get equal embeddings
+    """
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "big")
+    rng = random.Random(seed)
+    vector = [rng.gauss(0, 1) for _ in range(dimensions)]
+    norm = sum(value * value for value in vector) ** 0.5
+    return [value / norm for value in vector]
+
+
+def message_text(message: dict) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content)
+    return content
+
+
+def agent_action(action: str, action_input) -> str:
+    blob = json.dumps({"action": action, "action_input": action_input})
+    return f"Action:\n```\n{blob}\n```"
+
+
+def chat_answer(messages: list) -> str:
+    is_agent = any(
+        message.get("role") == "system" and "Final Answer" in message_text(message)
+        for message in messages
+    )
+    prompt = message_text(messages[-1]) if messages else ""
+    if not is_agent:
+        context_size = sum(len(message_text(message)) for message in messages)
+        return f"Fake answer based on {context_size} chars of context."
+
+    # the scratchpad holds the observation after a tool was called
+    if "Observation:" in prompt:
+        return agent_action("Final Answer", "Fake answer after using a tool.")
+
+    if FILE_PARAMETERS_MARKER in prompt:
+        parameters = prompt.split(FILE_PARAMETERS_MARKER, 1)[1]
+        parameters = ast.literal_eval(parameters[: parameters.index("}") + 1].strip())
+        return agent_action(
+            "document_vector_store",
+            {
+                "file_paths": parameters["file_paths"],
+                "slack_channel_id": parameters["slack_channel_id"],
+                "prompt": prompt,
+            },
+        )
+    if RAG_MARKER in prompt:
+        return agent_action("pgvector_search", {"prompt": prompt})
+    return agent_action("Final Answer", f"Fake answer to: {prompt[:200]}")
+
+
+def usage(prompt: str, completion: str) -> dict:
+    # roughly 4 chars per token, good enough for the token counters
+    prompt_tokens = len(prompt) // 4
+    completion_tokens = len(completion) // 4
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def new_fake_openai_app(config: FakeOpenAIConfig) -> web.Application:
+    async def chat_completions(request: web.Request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        answer = chat_answer(messages)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        model = body.get("model", "fake")
+
+        await asyncio.sleep(config.chat_latency)
+        if not body.get("stream"):
+            return web.json_response(
+                {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": model,
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": answer},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": usage(json.dumps(messages), answer),
+                }
+            )
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+
+        async def send(delta: dict, finish_reason=None):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [
+                    {"index": 0, "delta": delta, "finish_reason": finish_reason}
+                ],
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+
+        await send({"role": "assistant", "content": ""})
+        # a few words per chunk, similar to the token stream of the real api
+        words = answer.split(" ")
+        for index in range(0, len(words), 4):
+            piece = " ".join(words[index : index + 4])
+            await send({"content": piece if index == 0 else f" {piece}"})
+            await asyncio.sleep(config.token_latency)
+        await send({}, finish_reason="stop")
+        if (body.get("stream_options") or {}).get("include_usage"):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [],
+                "usage": usage(json.dumps(messages), answer),
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    embedding_requests = []
+
+    async def embeddings(request: web.Request):
+        if config.embedding_rate_limit:
+            # sliding one second window, like the per minute limits of openai
+            now = time.monotonic()
+            while embedding_requests and embedding_requests[0] < now - 1:
+                embedding_requests.pop(0)
+            if len(embedding_requests) >= config.embedding_rate_limit:
+                return web.json_response(
+                    {"error": {"message": "Rate limit reached", "type": "requests"}},
+                    status=429,
+                    headers={"retry-after": "1"},
+                )
+            embedding_requests.append(now)
+
+        body = await request.json()
+        inputs = body["input"]
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+
+        await asyncio.sleep(config.embedding_latency)
+        data = []
+        for index, item in enumerate(inputs):
+            # langchain sends token ids, which are hashed the same way as texts
+            vector = fake_embedding(item if isinstance(item, str) else repr(item))
+            if body.get("encoding_format") == "base64":
+                vector = base64.b64encode(
+                    struct.pack(f"<{len(vector)}f", *vector)
+                ).decode()
+            data.append({"object": "embedding", "index": index, "embedding": vector})
+        tokens = sum(len(item) for item in inputs)
+        return web.json_response(
+            {
+                "object": "list",
+                "data": data,
+                "model": body.get("model", "fake"),
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            }
+        )
+
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    app.router.add_post("/v1/embeddings", embeddings)
+    return app
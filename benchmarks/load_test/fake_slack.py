@@ -0,0 +1,149 @@
+"""
+Stand-in for the slack web api methods used by the bot, plus file downloads.
+
+Answers are recognized on chat.postMessage/chat.update and reported per channel, so the load test
+can measure the end to end latency of an event without polling.
+"""
+
+import json
+import time
+import asyncio
+import itertools
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from aiohttp import web
+
+from data_models.constants import LOADING_INDICATOR
+
+BOT_USER_ID = "UBOT"
+BOT_ID = "BBOT"
+ERROR_MESSAGE = "An error occurred. Sry about that!"
+FILE_CONTENT = (
+    "Quarterly report of the load test company.\n"
+    "Revenue grew by 12 percent, costs stayed flat.\n"
+    "The next milestone is the release of the new product line.\n"
+) * 20
+
+
+@dataclass
+class FakeSlackConfig:
+    # latency of every web api call
+    api_latency: float = 0.05
+    file_latency: float = 0.05
+
+
+def is_streaming_update(text: str, blocks) -> bool:
+    # the streaming callback writes the partial answer as the only block
+    return (
+        isinstance(blocks, list)
+        and len(blocks) == 1
+        and blocks[0].get("text", {}).get("text") == text
+        and text != ERROR_MESSAGE
+    )
+
+
+def new_fake_slack_app(
+    config: FakeSlackConfig,
+    on_answer: Optional[Callable[[str, bool, float], None]] = None,
+) -> web.Application:
+    """
+    on_answer: called with channel, success and time of the first final answer in a channel
+    """
+    message_counter = itertools.count(1)
+    answered = set()
+
+    async def params(request: web.Request) -> dict:
+        values = dict(request.query)
+        if request.content_type == "application/json":
+            values.update(await request.json())
+        elif request.can_read_body:
+            values.update(await request.post())
+        # form encoded requests carry the blocks as json string
+        if isinstance(values.get("blocks"), str):
+            values["blocks"] = json.loads(values["blocks"])
+        return values
+
+    def record_answer(channel: str, text: str, blocks):
+        if text == LOADING_INDICATOR or is_streaming_update(text, blocks):
+            return
+        if channel in answered:
+            return
+        answered.add(channel)
+        if on_answer is not None:
+            on_answer(channel, text != ERROR_MESSAGE, time.perf_counter())
+
+    def message(values: dict, ts: str) -> dict:
+        return {
+            "type": "message",
+            "text": values.get("text", ""),
+            "user": BOT_USER_ID,
+            "bot_id": BOT_ID,
+            "ts": ts,
+        }
+
+    async def api(request: web.Request):
+        method = request.match_info["method"]
+        values = await params(request)
+        await asyncio.sleep(config.api_latency)
+
+        if method == "auth.test":
+            return web.json_response(
+                {"ok": True, "user_id": BOT_USER_ID, "bot_id": BOT_ID}
+            )
+        if method == "users.info":
+            user_id = values.get("user", "")
+            return web.json_response(
+                {
+                    "ok": True,
+                    "user": {
+                        "id": user_id,
+                        "name": user_id.lower(),
+                        "profile": {"display_name": user_id.lower()},
+                    },
+                }
+            )
+        if method == "users.list":
+            return web.json_response(
+                {"ok": True, "members": [], "response_metadata": {"next_cursor": ""}}
+            )
+        if method == "conversations.history":
+            return web.json_response({"ok": True, "messages": [], "has_more": False})
+        if method == "chat.postMessage":
+            ts = f"{int(time.time())}.{next(message_counter) % 1000000:06d}"
+            record_answer(
+                values["channel"], values.get("text", ""), values.get("blocks")
+            )
+            return web.json_response(
+                {
+                    "ok": True,
+                    "channel": values["channel"],
+                    "ts": ts,
+                    "message": message(values, ts),
+                }
+            )
+        if method == "chat.update":
+            record_answer(
+                values["channel"], values.get("text", ""), values.get("blocks")
+            )
+            return web.json_response(
+                {
+                    "ok": True,
+                    "channel": values["channel"],
+                    "ts": values["ts"],
+                    "text": values.get("text", ""),
+                    "message": message(values, values["ts"]),
+                }
+            )
+        # files.upload and everything else the tools might call
+        return web.json_response({"ok": True})
+
+    async def download(request: web.Request):
+        await asyncio.sleep(config.file_latency)
+        return web.Response(body=FILE_CONTENT.encode(), content_type="text/plain")
+
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app.router.add_post("/api/{method}", api)
+    app.router.add_get("/api/{method}", api)
+    app.router.add_get("/files/{file_id}/{name}", download)
+    return app
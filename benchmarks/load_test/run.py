@@ -0,0 +1,326 @@
+"""
+End to end load test of /slack/event/ against local fakes of slack and openai.
+
+    python -m benchmarks.load_test.seed --rows 5000   # once, for the rag path
+    python -m benchmarks.load_test.run --scenario all --rate 5 --duration 30
+
+Starts the fake slack web api and the fake openai api in this process, the app with uvicorn
+in a subprocess (or uses --app-url), replays signed slack events at the target rate and reports
+ack and end to end latency (until the answer is posted into slack), throughput and error rates.
+The app uses the postgres of PGVECTOR_HOST/PGVECTOR_PORT, as configured in .env.
+"""
+
+import os
+import sys
+import hmac
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+import argparse
+import subprocess
+import tempfile
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import aiohttp
+from aiohttp import web
+
+from benchmarks.load_test.fake_openai import (
+    RAG_MARKER,
+    FakeOpenAIConfig,
+    new_fake_openai_app,
+)
+from benchmarks.load_test.fake_slack import (
+    BOT_USER_ID,
+    FakeSlackConfig,
+    new_fake_slack_app,
+)
+
+SIGNING_SECRET = "load-test-signing-secret"
+SCENARIOS = {
+    "plain": "Who is Thomas Gottschalk?",
+    "file": "Summarize this document",
+    "rag": f"{RAG_MARKER} Who was the oldest passenger?",
+}
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@dataclass
+class EventResult:
+    sent_at: float
+    ack_status: Optional[int] = None
+    ack_latency: Optional[float] = None
+    answered_at: Optional[float] = None
+    ok: Optional[bool] = None
+
+
+@dataclass
+class ScenarioRun:
+    name: str
+    # channel -> result, each event is sent into its own channel
+    results: Dict[str, EventResult] = field(default_factory=dict)
+    pending: Dict[str, asyncio.Future] = field(default_factory=dict)
+
+
+def percentile(values: List[float], percent: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    index = max(0, min(len(values) - 1, round(percent / 100 * len(values)) - 1))
+    return values[index]
+
+
+def sign(body: bytes, timestamp: str) -> str:
+    base = f"v0:{timestamp}:".encode() + body
+    digest = hmac.new(SIGNING_SECRET.encode(), base, hashlib.sha256).hexdigest()
+    return f"v0={digest}"
+
+
+def new_event(scenario: str, channel: str, slack_url: str) -> dict:
+    ts = f"{time.time():.6f}"
+    event = {
+        "type": "message",
+        "channel": channel,
+        "channel_type": "group",
+        "user": "ULOADTEST",
+        "text": f"<@{BOT_USER_ID}> {SCENARIOS[scenario]}",
+        "ts": ts,
+        "client_msg_id": str(uuid.uuid4()),
+    }
+    if scenario == "file":
+        file_id = f"F{uuid.uuid4().hex[:10].upper()}"
+        event["files"] = [
+            {
+                "id": file_id,
+                "name": "report.txt",
+                "url_private_download": f"{slack_url}/files/{file_id}/report.txt",
+            }
+        ]
+    return {
+        "type": "event_callback",
+        "team_id": "TLOADTEST",
+        "api_app_id": "ALOADTEST",
+        "event_id": f"Ev{uuid.uuid4().hex[:12].upper()}",
+        "event_time": int(time.time()),
+        "event": event,
+    }
+
+
+async def send_event(session, app_url, run: ScenarioRun, channel, payload):
+    body = json.dumps(payload).encode()
+    timestamp = str(int(time.time()))
+    result = run.results[channel]
+    try:
+        async with session.post(
+            f"{app_url}/slack/event/",
+            data=body,
+            headers={
+                "Content-Type": "application/json",
+                "X-Slack-Request-Timestamp": timestamp,
+                "X-Slack-Signature": sign(body, timestamp),
+            },
+        ) as response:
+            await response.read()
+            result.ack_status = response.status
+    except aiohttp.ClientError:
+        result.ack_status = 0
+    result.ack_latency = time.perf_counter() - result.sent_at
+    if result.ack_status != 200:
+        result.ok = False
+        run.pending[channel].cancel()
+
+
+async def run_scenario(session, args, scenario: str, slack_url: str, runs: dict):
+    run = runs[scenario] = ScenarioRun(name=scenario)
+    loop = asyncio.get_running_loop()
+    total = int(args.rate * args.duration)
+    started = time.perf_counter()
+    senders = []
+
+    for index in range(total):
+        # open loop: events are sent on schedule, independent of the answers
+        delay = started + index / args.rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        channel = f"C{scenario[:1].upper()}{uuid.uuid4().hex[:10].upper()}"
+        run.results[channel] = EventResult(sent_at=time.perf_counter())
+        run.pending[channel] = loop.create_future()
+        payload = new_event(scenario, channel, slack_url)
+        senders.append(
+            asyncio.create_task(
+                send_event(session, args.app_url, run, channel, payload)
+            )
+        )
+
+    await asyncio.gather(*senders)
+    await asyncio.wait(
+        [future for future in run.pending.values()], timeout=args.answer_timeout
+    )
+    report(run, time.perf_counter() - started)
+
+
+def report(run: ScenarioRun, elapsed: float):
+    results = list(run.results.values())
+    acked = [result for result in results if result.ack_status == 200]
+    answered = [result for result in results if result.answered_at is not None]
+    succeeded = [result for result in answered if result.ok]
+    failed = len(results) - len(succeeded)
+    timeouts = len(acked) - len(answered)
+    ack_latencies = [result.ack_latency * 1000 for result in acked]
+    e2e_latencies = [
+        (result.answered_at - result.sent_at) * 1000 for result in succeeded
+    ]
+
+    print(f"\n[{run.name}] {len(results)} events in {elapsed:.1f}s")
+    print(
+        f"  throughput {len(succeeded) / elapsed:.2f} answers/s | "
+        f"errors {failed / max(len(results), 1):.1%} "
+        f"(ack {len(results) - len(acked)}, "
+        f"error answer {len(answered) - len(succeeded)}, timeout {timeouts})"
+    )
+    for name, latencies in (("ack", ack_latencies), ("end to end", e2e_latencies)):
+        print(
+            f"  {name:<10} p50 {percentile(latencies, 50):9.1f} ms | "
+            f"p95 {percentile(latencies, 95):9.1f} ms | "
+            f"p99 {percentile(latencies, 99):9.1f} ms"
+        )
+
+
+async def start_site(app: web.Application, port: int) -> web.AppRunner:
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+def start_app(args, slack_url: str, openai_url: str) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update(
+        {
+            "SLACK_API_URL": f"{slack_url}/api/",
+            "SLACK_SIGNING_SECRET": SIGNING_SECRET,
+            "SLACK_BOT_OAUTH_TOKEN": "xoxb-load-test",
+            "SLACK_BOT_ID": BOT_USER_ID,
+            "SLACK_BOT_DISPLAY_NAME": "aisheAI",
+            "SLACK_HISTORY_BACKEND": "memory",
+            "OPENAI_API_KEY": "load-test",
+            "OPENAI_BASE_URL": openai_url,
+            "OPENAI_API_BASE": openai_url,
+            "ANTHROPIC_API_KEY": "load-test",
+            "GOOGLE_API_KEY": "load-test",
+            "GOOGLE_CSE_ID": "load-test",
+            # no traces are sent to langfuse
+            "LANGFUSE_PUBLIC_KEY": "",
+            "LANGFUSE_SECRET_KEY": "",
+            "NON_RBAC_TABLE_NAME": os.environ.get(
+                "NON_RBAC_TABLE_NAME", "load_test_document"
+            ),
+            "SLACK_DOWNLOAD_DIR": tempfile.mkdtemp(prefix="aishe-load-test-"),
+        }
+    )
+    if args.workers > 1:
+        env["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="aishe-metrics-")
+    return subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app:app",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(args.app_port),
+            "--workers",
+            str(args.workers),
+            "--log-level",
+            "warning",
+        ],
+        cwd=ROOT_DIR,
+        env=env,
+    )
+
+
+async def wait_until_up(session, app_url: str, timeout: float = 120):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            async with session.post(f"{app_url}/healthcheck") as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.5)
+    raise TimeoutError(f"App at {app_url} did not start within {timeout}s")
+
+
+async def main(args):
+    runs: Dict[str, ScenarioRun] = {}
+
+    def on_answer(channel: str, ok: bool, at: float):
+        for run in runs.values():
+            result = run.results.get(channel)
+            if result is not None and result.answered_at is None:
+                result.answered_at = at
+                result.ok = ok
+                if not run.pending[channel].done():
+                    run.pending[channel].set_result(ok)
+
+    slack_url = f"http://127.0.0.1:{args.slack_port}"
+    openai_url = f"http://127.0.0.1:{args.openai_port}/v1"
+    site_runners = [
+        await start_site(
+            new_fake_slack_app(
+                FakeSlackConfig(api_latency=args.slack_latency), on_answer=on_answer
+            ),
+            args.slack_port,
+        ),
+        await start_site(
+            new_fake_openai_app(
+                FakeOpenAIConfig(
+                    chat_latency=args.llm_latency,
+                    token_latency=args.token_latency,
+                    embedding_latency=args.embedding_latency,
+                )
+            ),
+            args.openai_port,
+        ),
+    ]
+
+    process = None
+    if args.app_url is None:
+        args.app_url = f"http://127.0.0.1:{args.app_port}"
+        process = start_app(args, slack_url, openai_url)
+
+    scenarios = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+    connector = aiohttp.TCPConnector(limit=0)
+    try:
+        async with aiohttp.ClientSession(connector=connector) as session:
+            await wait_until_up(session, args.app_url)
+            for scenario in scenarios:
+                await run_scenario(session, args, scenario, slack_url, runs)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+        for site_runner in site_runners:
+            await site_runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenario", choices=["all", *SCENARIOS], default="all")
+    parser.add_argument("--rate", type=float, default=2, help="events per second")
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--answer-timeout", type=float, default=120)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--app-url", help="use a running app instead of starting one")
+    parser.add_argument("--app-port", type=int, default=8899)
+    parser.add_argument("--slack-port", type=int, default=8901)
+    parser.add_argument("--openai-port", type=int, default=8902)
+    parser.add_argument("--slack-latency", type=float, default=0.05)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--token-latency", type=float, default=0.01)
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,114 @@
+"""
+Seeds a local pgvector database with documents for the rag path of the load test.
+
+    python -m benchmarks.load_test.seed --rows 5000
+
+The rows go into NON_RBAC_TABLE_NAME (default load_test_document, never the real document table),
+with the embeddings of the fake openai server.
+"""
+
+import os
+import argparse
+
+os.environ.setdefault("NON_RBAC_TABLE_NAME", "load_test_document")
+
+from sqlalchemy import create_engine, text
+
+from llm.config import CONNECTION_STRING
+from llm.vectorstores.pgvector.data_model import text_search_statements
+from benchmarks.load_test.fake_openai import EMBEDDING_DIMENSIONS, fake_embedding
+
+LOAD_TEST_TABLE_NAME = os.environ["NON_RBAC_TABLE_NAME"]
+TOPICS = ("passenger", "crew member", "ticket", "cabin", "lifeboat", "harbour")
+
+
+INDEX_STATEMENTS = {
+    # same operator class as the queries of NonRBACVectorStore (<=>)
+    "hnsw": "USING hnsw (embeddings vector_cosine_ops) WITH (m = 16, ef_construction = 200)",
+    "ivfflat": "USING ivfflat (embeddings vector_cosine_ops) WITH (lists = {lists})",
+}
+
+
+def create_index(method: str, rows: int):
+    engine = create_engine(CONNECTION_STRING)
+    statement = INDEX_STATEMENTS[method].format(lists=max(rows // 1000, 1))
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                f"CREATE INDEX IF NOT EXISTS {LOAD_TEST_TABLE_NAME}_embeddings_{method}_idx "
+                f"ON {LOAD_TEST_TABLE_NAME} {statement}"
+            )
+        )
+    print(f"created {method} index on {LOAD_TEST_TABLE_NAME}")
+
+
+def create_text_search():
+    # generated tsvector column and gin index for PGVECTOR_HYBRID_SEARCH=true
+    engine = create_engine(CONNECTION_STRING)
+    with engine.begin() as conn:
+        for statement in text_search_statements(LOAD_TEST_TABLE_NAME, "page_content"):
+            conn.execute(text(statement))
+    print(f"created text search column on {LOAD_TEST_TABLE_NAME}")
+
+
+def seed(rows: int, batch_size: int = 500, reset: bool = False):
+    engine = create_engine(CONNECTION_STRING)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        if reset:
+            conn.execute(text(f"DROP TABLE IF EXISTS {LOAD_TEST_TABLE_NAME}"))
+        # the columns read by NonRBACVectorStore
+        conn.execute(
+            text(
+                f"""
+                CREATE TABLE IF NOT EXISTS {LOAD_TEST_TABLE_NAME} (
+                    id bigserial PRIMARY KEY,
+                    page_content text,
+                    context_data jsonb,
+                    embeddings vector({EMBEDDING_DIMENSIONS})
+                )
+                """
+            )
+        )
+
+    insert = text(
+        f"INSERT INTO {LOAD_TEST_TABLE_NAME} (page_content, context_data, embeddings) "
+        "VALUES (:page_content, CAST(:context_data AS jsonb), CAST(:embeddings AS vector))"
+    )
+    for start in range(0, rows, batch_size):
+        batch = []
+        for index in range(start, min(start + batch_size, rows)):
+            page_content = (
+                f"Record {index}: a {TOPICS[index % len(TOPICS)]} "
+                f"of the load test ship, aged {20 + index % 60}."
+            )
+            batch.append(
+                {
+                    "page_content": page_content,
+                    "context_data": '{"source": "load_test"}',
+                    "embeddings": str(fake_embedding(page_content)),
+                }
+            )
+        with engine.begin() as conn:
+            conn.execute(insert, batch)
+        print(f"seeded {start + len(batch)}/{rows} rows into {LOAD_TEST_TABLE_NAME}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument(
+        "--reset", action="store_true", help="drop the load test table first"
+    )
+    parser.add_argument(
+        "--index",
+        choices=["none", *INDEX_STATEMENTS],
+        default="hnsw",
+        help="vector index created after seeding",
+    )
+    args = parser.parse_args()
+    seed(args.rows, batch_size=args.batch_size, reset=args.reset)
+    if args.index != "none":
+        create_index(args.index, args.rows)
+    create_text_search()
@@ -0,0 +1,131 @@
+"""
+Recall and latency of the pgvector search over the full precision, halfvec and bit hnsw index,
+the quantized ones re-ranked with the full vectors, for different numbers of re-rank candidates.
+
+    python -m benchmarks.load_test.seed --rows 100000
+    python -m benchmarks.quantization_recall --queries 200 --k 10 --candidates 40 100 200
+
+Runs against CONNECTION_STRING and the load test table (NON_RBAC_TABLE_NAME, default
+load_test_document), the quantized indexes are built first if missing. Recall is measured
+against an exact search without index, the queries are stored embeddings with noise, so each
+has a neighbourhood to find.
+"""
+
+import os
+import argparse
+import statistics
+import time
+
+os.environ.setdefault("NON_RBAC_TABLE_NAME", "load_test_document")
+
+import numpy as np
+from sqlalchemy import create_engine, text
+
+from llm.config import CONNECTION_STRING
+from llm.database import driver_url, register_vector_types
+from llm.vectorstores.pgvector.data_model import (
+    nearest_rows_sql,
+    set_search_parameters,
+    vector_param,
+)
+from llm.vectorstores.pgvector.quantization import QUANTIZED_INDEXES, migrate_table
+
+TABLE_NAME = os.environ["NON_RBAC_TABLE_NAME"]
+
+
+def new_engine():
+    engine = create_engine(driver_url(CONNECTION_STRING), pool_size=1)
+    register_vector_types(engine)
+    return engine
+
+
+def query_embeddings(conn, count: int, noise: float, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    embeddings = []
+    for embedding in conn.scalars(
+        text(f"SELECT embeddings FROM {TABLE_NAME} ORDER BY random() LIMIT :count"),
+        {"count": count},
+    ):
+        embedding = np.asarray(embedding, dtype=np.float32)
+        embedding = embedding + rng.normal(0, noise, embedding.shape).astype(np.float32)
+        embeddings.append(embedding / np.linalg.norm(embedding))
+    return embeddings
+
+
+def nearest_ids(
+    conn, embedding, k: int, quantization=None, candidates=None, exact=False
+):
+    query = text(nearest_rows_sql(TABLE_NAME, [("id", "id")], "", ":k", quantization))
+    parameters = {"embedding": vector_param(embedding), "k": k}
+    with conn.begin():
+        if exact:
+            # sequential scan, the reference for the recall
+            conn.execute(text("SET LOCAL enable_indexscan = off"))
+        elif quantization:
+            parameters["rerank_candidates"] = candidates
+            set_search_parameters(conn, min_ef_search=candidates)
+        start = time.perf_counter()
+        ids = [row[0] for row in conn.execute(query, parameters)]
+        duration = time.perf_counter() - start
+    return ids, duration
+
+
+def index_sizes(conn):
+    return conn.execute(
+        text(
+            "SELECT indexrelname, pg_size_pretty(pg_relation_size(indexrelid)) "
+            "FROM pg_stat_user_indexes WHERE relname = :table ORDER BY indexrelname"
+        ),
+        {"table": TABLE_NAME},
+    ).fetchall()
+
+
+def report(name, durations, recalls):
+    durations = sorted(durations)
+    print(
+        f"{name:<26} recall@k {statistics.mean(recalls):6.3f} | "
+        f"p50 {statistics.median(durations) * 1000:7.2f} ms | "
+        f"p95 {durations[int(len(durations) * 0.95) - 1] * 1000:7.2f} ms"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--candidates", type=int, nargs="+", default=[40, 100, 200])
+    parser.add_argument("--noise", type=float, default=0.02)
+    args = parser.parse_args()
+
+    engine = new_engine()
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for quantization in QUANTIZED_INDEXES:
+            migrate_table(conn, TABLE_NAME, quantization, drop_full_index=False)
+
+    with engine.connect() as conn:
+        with conn.begin():
+            for index_name, size in index_sizes(conn):
+                print(f"{index_name:<48} {size}")
+            embeddings = query_embeddings(conn, args.queries, args.noise)
+        exact = [
+            nearest_ids(conn, embedding, args.k, exact=True)[0]
+            for embedding in embeddings
+        ]
+
+        runs = [("full precision", None, None)]
+        for quantization in QUANTIZED_INDEXES:
+            for candidates in args.candidates:
+                runs.append(
+                    (f"{quantization}, {candidates} cand.", quantization, candidates)
+                )
+
+        for name, quantization, candidates in runs:
+            durations, recalls = [], []
+            for embedding, exact_ids in zip(embeddings, exact):
+                ids, duration = nearest_ids(
+                    conn, embedding, args.k, quantization, candidates
+                )
+                durations.append(duration)
+                recalls.append(len(set(ids) & set(exact_ids)) / len(exact_ids))
+            report(name, durations, recalls)
+    engine.dispose()
@@ -0,0 +1,107 @@
+"""
+Per query cost of the pgvector search: embedding as a float literal in the query text vs as a
+bound binary parameter, without and with server side prepared statements.
+
+    python -m benchmarks.load_test.seed --rows 5000
+    python -m benchmarks.vector_query --queries 500
+
+Runs against CONNECTION_STRING and the load test table (NON_RBAC_TABLE_NAME, default
+load_test_document), query embeddings come from the fake openai server.
+"""
+
+import os
+import argparse
+import statistics
+import time
+
+os.environ.setdefault("NON_RBAC_TABLE_NAME", "load_test_document")
+
+from sqlalchemy import create_engine, text
+
+from llm.config import CONNECTION_STRING
+from llm.database import driver_url, register_vector_types
+from llm.vectorstores.pgvector.data_model import vector_param
+from benchmarks.load_test.fake_openai import fake_embedding
+
+TABLE_NAME = os.environ["NON_RBAC_TABLE_NAME"]
+BOUND_QUERY = (
+    f"SELECT page_content, context_data, (1 - (embeddings <=> :embedding)) AS similarity "
+    f"FROM {TABLE_NAME} ORDER BY embeddings <=> :embedding LIMIT :max_results"
+)
+
+
+def literal_query(embedding):
+    # how the query was built before, 1536 floats in the statement text
+    reference_array_str = f"ARRAY[{','.join(map(str, embedding))}]::vector"
+    return (
+        f"SELECT page_content, context_data, (1 - (embeddings <=> {reference_array_str})) "
+        f"AS similarity FROM {TABLE_NAME} ORDER BY embeddings <=> {reference_array_str} LIMIT 10"
+    )
+
+
+def new_engine(prepare_threshold):
+    engine = create_engine(
+        driver_url(CONNECTION_STRING),
+        pool_size=1,
+        connect_args={"prepare_threshold": prepare_threshold},
+    )
+    register_vector_types(engine)
+    return engine
+
+
+def run_literal(engine, embeddings):
+    durations, sent_bytes = [], 0
+    with engine.connect() as conn:
+        for embedding in embeddings:
+            query = literal_query(embedding)
+            sent_bytes += len(query)
+            start = time.perf_counter()
+            conn.execute(text(query)).fetchall()
+            durations.append(time.perf_counter() - start)
+    return durations, sent_bytes
+
+
+def run_bound(engine, embeddings):
+    durations, sent_bytes = [], 0
+    query = text(BOUND_QUERY)
+    with engine.connect() as conn:
+        for embedding in embeddings:
+            parameter = vector_param(embedding)
+            # binary vector: 2 bytes dimensions, 2 bytes unused, 4 bytes per float,
+            # bound twice (similarity and order)
+            sent_bytes += len(BOUND_QUERY) + 2 * (4 + parameter.nbytes)
+            start = time.perf_counter()
+            conn.execute(query, {"embedding": parameter, "max_results": 10}).fetchall()
+            durations.append(time.perf_counter() - start)
+    return durations, sent_bytes
+
+
+def report(name, durations, sent_bytes):
+    durations = sorted(durations)
+    print(
+        f"{name:<28} p50 {statistics.median(durations) * 1000:7.2f} ms | "
+        f"p95 {durations[int(len(durations) * 0.95) - 1] * 1000:7.2f} ms | "
+        f"sent {sent_bytes / len(durations) / 1024:6.1f} KiB/query"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=20)
+    args = parser.parse_args()
+
+    embeddings = [
+        fake_embedding(f"benchmark query {index}")
+        for index in range(args.warmup + args.queries)
+    ]
+    warmup, measured = embeddings[: args.warmup], embeddings[args.warmup :]
+
+    for name, engine, run in (
+        ("literal", new_engine(None), run_literal),
+        ("bound binary", new_engine(None), run_bound),
+        ("bound binary, prepared", new_engine(0), run_bound),
+    ):
+        run(engine, warmup)
+        report(name, *run(engine, measured))
+        engine.dispose()
@@ -1,6 +1,6 @@
 # from pydantic import FilePath
 from langchain.pydantic_v1 import BaseModel, Field, FilePath
-from typing import Optional
+from typing import List, Optional
 
 
 class EventSource(BaseModel):
@@ -12,6 +12,12 @@ class PromptParameters(BaseModel):
     prompt: str = Field("What are the impression for the opti.node review")
     # space_id: str = Field("~622753c759c0740069daf1e1")
     source: EventSource
+    # ts of the slack message with the prompt
+    message_ts: Optional[str] = None
+    # ts of the loading message, which gets replaced by the answer
+    loading_message_ts: Optional[str] = None
+    # ts of the thread the prompt was posted in, if any
+    thread_ts: Optional[str] = None
 
 
 class QuestionResponse(BaseModel):
@@ -55,8 +61,8 @@ class GitToolParams(BaseModel):
 
 
 class DeeplDocumentTranslationTool(BaseModel):
-    file_path: FilePath = Field(
-        description="Filepath of original file, provided by systemmessage, if not provided search it in downloads/ within this project"
+    file_paths: List[FilePath] = Field(
+        description="Filepaths of all original files to translate, provided by systemmessage, if not provided search them in downloads/ within this project"
     )
     url: str = Field("")
     target_language_abbrevation: str = Field(
@@ -68,8 +74,8 @@ class DeeplDocumentTranslationTool(BaseModel):
 
 
 class VectorStoreDocumentTool(BaseModel):
-    file_path: FilePath = Field(
-        description="Filepath of original file, provided by systemmessage"
+    file_paths: List[FilePath] = Field(
+        description="Filepaths of all original files, provided by systemmessage"
     )
     slack_channel_id: str = Field(
         description="Source slack channel, provided by default value"
@@ -1,68 +1,93 @@
 from datetime import datetime
 import pytz
 
-from langchain_community.agent_toolkits.load_tools import load_tools
-from langchain.agents import (
-    initialize_agent,
-    AgentType,
-)
+from langchain.agents import AgentExecutor, StructuredChatAgent
+from langchain.agents.structured_chat.prompt import PREFIX
 from langchain.memory import ConversationBufferMemory
-from langchain.schema import SystemMessage
+from langchain_core.prompts import MessagesPlaceholder
 
-from llm.tools.document.document_vector_store_tool import document_vector_store_tool
-from llm.tools.git.git_repo_tool import git_tool
-from llm.tools.webpage.webpage_tool import webpage_tool
-from llm.tools.deepl.file_translation_tool import file_translation_tool
-from llm.tools.image.image_generation_tool import image_generation_tool
-from llm.tools.image.image_operations_tool import image_operations_tool
-from llm.tools.database.rag import pgvector_tool
-from llm.config import GPT_4_CHAT_MODEL
+from llm import config
+from llm.tools import load_custom_tools
+from monitoring.tracing import span, traced
 
-EMPTY_MEMORY = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
-
-
-# prompt_parameters: PromptParameters
-def new_conversional_agent(chat_model=GPT_4_CHAT_MODEL, memory=EMPTY_MEMORY):
-    tools = load_tools(
-        # build in tools
-        [
-            "google-search",
-            # "requests_all",
-            "llm-math",
-        ],
-        llm=chat_model,
-    ) + [
-        document_vector_store_tool,
-        git_tool,
-        webpage_tool,
-        file_translation_tool,
-        image_generation_tool,
-        image_operations_tool,
-        pgvector_tool,
-    ]
-
-    current_date = datetime.now(pytz.timezone("Europe/Berlin")).strftime(
-        "%Y-%m-%d %H:%M:%S %Z"
-    )
-    system_message = f"""
+SYSTEM_MESSAGE = """
         You are a chat bot which helps the user find answers to his question.
         !You have to answer in the language of the user messages, default is always german!
         You have access to different tools like image generation, so if the user wants you to generate a image use the regarding tool!
         You have to return the valid tool params, based on the input and function calling schemas.!
         Use all past messages within your memory for context.
         The current date is {current_date}.
+"""
+
+# built once per chat model and process, see AgentFactory
+AGENT_FACTORIES = {}
+
+
+def current_date() -> str:
+    return datetime.now(pytz.timezone("Europe/Berlin")).strftime("%Y-%m-%d %H:%M:%S %Z")
+
+
+class AgentFactory:
     """
-    system_message = SystemMessage(content=system_message)
+    Holds the tools and the agent (prompt template + llm) of a chat model.
+    Both are stateless, so only the executor with the per request memory is built per request.
+    """
+
+    def __init__(self, chat_model):
+        # imported with the first agent, not with the app
+        from langchain_community.agent_toolkits.load_tools import load_tools
+
+        self.chat_model = chat_model
+        self.tools = (
+            load_tools(
+                # build in tools
+                [
+                    "google-search",
+                    # "requests_all",
+                    "llm-math",
+                ],
+                llm=chat_model,
+            )
+            + load_custom_tools()
+        )
+
+        self.agent = StructuredChatAgent.from_llm_and_tools(
+            chat_model,
+            self.tools,
+            prefix=f"{SYSTEM_MESSAGE}\n{PREFIX}",
+            # the history is only sent through the memory, not within the input
+            memory_prompts=[MessagesPlaceholder(variable_name="chat_history")],
+        )
+        # the date is rendered on every llm call instead of rebuilding the prompt
+        self.agent.llm_chain.prompt = self.agent.llm_chain.prompt.partial(
+            current_date=current_date
+        )
 
-    memory.chat_memory.add_message(system_message)
+    @traced("agent_executor")
+    def new_executor(self, memory) -> AgentExecutor:
+        return AgentExecutor.from_agent_and_tools(
+            agent=self.agent,
+            tools=self.tools,
+            verbose=True,
+            memory=memory,
+            max_iterations=3,
+        )
 
-    conversional_agent = initialize_agent(
-        tools,
-        chat_model,
-        agent=AgentType.STRUCTURED_CHAT_ZERO_SHOT_REACT_DESCRIPTION,
-        verbose=True,
-        memory=memory,
-        max_iterations=3,
-    )
 
-    return conversional_agent
+def get_agent_factory(chat_model=None) -> AgentFactory:
+    chat_model = chat_model or config.GPT_4_CHAT_MODEL
+    # chat models are pydantic models and not hashable, so they are keyed by identity
+    factory = AGENT_FACTORIES.get(id(chat_model))
+    if factory is None:
+        with span("agent_factory"):
+            factory = AGENT_FACTORIES[id(chat_model)] = AgentFactory(chat_model)
+    return factory
+
+
+# prompt_parameters: PromptParameters
+def new_conversional_agent(chat_model=None, memory=None):
+    if memory is None:
+        memory = ConversationBufferMemory(
+            memory_key="chat_history", return_messages=True
+        )
+    return get_agent_factory(chat_model).new_executor(memory)
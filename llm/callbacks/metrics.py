@@ -0,0 +1,94 @@
+import time
+from typing import Any, Dict, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from monitoring.tracing import LLM_TOKENS, observe
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """
+    Records the duration of llm and tool runs as stages "llm:<model>" and "tool:<name>",
+    independent of langfuse. Stateless apart from the runs in flight, one instance is shared.
+    """
+
+    # only bookkeeping, no need to be moved into an executor for async runs
+    run_inline = True
+
+    def __init__(self):
+        # run_id -> (stage, start)
+        self._runs: Dict[UUID, Tuple[str, float]] = {}
+
+    def _start(self, run_id: UUID, stage: str):
+        self._runs[run_id] = (stage, time.perf_counter())
+
+    def _end(self, run_id: UUID, error: bool = False):
+        run = self._runs.pop(run_id, None)
+        if run is not None:
+            stage, start = run
+            observe(stage, time.perf_counter() - start, error=error)
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs: Any):
+        self._start(run_id, f"llm:{model_name(serialized, kwargs)}")
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs: Any):
+        self._start(run_id, f"llm:{model_name(serialized, kwargs)}")
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        run = self._runs.get(run_id)
+        if run is not None:
+            model = run[0].split(":", 1)[1]
+            for kind, tokens in token_usage(response).items():
+                if tokens:
+                    LLM_TOKENS.labels(model, kind).inc(tokens)
+        self._end(run_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id, error=True)
+
+    def on_tool_start(self, serialized, input_str, *, run_id: UUID, **kwargs: Any):
+        self._start(run_id, f"tool:{(serialized or {}).get('name', 'unknown')}")
+
+    def on_tool_end(self, output, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id, error=True)
+
+
+def token_usage(response: LLMResult) -> Dict[str, int]:
+    """
+    Prompt and completion tokens of a run. Streamed runs have no token_usage in llm_output,
+    their usage is in the usage_metadata of the generated messages.
+    """
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return {
+            "prompt_tokens": usage.get("prompt_tokens", 0),
+            "completion_tokens": usage.get("completion_tokens", 0),
+        }
+    usage = {"prompt_tokens": 0, "completion_tokens": 0}
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(
+                getattr(generation, "message", None), "usage_metadata", None
+            )
+            if metadata:
+                usage["prompt_tokens"] += metadata.get("input_tokens", 0)
+                usage["completion_tokens"] += metadata.get("output_tokens", 0)
+    return usage
+
+
+def model_name(serialized: Optional[dict], kwargs: dict) -> str:
+    invocation_params = kwargs.get("invocation_params") or {}
+    return (
+        invocation_params.get("model_name")
+        or invocation_params.get("model")
+        or ((serialized or {}).get("kwargs") or {}).get("model_name")
+        or "unknown"
+    )
+
+
+METRICS_CALLBACK_HANDLER = MetricsCallbackHandler()
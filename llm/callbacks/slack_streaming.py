@@ -0,0 +1,133 @@
+import os
+import re
+import time
+import logging
+from typing import Any, Optional
+from uuid import UUID
+
+from dotenv import load_dotenv
+from langchain_core.callbacks import AsyncCallbackHandler
+from slack_sdk.errors import SlackApiError
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SLACK_STREAMING = os.getenv("SLACK_STREAMING", "true").lower() == "true"
+# chat.update is a tier 3 method (~50 calls per minute), so updates are throttled
+SLACK_STREAM_UPDATE_INTERVAL = float(os.getenv("SLACK_STREAM_UPDATE_INTERVAL", "1.0"))
+# plain text of a section block is limited to 3000 chars
+SLACK_SECTION_TEXT_LIMIT = 3000
+
+FINAL_ANSWER_PATTERN = re.compile(r'"action"\s*:\s*"Final Answer"')
+ACTION_INPUT_PATTERN = re.compile(r'"action_input"\s*:\s*"')
+JSON_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f"}
+
+
+def partial_final_answer(text: str) -> Optional[str]:
+    """
+    Extracts the (possibly incomplete) action_input of a structured chat "Final Answer" blob,
+    returns None while the llm output is not a final answer (yet)
+    """
+    if not FINAL_ANSWER_PATTERN.search(text):
+        return None
+    match = ACTION_INPUT_PATTERN.search(text)
+    if not match:
+        return None
+
+    # decode the json string until its closing quote or the end of the streamed tokens
+    answer = []
+    index = match.end()
+    while index < len(text):
+        char = text[index]
+        if char == '"':
+            break
+        if char == "\\":
+            escaped = text[index + 1 : index + 2]
+            if not escaped:
+                break
+            if escaped == "u":
+                try:
+                    answer.append(chr(int(text[index + 2 : index + 6], 16)))
+                except ValueError:
+                    break
+                index += 6
+                continue
+            answer.append(JSON_ESCAPES.get(escaped, escaped))
+            index += 2
+            continue
+        answer.append(char)
+        index += 1
+    return "".join(answer)
+
+
+class SlackStreamingCallbackHandler(AsyncCallbackHandler):
+    """
+    Streams the final answer of the agent into an existing slack message (the loading message)
+    with throttled chat.update calls.
+    """
+
+    def __init__(
+        self,
+        slack_client,
+        channel: str,
+        message_ts: str,
+        update_interval: float = SLACK_STREAM_UPDATE_INTERVAL,
+    ):
+        self.slack_client = slack_client
+        self.channel = channel
+        self.message_ts = message_ts
+        self.update_interval = update_interval
+        self._outputs = {}
+        self._last_update = 0.0
+        self._last_text = ""
+
+    async def on_llm_new_token(
+        self,
+        token: str,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ) -> None:
+        # each agent iteration is its own llm run, only the final answer run is streamed
+        output = self._outputs.get(run_id, "") + token
+        self._outputs[run_id] = output
+
+        if time.monotonic() - self._last_update < self.update_interval:
+            return
+        answer = partial_final_answer(output)
+        if answer and answer != self._last_text:
+            await self._update(answer)
+
+    async def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._outputs.pop(run_id, None)
+
+    async def on_llm_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        self._outputs.pop(run_id, None)
+
+    async def _update(self, text: str):
+        self._last_update = time.monotonic()
+        self._last_text = text
+        # only the tail fits into the block while streaming, the final message is set afterwards
+        visible_text = text[-SLACK_SECTION_TEXT_LIMIT:]
+        try:
+            await self.slack_client.chat_update(
+                channel=self.channel,
+                ts=self.message_ts,
+                text=visible_text,
+                blocks=[
+                    {
+                        "type": "section",
+                        "text": {
+                            "type": "plain_text",
+                            "text": visible_text,
+                            "emoji": True,
+                        },
+                    }
+                ],
+            )
+        except SlackApiError as e:
+            logger.warning(f"Couldnt stream into slack message: {e.response['error']}")
@@ -0,0 +1,24 @@
+import os
+from functools import lru_cache
+
+from dotenv import load_dotenv
+from slack_sdk import WebClient
+
+load_dotenv()
+
+# overridable for the load test, which runs against a local fake of the slack web api
+SLACK_API_URL = os.getenv("SLACK_API_URL", "https://www.slack.com/api/")
+
+
+# one client per process, shared by all tools instead of one per tool module
+@lru_cache(maxsize=None)
+def get_slack_client() -> WebClient:
+    return WebClient(token=os.getenv("SLACK_BOT_OAUTH_TOKEN"), base_url=SLACK_API_URL)
+
+
+@lru_cache(maxsize=None)
+def get_openai_client():
+    # the openai sdk is slow to import, only the image tools need it directly
+    from openai import OpenAI
+
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
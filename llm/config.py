@@ -1,10 +1,63 @@
 import os
+import threading
 
-from langchain_anthropic import ChatAnthropic
-from langchain_openai import ChatOpenAI
 
-HAIKU_CHAT_MODEL = ChatAnthropic(model_name="claude-3-haiku-20240307", temperature=0.4)
-GPT_4_CHAT_MODEL = ChatOpenAI(model_name="gpt-4o", temperature=0.5)
-GPT_3_5_CHAT_MODEL = ChatOpenAI(model_name="gpt-3.5-turbo-0125", temperature=0.4)
+def new_haiku_chat_model():
+    from langchain_anthropic import ChatAnthropic
+
+    return ChatAnthropic(model_name="claude-3-haiku-20240307", temperature=0.4)
+
+
+def new_gpt_4_chat_model():
+    from langchain_openai import ChatOpenAI
+
+    # streaming for the slack streaming callback, invoke still returns the full message.
+    # streamed responses only report the token usage with stream_usage
+    return ChatOpenAI(
+        model_name="gpt-4o", temperature=0.5, streaming=True, stream_usage=True
+    )
+
+
+def new_gpt_3_5_chat_model():
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(model_name="gpt-3.5-turbo-0125", temperature=0.4)
+
+
+# the chat models (and the openai/anthropic sdks) are created on first access, not on import,
+# e.g. `from llm.config import GPT_4_CHAT_MODEL` within the function which uses it
+LAZY_CHAT_MODELS = {
+    "HAIKU_CHAT_MODEL": new_haiku_chat_model,
+    "GPT_4_CHAT_MODEL": new_gpt_4_chat_model,
+    "GPT_3_5_CHAT_MODEL": new_gpt_3_5_chat_model,
+}
+
+
+LAZY_CHAT_MODELS_LOCK = threading.Lock()
+
+
+def __getattr__(name):
+    if name in LAZY_CHAT_MODELS:
+        # cached as module attribute, so every caller shares one instance
+        with LAZY_CHAT_MODELS_LOCK:
+            if name not in globals():
+                globals()[name] = LAZY_CHAT_MODELS[name]()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# tiktoken budget of the chat history per agent model, older turns get summarized
+MEMORY_TOKEN_BUDGETS = {
+    "gpt-4o": int(os.environ.get("GPT_4_MEMORY_TOKEN_BUDGET", "3000")),
+    "gpt-3.5-turbo-0125": int(os.environ.get("GPT_3_5_MEMORY_TOKEN_BUDGET", "1500")),
+    "claude-3-haiku-20240307": int(os.environ.get("HAIKU_MEMORY_TOKEN_BUDGET", "3000")),
+}
+DEFAULT_MEMORY_TOKEN_BUDGET = 2000
+
+
+def chat_model_name(chat_model) -> str:
+    # openai models call it model_name, anthropic ones model
+    return getattr(chat_model, "model_name", None) or getattr(chat_model, "model", "")
+
 
 CONNECTION_STRING = f"postgresql://{os.environ.get('POSTGRES_USER', 'aisheAI')}:{os.environ.get('POSTGRES_PASSWORD', 'password')}@{os.environ.get('PGVECTOR_HOST', 'localhost')}:{os.environ.get('PGVECTOR_PORT', '5432')}/{os.environ.get('PGVECTOR_DATABASE', 'aisheAI')}"
@@ -0,0 +1,117 @@
+import os
+import logging
+from functools import lru_cache
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+
+from llm.config import CONNECTION_STRING
+from monitoring.tracing import (
+    DB_POOL_CHECKED_OUT,
+    DB_POOL_CHECKOUTS,
+    DB_POOL_CONNECTIONS,
+    DB_POOL_INVALIDATIONS,
+)
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# per process, so the connections of a deployment are workers * (pool size + overflow)
+DATABASE_POOL_SIZE = int(os.getenv("DATABASE_POOL_SIZE", "5"))
+DATABASE_MAX_OVERFLOW = int(os.getenv("DATABASE_MAX_OVERFLOW", "10"))
+DATABASE_POOL_TIMEOUT_SECONDS = int(os.getenv("DATABASE_POOL_TIMEOUT_SECONDS", "30"))
+# below the idle timeout of postgres/proxies in between, stale connections are replaced
+DATABASE_POOL_RECYCLE_SECONDS = int(os.getenv("DATABASE_POOL_RECYCLE_SECONDS", "1800"))
+# executions of a statement before psycopg prepares it server side, 0 prepares on the first
+# one. Leave empty to disable, e.g. behind pgbouncer in transaction mode
+DATABASE_PREPARE_THRESHOLD = os.getenv("DATABASE_PREPARE_THRESHOLD", "0")
+
+
+def is_postgres(url: str) -> bool:
+    return make_url(url).get_backend_name() == "postgresql"
+
+
+def driver_url(url: str) -> str:
+    # psycopg 3 serves sync and async connections, binds parameters server side and
+    # prepares statements, it comes with langchain_postgres
+    if not is_postgres(url):
+        return url
+    return (
+        make_url(url)
+        .set(drivername="postgresql+psycopg")
+        .render_as_string(hide_password=False)
+    )
+
+
+def pool_options(url: str) -> dict:
+    # the queue pool options only apply to server databases, e.g. not to a sqlite dedup store
+    if not is_postgres(url):
+        return {"pool_pre_ping": True}
+    return {
+        "pool_size": DATABASE_POOL_SIZE,
+        "max_overflow": DATABASE_MAX_OVERFLOW,
+        "pool_timeout": DATABASE_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": DATABASE_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": True,
+        "connect_args": {
+            "prepare_threshold": (
+                int(DATABASE_PREPARE_THRESHOLD) if DATABASE_PREPARE_THRESHOLD else None
+            )
+        },
+    }
+
+
+def register_pool_metrics(engine: Engine, name: str):
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        DB_POOL_CONNECTIONS.labels(name).inc()
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_POOL_CHECKOUTS.labels(name).inc()
+        DB_POOL_CHECKED_OUT.labels(name).inc()
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        DB_POOL_CHECKED_OUT.labels(name).dec()
+
+    @event.listens_for(engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        DB_POOL_INVALIDATIONS.labels(name).inc()
+
+
+def register_vector_types(engine: Engine):
+    """
+    Registers the pgvector dumpers/loaders on every new connection, numpy arrays are then
+    bound as binary vector parameters and vector columns are read as numpy arrays.
+    """
+    from psycopg import ProgrammingError
+    from pgvector.psycopg import register_vector
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        try:
+            register_vector(dbapi_connection)
+        except ProgrammingError:
+            # e.g. a slack store on a database without the vector extension
+            logger.warning("vector type not found, vector parameters are not bound")
+
+
+def engine_label(url: str) -> str:
+    url = make_url(url)
+    return f"{url.get_backend_name()}/{url.database}"
+
+
+@lru_cache(maxsize=None)
+def get_engine(url: str = CONNECTION_STRING) -> Engine:
+    """
+    Process wide pooled engine per database url, shared by the vector stores, the slack
+    history and the event dedup store. Never dispose it per request.
+    """
+    engine = create_engine(driver_url(url), **pool_options(url))
+    register_pool_metrics(engine, engine_label(url))
+    if is_postgres(url):
+        register_vector_types(engine)
+    return engine
@@ -0,0 +1,230 @@
+import os
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Iterator, List, Optional
+
+from dotenv import load_dotenv
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from monitoring.tracing import span
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# openai allows 2048 inputs and 300k tokens per embeddings request
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "50000"))
+EMBEDDING_BATCH_MAX_INPUTS = int(os.getenv("EMBEDDING_BATCH_MAX_INPUTS", "512"))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+# limits of the organization's tier, shared by the batches of a process
+EMBEDDING_RPM_LIMIT = int(os.getenv("EMBEDDING_RPM_LIMIT", "3000"))
+EMBEDDING_TPM_LIMIT = int(os.getenv("EMBEDDING_TPM_LIMIT", "1000000"))
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "6"))
+EMBEDDING_RETRY_BASE_SECONDS = 1.0
+EMBEDDING_RETRY_MAX_SECONDS = 60.0
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+@lru_cache(maxsize=None)
+def get_token_encoding():
+    import tiktoken
+
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as error:
+        # the encoding is downloaded on first use
+        logger.warning(f"Couldnt load the token encoding, estimating tokens: {error}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = get_token_encoding()
+    if encoding is None:
+        # ~4 bytes per token for english text
+        return len(text.encode()) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+class TokenBucket:
+    """
+    Refills rate_per_minute units per minute up to one minute worth, acquire blocks until
+    the amount is available. An amount above the capacity waits for a full bucket.
+    """
+
+    def __init__(self, rate_per_minute: int):
+        self.capacity = float(rate_per_minute)
+        self.rate = rate_per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated_at) * self.rate
+                )
+                self.updated_at = now
+                needed = min(amount, self.capacity)
+                if self.tokens >= needed:
+                    self.tokens -= amount
+                    return
+                wait_seconds = (needed - self.tokens) / self.rate
+            time.sleep(wait_seconds)
+
+
+@dataclass
+class EmbeddingBatch:
+    documents: List[Document]
+    ids: List[str]
+    tokens: int
+
+
+def token_batches(
+    documents: List[Document],
+    ids: List[str],
+    max_tokens: int = EMBEDDING_BATCH_MAX_TOKENS,
+    max_inputs: int = EMBEDDING_BATCH_MAX_INPUTS,
+) -> Iterator[EmbeddingBatch]:
+    batch = EmbeddingBatch([], [], 0)
+    for document, id in zip(documents, ids):
+        tokens = count_tokens(document.page_content)
+        if batch.documents and (
+            batch.tokens + tokens > max_tokens or len(batch.documents) >= max_inputs
+        ):
+            yield batch
+            batch = EmbeddingBatch([], [], 0)
+        batch.documents.append(document)
+        batch.ids.append(id)
+        batch.tokens += tokens
+    if batch.documents:
+        yield batch
+
+
+def is_retryable(error: Exception) -> bool:
+    # imported with the embeddings client anyway, not on import of the app
+    import httpx
+    from openai import APIConnectionError, APITimeoutError
+
+    # connection errors and timeouts have no status
+    if isinstance(
+        error, (APIConnectionError, APITimeoutError, httpx.TransportError, TimeoutError)
+    ):
+        return True
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    return status_code in RETRYABLE_STATUS_CODES
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class EmbeddingScheduler:
+    """
+    Embeds documents in token bounded batches with several concurrent requests, within the
+    requests and tokens per minute of the account. Finished batches are handed to the sink
+    (e.g. a vector store's add_embeddings) while the others are still embedded.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        concurrency: int = EMBEDDING_CONCURRENCY,
+        rpm_limit: int = EMBEDDING_RPM_LIMIT,
+        tpm_limit: int = EMBEDDING_TPM_LIMIT,
+        max_retries: int = EMBEDDING_MAX_RETRIES,
+        max_batch_tokens: int = EMBEDDING_BATCH_MAX_TOKENS,
+        max_batch_inputs: int = EMBEDDING_BATCH_MAX_INPUTS,
+    ):
+        self.embeddings = embeddings
+        self.concurrency = concurrency
+        self.requests = TokenBucket(rpm_limit)
+        self.tokens = TokenBucket(tpm_limit)
+        self.max_retries = max_retries
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_inputs = max_batch_inputs
+
+    def embed_into(
+        self,
+        documents: List[Document],
+        ids: List[str],
+        sink: Callable[..., object],
+    ) -> int:
+        """
+        Embeds the documents and calls sink(texts=, embeddings=, metadatas=, ids=) per
+        finished batch, in the calling thread. Returns the number of embedded documents.
+        """
+        batches = token_batches(
+            documents, ids, self.max_batch_tokens, self.max_batch_inputs
+        )
+        embedded = 0
+        executor = ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="embedding"
+        )
+        try:
+            futures = {
+                executor.submit(self._embed_batch, batch): batch for batch in batches
+            }
+            for future in as_completed(futures):
+                batch = futures[future]
+                vectors = future.result()
+                with span("embedding_store"):
+                    sink(
+                        texts=[document.page_content for document in batch.documents],
+                        embeddings=vectors,
+                        metadatas=[document.metadata for document in batch.documents],
+                        ids=batch.ids,
+                    )
+                embedded += len(batch.documents)
+        finally:
+            # a failed batch or sink stops the ingestion, queued batches are not sent
+            executor.shutdown(wait=True, cancel_futures=True)
+        return embedded
+
+    def _embed_batch(self, batch: EmbeddingBatch) -> List[List[float]]:
+        texts = [document.page_content for document in batch.documents]
+        for attempt in range(self.max_retries + 1):
+            self.requests.acquire(1)
+            self.tokens.acquire(batch.tokens)
+            try:
+                with span("embedding_batch"):
+                    return self.embeddings.embed_documents(texts)
+            except Exception as error:
+                if attempt == self.max_retries or not is_retryable(error):
+                    raise
+                # exponential with full jitter, unless the server says how long to wait
+                wait_seconds = retry_after_seconds(error) or random.uniform(
+                    0,
+                    min(
+                        EMBEDDING_RETRY_MAX_SECONDS,
+                        EMBEDDING_RETRY_BASE_SECONDS * 2**attempt,
+                    ),
+                )
+                logger.warning(
+                    f"Embedding batch of {len(texts)} failed ({error}), "
+                    f"retry {attempt + 1}/{self.max_retries} in {wait_seconds:.1f}s"
+                )
+                time.sleep(wait_seconds)
+
+
+@lru_cache(maxsize=None)
+def get_embedding_scheduler() -> EmbeddingScheduler:
+    """
+    Scheduler of a process, its rate limits are shared by all ingestions
+    """
+    from llm.embeddings import get_embeddings
+
+    return EmbeddingScheduler(get_embeddings())
@@ -0,0 +1,199 @@
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+from sqlalchemy import bindparam, text
+
+from llm.config import CONNECTION_STRING
+from llm.database import get_engine
+from monitoring.tracing import CACHE_REQUESTS
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# vectors kept per process, 1536 float32 are 6 KiB, so 10000 entries are ~60 MiB
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+# any sqlalchemy url shared by all workers, empty disables the persistent cache
+EMBEDDING_CACHE_DATABASE_URL = os.getenv(
+    "EMBEDDING_CACHE_DATABASE_URL", CONNECTION_STRING
+)
+EMBEDDING_CACHE_TABLE_NAME = "embedding_cache"
+
+
+def normalize_text(text: str) -> str:
+    # whitespace only, case and punctuation change the embedding
+    return " ".join(text.split())
+
+
+def text_hash(text: str) -> bytes:
+    return hashlib.sha256(text.encode()).digest()
+
+
+def embeddings_model_name(embeddings: Embeddings) -> str:
+    # vectors of different models or dimensions never share an entry
+    model = getattr(embeddings, "model", None) or type(embeddings).__name__
+    dimensions = getattr(embeddings, "dimensions", None)
+    return f"{model}:{dimensions}" if dimensions else model
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings in front of another Embeddings (e.g. OpenAIEmbeddings), texts already embedded
+    are served from an in process LRU or the persistent embedding cache table, keyed by the
+    model and the hash of the whitespace normalized text. Vectors are stored as float32 bytes.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        database_url: Optional[str] = EMBEDDING_CACHE_DATABASE_URL,
+        max_size: int = EMBEDDING_CACHE_SIZE,
+    ):
+        self.embeddings = embeddings
+        self.model_name = embeddings_model_name(embeddings)
+        self.engine = get_engine(database_url) if database_url else None
+        self.max_size = max_size
+        # text hash -> float32 vector
+        self._vectors = OrderedDict()
+        self._lock = threading.Lock()
+        self._table_ready = False
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        normalized = [normalize_text(text) for text in texts]
+        hashes = [text_hash(text) for text in normalized]
+
+        vectors = self._memory_lookup(hashes)
+        missing = [key for key in dict.fromkeys(hashes) if key not in vectors]
+        if missing:
+            stored = self._database_lookup(missing)
+            for key, vector in stored.items():
+                self._memory_store(key, vector)
+            vectors.update(stored)
+            missing = [key for key in missing if key not in stored]
+
+        if missing:
+            texts_by_hash = dict(zip(hashes, normalized))
+            embedded = self.embeddings.embed_documents(
+                [texts_by_hash[key] for key in missing]
+            )
+            new_vectors = {
+                key: np.asarray(vector, dtype=np.float32)
+                for key, vector in zip(missing, embedded)
+            }
+            self._database_store(new_vectors)
+            for key, vector in new_vectors.items():
+                self._memory_store(key, vector)
+            vectors.update(new_vectors)
+
+        return [vectors[key].tolist() for key in hashes]
+
+    def _memory_lookup(self, hashes: List[bytes]) -> Dict[bytes, np.ndarray]:
+        vectors = {}
+        with self._lock:
+            for key in hashes:
+                vector = self._vectors.get(key)
+                if vector is not None:
+                    self._vectors.move_to_end(key)
+                    vectors[key] = vector
+        CACHE_REQUESTS.labels("embedding_memory", "hit").inc(len(vectors))
+        CACHE_REQUESTS.labels("embedding_memory", "miss").inc(
+            len(set(hashes)) - len(vectors)
+        )
+        return vectors
+
+    def _memory_store(self, key: bytes, vector: np.ndarray):
+        with self._lock:
+            self._vectors[key] = vector
+            self._vectors.move_to_end(key)
+            while len(self._vectors) > self.max_size:
+                self._vectors.popitem(last=False)
+
+    def _ensure_table(self):
+        if self._table_ready:
+            return
+        with self._lock:
+            if self._table_ready:
+                return
+            with self.engine.begin() as conn:
+                conn.execute(
+                    text(
+                        f"CREATE TABLE IF NOT EXISTS {EMBEDDING_CACHE_TABLE_NAME} ("
+                        f"model VARCHAR(255) NOT NULL, "
+                        f"text_hash BYTEA NOT NULL, "
+                        f"embedding BYTEA NOT NULL, "
+                        f"PRIMARY KEY (model, text_hash))"
+                    )
+                )
+            self._table_ready = True
+
+    def _database_lookup(self, hashes: List[bytes]) -> Dict[bytes, np.ndarray]:
+        if self.engine is None:
+            return {}
+        try:
+            self._ensure_table()
+            with self.engine.connect() as conn:
+                rows = conn.execute(
+                    text(
+                        f"SELECT text_hash, embedding FROM {EMBEDDING_CACHE_TABLE_NAME} "
+                        f"WHERE model = :model AND text_hash IN :hashes"
+                    ).bindparams(bindparam("hashes", expanding=True)),
+                    {"model": self.model_name, "hashes": hashes},
+                ).fetchall()
+        except Exception as error:
+            # embedding without the cache is slower, not wrong
+            logger.warning(f"Embedding cache unavailable: {error}")
+            return {}
+
+        vectors = {
+            bytes(key): np.frombuffer(embedding, dtype=np.float32)
+            for key, embedding in rows
+        }
+        CACHE_REQUESTS.labels("embedding_database", "hit").inc(len(vectors))
+        CACHE_REQUESTS.labels("embedding_database", "miss").inc(
+            len(hashes) - len(vectors)
+        )
+        return vectors
+
+    def _database_store(self, vectors: Dict[bytes, np.ndarray]):
+        if self.engine is None:
+            return
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(
+                    text(
+                        f"INSERT INTO {EMBEDDING_CACHE_TABLE_NAME} (model, text_hash, embedding) "
+                        f"VALUES (:model, :text_hash, :embedding) "
+                        f"ON CONFLICT (model, text_hash) DO NOTHING"
+                    ),
+                    [
+                        {
+                            "model": self.model_name,
+                            "text_hash": key,
+                            "embedding": vector.tobytes(),
+                        }
+                        for key, vector in vectors.items()
+                    ],
+                )
+        except Exception as error:
+            logger.warning(f"Couldnt store embeddings in the cache: {error}")
+
+
+@lru_cache(maxsize=None)
+def get_embeddings() -> CachedEmbeddings:
+    """
+    Cached OpenAIEmbeddings shared by the vector stores of a process
+    """
+    from langchain_openai import OpenAIEmbeddings
+
+    return CachedEmbeddings(OpenAIEmbeddings())
@@ -1,41 +1,90 @@
-from slack_sdk.errors import SlackApiError
+import os
+import logging
+from collections import OrderedDict
 
-from langchain.memory import ConversationBufferMemory
+from slack_sdk.errors import SlackApiError
 
 from data_models.models import PromptParameters
 from data_models.constants import LOADING_INDICATOR, CUSTOM_SLACK_COMMANDS
+from llm import config
+from llm.config import (
+    MEMORY_TOKEN_BUDGETS,
+    DEFAULT_MEMORY_TOKEN_BUDGET,
+    chat_model_name,
+)
+from llm.memory.token_budget_memory import TokenBudgetMemory
+
+logger = logging.getLogger(__name__)
+
+# messages considered for the memory, the token budget decides how many are sent as is
+SLACK_MEMORY_MESSAGES = int(os.getenv("SLACK_MEMORY_MESSAGES", "20"))
+SLACK_MEMORY_SUMMARY_CHANNELS = int(os.getenv("SLACK_MEMORY_SUMMARY_CHANNELS", "1000"))
+
+# channel -> (running summary, ts of the newest summarized message)
+# bounded, so the memory of a worker stays flat
+CHANNEL_SUMMARIES = OrderedDict()
 
 
-def slack_to_llm_memory(slack_client, prompt_parameters: PromptParameters, limit=5):
-    memory = ConversationBufferMemory(
+def store_channel_summary(channel_id, summary, summarized_until):
+    CHANNEL_SUMMARIES[channel_id] = (summary, summarized_until)
+    CHANNEL_SUMMARIES.move_to_end(channel_id)
+    while len(CHANNEL_SUMMARIES) > SLACK_MEMORY_SUMMARY_CHANNELS:
+        CHANNEL_SUMMARIES.popitem(last=False)
+
+
+async def slack_to_llm_memory(
+    slack_history,
+    prompt_parameters: PromptParameters,
+    chat_model=None,
+    limit=SLACK_MEMORY_MESSAGES,
+):
+    chat_model = chat_model or config.GPT_4_CHAT_MODEL
+    channel_id = prompt_parameters.source.id
+    summary, summarized_until = CHANNEL_SUMMARIES.get(channel_id, ("", "0"))
+    model_name = chat_model_name(chat_model)
+    memory = TokenBudgetMemory(
         memory_key="chat_history",
-        # input_key="input",
-        # output_key="answer",
         return_messages=True,
+        model_name=model_name,
+        max_token_limit=MEMORY_TOKEN_BUDGETS.get(
+            model_name, DEFAULT_MEMORY_TOKEN_BUDGET
+        ),
+        summary_llm=config.GPT_3_5_CHAT_MODEL,
+        summary=summary,
     )
 
     try:
-        # Fetch the last 100 messages (maximum limit)
-        response = slack_client.conversations_history(
-            channel=prompt_parameters.source.id, limit=limit
-        )
-
-        messages = response["messages"]
+        # served from the channel ring buffer, slack is only queried if it is cold
+        messages = await slack_history.latest(channel_id, limit)
 
         non_command_messages = [
             message
             for message in messages
             # "bot_id" not in message and
             if message["text"] not in ([LOADING_INDICATOR] + CUSTOM_SLACK_COMMANDS)
+            # the prompt itself is the agent input, not history
+            and message.get("ts") != prompt_parameters.message_ts
+            # already part of the running summary
+            and float(message["ts"]) > float(summarized_until)
         ]
+        ordered_messages = list(reversed(non_command_messages))
 
-        for message in reversed(non_command_messages):
+        for message in ordered_messages:
             if "bot_id" in message:
                 # This is a bot message
                 memory.chat_memory.add_ai_message(message["text"])
             else:
                 # This is a user message
                 memory.chat_memory.add_user_message(message["text"])
-        return memory
+
+        # only turns which dont fit the budget anymore are summarized, each of them once
+        pruned = await memory.aprune()
+        if pruned:
+            summarized_until = ordered_messages[len(pruned) - 1]["ts"]
+        store_channel_summary(channel_id, memory.summary, summarized_until)
     except SlackApiError as e:
         print(f"Error: {e.response['error']}")
+    except Exception as e:
+        # history without the new summary is still better than no answer
+        logger.error(f"Couldnt summarize slack history of {channel_id}: {e}")
+    return memory
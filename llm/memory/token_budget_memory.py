@@ -0,0 +1,119 @@
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+import tiktoken
+from langchain.memory.chat_memory import BaseChatMemory
+from langchain.memory.prompt import SUMMARY_PROMPT
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.messages import BaseMessage, SystemMessage, get_buffer_string
+
+# openai cookbook: every message costs its role and separators on top of the content
+TOKENS_PER_MESSAGE = 4
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model_name: str) -> tiktoken.Encoding:
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        # e.g. anthropic models, close enough for budgeting
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(messages: List[BaseMessage], model_name: str) -> int:
+    encoding = get_encoding(model_name)
+    return sum(
+        len(encoding.encode(str(message.content))) + TOKENS_PER_MESSAGE
+        for message in messages
+    )
+
+
+class TokenBudgetMemory(BaseChatMemory):
+    """
+    Chat memory which stays within a token budget of the agent model.
+    Turns which dont fit anymore are folded into a running summary by a (cheaper) summary llm.
+    Read only, the conversation itself is kept by the chat platform (e.g. slack history).
+    """
+
+    memory_key: str = "chat_history"
+    return_messages: bool = True
+    model_name: str = "gpt-4o"
+    max_token_limit: int = 2000
+    summary_llm: Optional[BaseLanguageModel] = None
+    summary: str = ""
+
+    @property
+    def memory_variables(self) -> List[str]:
+        return [self.memory_key]
+
+    def summary_message(self) -> Optional[SystemMessage]:
+        if not self.summary:
+            return None
+        return SystemMessage(
+            content=f"Summary of the earlier conversation: {self.summary}"
+        )
+
+    def buffer_messages(self) -> List[BaseMessage]:
+        summary_message = self.summary_message()
+        messages = list(self.chat_memory.messages)
+        return [summary_message] + messages if summary_message else messages
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        messages = self.buffer_messages()
+        if self.return_messages:
+            return {self.memory_key: messages}
+        return {self.memory_key: get_buffer_string(messages)}
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        # the answer is part of the next history anyway, saving it would cost a summary call
+        pass
+
+    async def asave_context(
+        self, inputs: Dict[str, Any], outputs: Dict[str, str]
+    ) -> None:
+        pass
+
+    def is_over_budget(self) -> bool:
+        return (
+            count_tokens(self.buffer_messages(), self.model_name) > self.max_token_limit
+        )
+
+    async def aprune(self) -> List[BaseMessage]:
+        """
+        Removes the oldest messages until the buffer, including the summary, fits the budget,
+        returns the removed ones
+        """
+        messages = self.chat_memory.messages
+        pruned = []
+        while True:
+            newly_pruned = []
+            while messages and self.is_over_budget():
+                newly_pruned.append(messages.pop(0))
+            pruned.extend(newly_pruned)
+            if not newly_pruned or self.summary_llm is None:
+                break
+            summary = await self.summary_llm.ainvoke(
+                SUMMARY_PROMPT.format(
+                    summary=self.summary, new_lines=get_buffer_string(newly_pruned)
+                )
+            )
+            # the new summary can be longer than the old one, checked again
+            self.summary = summary.content
+
+        if self.is_over_budget():
+            # no message left, the summary alone is too long
+            self.truncate_summary()
+        return pruned
+
+    def truncate_summary(self):
+        # longest prefix of words within the budget, by bisection
+        words = self.summary.split()
+        low, high = 0, len(words)
+        while low < high:
+            middle = (low + high + 1) // 2
+            self.summary = " ".join(words[:middle])
+            if self.is_over_budget():
+                high = middle - 1
+            else:
+                low = middle
+        self.summary = " ".join(words[:low])
@@ -0,0 +1,47 @@
+import importlib
+from typing import List, Optional
+
+# tool name -> (module, attribute)
+# tool modules are imported when an agent is built, not when the app is imported
+TOOL_REGISTRY = {
+    "document_vector_store": (
+        "llm.tools.document.document_vector_store_tool",
+        "document_vector_store_tool",
+    ),
+    "git_search": ("llm.tools.git.git_repo_tool", "git_tool"),
+    "webpage_content_search": ("llm.tools.webpage.webpage_tool", "webpage_tool"),
+    "file_translation": (
+        "llm.tools.deepl.file_translation_tool",
+        "file_translation_tool",
+    ),
+    "image_generation": (
+        "llm.tools.image.image_generation_tool",
+        "image_generation_tool",
+    ),
+    "image_operations": (
+        "llm.tools.image.image_operations_tool",
+        "image_operations_tool",
+    ),
+    "pgvector_search": ("llm.tools.database.rag", "pgvector_tool"),
+    "confluence_search": ("llm.tools.confluence.confluence_tool", "confluence_tool"),
+}
+
+# custom tools of the conversational agent
+AGENT_TOOL_NAMES = [
+    "document_vector_store",
+    "git_search",
+    "webpage_content_search",
+    "file_translation",
+    "image_generation",
+    "image_operations",
+    "pgvector_search",
+]
+
+
+def load_tool(name: str):
+    module_name, attribute = TOOL_REGISTRY[name]
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def load_custom_tools(names: Optional[List[str]] = None) -> list:
+    return [load_tool(name) for name in (names or AGENT_TOOL_NAMES)]
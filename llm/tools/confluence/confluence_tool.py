@@ -2,16 +2,10 @@ import os
 import json
 from dotenv import load_dotenv
 
-from langchain.chains import ConversationalRetrievalChain
 from langchain.tools import tool
-from langchain_community.document_loaders import ConfluenceLoader
-from langchain.text_splitter import CharacterTextSplitter
-from langchain.memory import ConversationBufferMemory
-from langchain.schema import SystemMessage
 
 from data_models.models import ConfluenceToolParams
 from llm.vector_store import new_vector_store
-from llm.config import GPT_4_CHAT_MODEL
 
 load_dotenv()
 
@@ -27,6 +21,13 @@ def confluence_tool(
     """
     Use this tool for handling a prompt regarding a confluence page.
     """
+    # atlassian and the loaders are only imported on first use
+    from langchain.chains import ConversationalRetrievalChain
+    from langchain_community.document_loaders import ConfluenceLoader
+    from langchain.text_splitter import CharacterTextSplitter
+    from langchain.memory import ConversationBufferMemory
+    from langchain.schema import SystemMessage
+    from llm.config import GPT_4_CHAT_MODEL
 
     loader = ConfluenceLoader(
         url=CONFLUENCE_URL,
@@ -2,14 +2,10 @@ import json
 import os
 from dotenv import load_dotenv
 
-from langchain.chains import ConversationalRetrievalChain
 from langchain.tools import tool
-from langchain.memory import ConversationBufferMemory
-from langchain.schema import SystemMessage
 
-from llm.config import GPT_4_CHAT_MODEL
 from data_models.models import PgVectorToolParams
-from llm.vectorstores.pgvector.non_rbac import NonRBACVectorStore
+from monitoring.tracing import span
 
 load_dotenv()
 
@@ -21,6 +17,13 @@ def pgvector_tool(prompt: str) -> str:
     """
     Use this tool for handling a prompt which asks needs retrieval augmented generation(rag). Current knowlegde within the db: - Titanic passenger/crew information You are not allowed to use this for google
     """
+    # the vector store pulls in sqlmodel and pgvector, only imported on first use
+    from langchain.chains import ConversationalRetrievalChain
+    from langchain.memory import ConversationBufferMemory
+    from langchain.schema import SystemMessage
+    from llm.config import GPT_4_CHAT_MODEL
+    from llm.vectorstores.pgvector.non_rbac import get_non_rbac_vector_store
+
     llm = GPT_4_CHAT_MODEL
 
     memory = ConversationBufferMemory(
@@ -39,7 +42,7 @@ def pgvector_tool(prompt: str) -> str:
 
     memory.chat_memory.add_message(system_message)
 
-    vector_store = NonRBACVectorStore()
+    vector_store = get_non_rbac_vector_store()
     retriever = vector_store.as_retriever()
     conversation_qa_chain = ConversationalRetrievalChain.from_llm(
         llm,
@@ -47,7 +50,8 @@ def pgvector_tool(prompt: str) -> str:
         memory=memory,
         return_source_documents=True,
     )
-    conversation_result = conversation_qa_chain({"question": prompt})
+    with span("pgvector_qa"):
+        conversation_result = conversation_qa_chain({"question": prompt})
 
     link_blocks = [
         {
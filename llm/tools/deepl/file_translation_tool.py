@@ -1,33 +1,27 @@
 import requests
 import os
 import time
-
-from slack_sdk import WebClient
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
 
 from dotenv import load_dotenv
 
 from langchain.tools import tool
 
 from data_models.models import DeeplDocumentTranslationTool
+from llm.clients import get_slack_client
 
 load_dotenv()
 
-SLACK_BOT_OAUTH_TOKEN = os.getenv("SLACK_BOT_OAUTH_TOKEN")
-SLACK_BOT_ID = os.getenv("SLACK_BOT_ID")
-SLACK_CLIENT = WebClient(token=SLACK_BOT_OAUTH_TOKEN)
-
 DEEPL_API_KEY = os.getenv("DEEPL_API_KEY")
 DEEPL_API_URL = os.getenv("DEEPL_API_URL")
+# documents translated at once, each one is a polling thread
+DEEPL_MAX_CONCURRENT_TRANSLATIONS = 4
 
 
-@tool("file_translation", return_direct=True, args_schema=DeeplDocumentTranslationTool)
-def file_translation_tool(
-    file_path: str,
-    target_language_abbrevation: str,
-    slack_channel_id: str,
-) -> str:
+def translate_file(file_path: str, target_language_abbrevation: str) -> str:
     """
-    Use this tool for translating a document into a specific language.
+    Translates one file with deepl, returns the path of the translated file
     """
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"No file found at {file_path}")
@@ -64,21 +58,52 @@ def file_translation_tool(
             translation_response.raise_for_status()  # Raise an exception for HTTP errors
 
             # Save the translated document to a file
-            new_file_path = (
-                f"downloads/{target_language_abbrevation}_{os.path.basename(file_path)}"
+            # next to the original file, which lives in its own directory per slack file
+            new_file_path = os.path.join(
+                os.path.dirname(file_path),
+                f"{target_language_abbrevation}_{os.path.basename(file_path)}",
             )
             with open(new_file_path, "wb") as new_file:
                 new_file.write(translation_response.content)
             break  # Exit the while loop once the document is translated
 
-    SLACK_CLIENT.files_upload(
-        channels=slack_channel_id,
-        file=new_file_path,
-        title=f"Translated Document: {os.path.basename(new_file_path)}",
-        initial_comment=f"Translation completed! Here's the translated document.",
-    )
+    return new_file_path
+
+
+@tool("file_translation", return_direct=True, args_schema=DeeplDocumentTranslationTool)
+def file_translation_tool(
+    file_paths: List[str],
+    target_language_abbrevation: str,
+    slack_channel_id: str,
+) -> str:
+    """
+    Use this tool for translating documents into a specific language, pass all files at once.
+    """
+    if not file_paths:
+        return "No files to translate."
+
+    # deepl translates the documents in parallel, so only the slowest one is waited for
+    with ThreadPoolExecutor(
+        max_workers=min(len(file_paths), DEEPL_MAX_CONCURRENT_TRANSLATIONS)
+    ) as executor:
+        new_file_paths = list(
+            executor.map(
+                lambda file_path: translate_file(
+                    file_path, target_language_abbrevation
+                ),
+                file_paths,
+            )
+        )
+
+    for new_file_path in new_file_paths:
+        get_slack_client().files_upload(
+            channels=slack_channel_id,
+            file=new_file_path,
+            title=f"Translated Document: {os.path.basename(new_file_path)}",
+            initial_comment=f"Translation completed! Here's the translated document.",
+        )
 
-    os.remove(file_path)
-    os.remove(new_file_path)
+        # the original file stays in the download cache, which evicts it
+        os.remove(new_file_path)
 
-    return new_file_path  # Return the path to the new file
+    return ", ".join(new_file_paths)  # Return the paths to the new files
@@ -1,48 +1,37 @@
 import os
 import json
+from typing import List
 
 from dotenv import load_dotenv
 
 from langchain.tools import tool
-from langchain_community.document_loaders import (
-    Docx2txtLoader,
-    PyPDFLoader,
-    UnstructuredFileLoader,
-)
-from langchain.text_splitter import (
-    CharacterTextSplitter,
-)
-from langchain.chains import ConversationalRetrievalChain
-from langchain.memory import ConversationBufferMemory
 
 
 from data_models.models import VectorStoreDocumentTool
 from llm.vector_store import new_vector_store
 
-from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
 
 
 from data_models.models import *
-from llm.config import GPT_4_CHAT_MODEL
+from llm.clients import get_slack_client
+from monitoring.tracing import span
 
 load_dotenv()
 
-SLACK_BOT_OAUTH_TOKEN = os.getenv("SLACK_BOT_OAUTH_TOKEN")
-SLACK_BOT_ID = os.getenv("SLACK_BOT_ID")
-SLACK_CLIENT = WebClient(token=SLACK_BOT_OAUTH_TOKEN)
-
 DEEPL_API_KEY = os.getenv("DEEPL_API_KEY")
 DEEPL_API_URL = os.getenv("DEEPL_API_URL")
 
 
-@tool("document_vector_store", return_direct=True, args_schema=VectorStoreDocumentTool)
-def document_vector_store_tool(
-    file_path: str, slack_channel_id: str, prompt: str
-) -> str:
-    """
-    Use this tool for answering document related prompts from user.
-    """
+def load_document(file_path):
+    # the loaders pull in unstructured, pypdf and docx, only imported on first use
+    from langchain_community.document_loaders import (
+        Docx2txtLoader,
+        PyPDFLoader,
+        UnstructuredFileLoader,
+    )
+    from langchain.text_splitter import CharacterTextSplitter
+
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"No file found at {file_path}")
 
@@ -59,8 +48,27 @@ def document_vector_store_tool(
     text_splitter = CharacterTextSplitter.from_tiktoken_encoder(
         chunk_size=2000, chunk_overlap=1000
     )
-    documents = loader.load_and_split(text_splitter)
-    vector_store = new_vector_store(documents)
+    return loader.load_and_split(text_splitter)
+
+
+@tool("document_vector_store", return_direct=True, args_schema=VectorStoreDocumentTool)
+def document_vector_store_tool(
+    file_paths: List[str], slack_channel_id: str, prompt: str
+) -> str:
+    """
+    Use this tool for answering document related prompts from user, pass all files at once.
+    """
+    from langchain.chains import ConversationalRetrievalChain
+    from langchain.memory import ConversationBufferMemory
+    from llm.config import GPT_4_CHAT_MODEL
+
+    # all files share one vector store, so the prompt is answered across them in one go
+    documents = []
+    with span("document_load"):
+        for file_path in file_paths:
+            documents.extend(load_document(file_path))
+    with span("document_embedding"):
+        vector_store = new_vector_store(documents)
 
     memory = ConversationBufferMemory(
         memory_key="chat_history",
@@ -77,7 +85,8 @@ def document_vector_store_tool(
         memory=memory,
         return_source_documents=True,
     )
-    conversation_result = conversation_qa_chain({"question": prompt})
+    with span("document_qa"):
+        conversation_result = conversation_qa_chain({"question": prompt})
 
     print(conversation_result)
 
@@ -133,12 +142,13 @@ def document_vector_store_tool(
             },
         },
     )
-    SLACK_CLIENT.chat_postMessage(
-        channel=slack_channel_id,
-        # text=f"{simple_result['result']} || {conversation_result['chat_history'][-1].content}",
-        text=conversation_result["chat_history"][-1].content,
-        blocks=link_blocks,
-    )
+    with span("slack_post_answer"):
+        get_slack_client().chat_postMessage(
+            channel=slack_channel_id,
+            # text=f"{simple_result['result']} || {conversation_result['chat_history'][-1].content}",
+            text=conversation_result["chat_history"][-1].content,
+            blocks=link_blocks,
+        )
 
     return json.dumps(
         {
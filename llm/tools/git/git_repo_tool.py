@@ -2,19 +2,11 @@ import json
 import shutil
 import re
 
-from langchain.chains import ConversationalRetrievalChain
 from langchain.tools import tool
-from langchain.text_splitter import CharacterTextSplitter
-from langchain.memory import ConversationBufferMemory
-from langchain.schema import SystemMessage
-from langchain.text_splitter import CharacterTextSplitter
-from git import Repo
-from langchain_community.document_loaders import GitLoader
 
 from data_models.models import GitToolParams
 from llm.vector_store import new_vector_store
 from data_models.constants import ALLOWED_FILE_EXTENSIONS
-from llm.config import GPT_4_CHAT_MODEL
 
 
 @tool("git_search", return_direct=True, args_schema=GitToolParams)
@@ -22,6 +14,15 @@ def git_tool(prompt: str, url: str, project_name: str, branch_name: str) -> str:
     """
     Use this tool for handling a prompt regarding a repo, when given its url by the user
     """
+    # gitpython and the loaders are only imported on first use
+    from git import Repo
+    from langchain.chains import ConversationalRetrievalChain
+    from langchain.memory import ConversationBufferMemory
+    from langchain.schema import SystemMessage
+    from langchain.text_splitter import CharacterTextSplitter
+    from langchain_community.document_loaders import GitLoader
+    from llm.config import GPT_4_CHAT_MODEL
+
     folder_path = f"downloads/{project_name}"
 
     Repo.clone_from(url, to_path=folder_path)
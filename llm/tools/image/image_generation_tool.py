@@ -1,25 +1,15 @@
 import os
 import json
 
-from openai import OpenAI
-
-from slack_sdk import WebClient
-from slack_sdk.errors import SlackApiError
-
 from dotenv import load_dotenv
 
 from langchain.tools import tool
 
 from data_models.models import ImageCreationTool
+from llm.clients import get_openai_client
 
 load_dotenv()
 
-OPENAI_CLIENT = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-SLACK_BOT_OAUTH_TOKEN = os.getenv("SLACK_BOT_OAUTH_TOKEN")
-SLACK_BOT_ID = os.getenv("SLACK_BOT_ID")
-SLACK_CLIENT = WebClient(token=SLACK_BOT_OAUTH_TOKEN)
-
 
 @tool("image_generation", return_direct=True, args_schema=ImageCreationTool)
 def image_generation_tool(
@@ -29,7 +19,7 @@ def image_generation_tool(
     Use this tool for generation an image from a prompt.
     """
     # Send image generation request to DALL-E
-    dalle_response = OPENAI_CLIENT.images.generate(
+    dalle_response = get_openai_client().images.generate(
         prompt=prompt, n=1, size="1024x1024", model="dall-e-3"
     )  # Adjust n to 3 for three images
     data = dalle_response.data
@@ -2,28 +2,18 @@ import os
 import json
 import base64
 
-from openai import OpenAI
-from slack_sdk import WebClient
-from slack_sdk.errors import SlackApiError
-
 from dotenv import load_dotenv
 
 from langchain.tools import tool
 
 from data_models.models import ImageEditingTool
+from llm.clients import get_slack_client, get_openai_client
 
 load_dotenv()
 
 
-SLACK_BOT_OAUTH_TOKEN = os.getenv("SLACK_BOT_OAUTH_TOKEN")
-SLACK_BOT_ID = os.getenv("SLACK_BOT_ID")
-SLACK_CLIENT = WebClient(token=SLACK_BOT_OAUTH_TOKEN)
-
-OPENAI_CLIENT = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-
 def send_error_notification(error_message, slack_channel_id):
-    SLACK_CLIENT.chat_postMessage(
+    get_slack_client().chat_postMessage(
         channel=slack_channel_id, text=f"Error: {error_message}"
     )
 
@@ -45,7 +35,7 @@ def image_operations_tool(prompt: str, url: str) -> str:
     else:
         image_url = "data:image/jpeg;base64," + image_to_base64(url)
 
-    gpt_4_response = OPENAI_CLIENT.chat.completions.create(
+    gpt_4_response = get_openai_client().chat.completions.create(
         model="gpt-4o",
         messages=[
             {
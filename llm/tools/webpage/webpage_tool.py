@@ -2,24 +2,10 @@ import os
 import json
 from dotenv import load_dotenv
 
-from langchain_openai import ChatOpenAI
-from langchain.chains import ConversationalRetrievalChain
 from langchain.tools import tool
-from langchain.text_splitter import CharacterTextSplitter
-from langchain.memory import ConversationBufferMemory
-from langchain.schema import SystemMessage
-from langchain_community.document_loaders.chromium import AsyncChromiumLoader
-from langchain.text_splitter import CharacterTextSplitter
-from langchain_community.document_loaders import FireCrawlLoader
-
-from langchain_community.chat_models import ChatOpenAI
-from langchain_core.documents import Document
-from langchain_core.prompts import ChatPromptTemplate
-from langchain.chains.combine_documents import create_stuff_documents_chain
 
 
 from data_models.models import WebpageToolParams
-from llm.config import GPT_4_CHAT_MODEL
 
 
 load_dotenv()
@@ -33,6 +19,11 @@ def webpage_tool(prompt: str, url: str, ingestion_mode: str = "scrape") -> str:
     Use this tool for handling a prompt regarding a webpage content.
     Prefer this over the requests tool when you want to make a get request
     """
+    # firecrawl and the chains are only imported on first use
+    from langchain_community.document_loaders import FireCrawlLoader
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain.chains.combine_documents import create_stuff_documents_chain
+    from llm.config import GPT_4_CHAT_MODEL
 
     fire_loader = FireCrawlLoader(
         api_key=FIRECRAWL_API_KEY, url=url, mode=ingestion_mode
@@ -1,18 +1,140 @@
-from langchain_openai import OpenAIEmbeddings
-from langchain_postgres import PGVector
-from langchain_postgres.vectorstores import PGVector
+import os
+import json
+import hashlib
+import logging
+from functools import lru_cache
+from typing import List, Optional, Set
+
+from dotenv import load_dotenv
 
 from llm.config import CONNECTION_STRING
+from llm.embedding_scheduler import get_embedding_scheduler
+from monitoring.tracing import CACHE_REQUESTS
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# uploads, repos and confluence spaces are only kept in memory for the thread, unless
+# persisted to the shared pgvector document collection
+DOCUMENT_VECTOR_STORE_PERSIST = (
+    os.getenv("DOCUMENT_VECTOR_STORE_PERSIST", "false").lower() == "true"
+)
+
+# ids per existence query, keeps the IN list of a large repo bounded
+EXISTING_IDS_BATCH_SIZE = 1000
+
+
+@lru_cache(maxsize=None)
+def get_document_vector_store():
+    from langchain_postgres.vectorstores import PGVector
 
+    from llm.database import get_engine
+    from llm.embeddings import get_embeddings
 
-def new_vector_store(documents):
-    vector_store = PGVector(
-        embeddings=OpenAIEmbeddings(),
+    # one store per process on the shared pool, the collection is only created once
+    return PGVector(
+        embeddings=get_embeddings(),
         collection_name="document",
-        connection=CONNECTION_STRING,
+        connection=get_engine(CONNECTION_STRING),
         use_jsonb=True,
     )
 
-    vector_store.add_documents(documents)
+
+def document_id(document) -> str:
+    # equal content and metadata, equal id, so a chunk is embedded and stored only once
+    metadata = json.dumps(document.metadata, sort_keys=True, default=str)
+    return hashlib.sha256(f"{document.page_content}\0{metadata}".encode()).hexdigest()
+
+
+def existing_document_ids(vector_store, ids: List[str]) -> Set[str]:
+    from sqlalchemy import select
+    from sqlalchemy.orm import Session
+
+    from llm.database import get_engine
+
+    existing = set()
+    embedding_store = vector_store.EmbeddingStore
+    with Session(get_engine(CONNECTION_STRING)) as session:
+        collection = vector_store.get_collection(session)
+        if collection is None:
+            return existing
+        for start in range(0, len(ids), EXISTING_IDS_BATCH_SIZE):
+            existing.update(
+                session.scalars(
+                    select(embedding_store.id).where(
+                        embedding_store.collection_id == collection.uuid,
+                        embedding_store.id.in_(
+                            ids[start : start + EXISTING_IDS_BATCH_SIZE]
+                        ),
+                    )
+                )
+            )
+    return existing
+
+
+@lru_cache(maxsize=None)
+def get_ephemeral_vector_store_registry():
+    from llm.vectorstores.ephemeral import EphemeralVectorStoreRegistry
+
+    return EphemeralVectorStoreRegistry()
+
+
+def new_vector_store(documents, persist: Optional[bool] = None):
+    """
+    Vector store with the documents for answering questions about them, in memory and
+    scoped to the current slack thread, or the pgvector document collection with persist
+    """
+    if DOCUMENT_VECTOR_STORE_PERSIST if persist is None else persist:
+        return persistent_vector_store(documents)
+    return ephemeral_vector_store(documents)
+
+
+def ephemeral_vector_store(documents):
+    from llm.embeddings import get_embeddings
+    from llm.vectorstores.ephemeral import EphemeralVectorStore
+    from llm.vectorstores.scope import VECTOR_STORE_SCOPE
+
+    documents_by_id = {document_id(document): document for document in documents}
+    # same thread and same content, e.g. a follow up question, reuses the vectors
+    key = (
+        VECTOR_STORE_SCOPE.get(),
+        hashlib.sha256("".join(sorted(documents_by_id)).encode()).hexdigest(),
+    )
+    registry = get_ephemeral_vector_store_registry()
+    vector_store = registry.get(key)
+    if vector_store is None:
+        vector_store = EphemeralVectorStore(get_embeddings())
+        get_embedding_scheduler().embed_into(
+            list(documents_by_id.values()),
+            list(documents_by_id),
+            sink=vector_store.add_embeddings,
+        )
+        registry.put(key, vector_store)
+    return vector_store
+
+
+def persistent_vector_store(documents):
+    vector_store = get_document_vector_store()
+
+    # duplicates within the batch are dropped too, an upsert cannot touch a row twice
+    documents_by_id = {document_id(document): document for document in documents}
+    existing_ids = existing_document_ids(vector_store, list(documents_by_id))
+    new_ids = [id for id in documents_by_id if id not in existing_ids]
+
+    CACHE_REQUESTS.labels("document_chunks", "hit").inc(len(existing_ids))
+    CACHE_REQUESTS.labels("document_chunks", "miss").inc(len(new_ids))
+    logger.info(
+        f"{len(documents)} chunks, {len(existing_ids)} already stored, "
+        f"{len(new_ids)} to embed"
+    )
+
+    if new_ids:
+        # batches are written as soon as they are embedded, not after the last one
+        get_embedding_scheduler().embed_into(
+            [documents_by_id[id] for id in new_ids],
+            new_ids,
+            sink=vector_store.add_embeddings,
+        )
 
     return vector_store
@@ -0,0 +1,186 @@
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from typing import Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from monitoring.tracing import CACHE_INVALIDATIONS, CACHE_REQUESTS
+
+load_dotenv()
+
+EPHEMERAL_VECTOR_STORE_TTL_SECONDS = int(
+    os.getenv("EPHEMERAL_VECTOR_STORE_TTL_SECONDS", "1800")
+)
+# vectors and texts of all ephemeral stores of a process
+EPHEMERAL_VECTOR_STORE_MAX_BYTES = int(
+    os.getenv("EPHEMERAL_VECTOR_STORE_MAX_BYTES", str(512 * 1024 * 1024))
+)
+
+
+class EphemeralVectorStore(VectorStore):
+    """
+    In memory vector store for one shot questions about an upload, a repo or a confluence
+    space. The vectors are a normalized float32 matrix, a search is one matrix vector product.
+    """
+
+    def __init__(self, embedding: Embeddings):
+        self.embedding = embedding
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._documents: List[Document] = []
+        self._ids: List[str] = []
+        self._text_bytes = 0
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    @property
+    def nbytes(self) -> int:
+        return self._matrix.nbytes + self._text_bytes
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        return self.add_embeddings(
+            texts, self.embedding.embed_documents(texts), metadatas=metadatas, ids=ids
+        )
+
+    def add_embeddings(
+        self,
+        texts: List[str],
+        embeddings: List[List[float]],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        self._matrix = vectors if not self._ids else np.vstack([self._matrix, vectors])
+        for text, metadata, id in zip(texts, metadatas, ids):
+            self._documents.append(Document(page_content=text, metadata=metadata))
+            self._ids.append(id)
+            self._text_bytes += len(text)
+        return ids
+
+    def similarity_search_with_score_by_vector(
+        self, embedding: List[float], k: int = 4
+    ) -> List[Tuple[Document, float]]:
+        if not self._ids:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        scores = self._matrix @ query
+
+        # top k without sorting all rows, then only the k in order
+        k = min(k, len(self._ids))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self._documents[index], float(scores[index])) for index in top]
+
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, **kwargs: Any
+    ) -> List[Document]:
+        return [
+            document
+            for document, _ in self.similarity_search_with_score_by_vector(embedding, k)
+        ]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(
+            self.embedding.embed_query(query), k
+        )
+
+    def similarity_search(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Document]:
+        return [
+            document
+            for document, _ in self.similarity_search_with_score(query, k, **kwargs)
+        ]
+
+    def _select_relevance_score_fn(self):
+        # cosine similarity, mapped from [-1, 1] to [0, 1]
+        return lambda score: (score + 1) / 2
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        **kwargs: Any,
+    ) -> "EphemeralVectorStore":
+        store = cls(embedding)
+        store.add_texts(texts, metadatas=metadatas, ids=kwargs.get("ids"))
+        return store
+
+
+class EphemeralVectorStoreRegistry:
+    """
+    Ephemeral stores of a process by key, e.g. slack thread and content. A follow up question
+    about the same content reuses the vectors, stores are dropped after the ttl or, least
+    recently used first, when the memory budget is exceeded.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: int = EPHEMERAL_VECTOR_STORE_TTL_SECONDS,
+        max_bytes: int = EPHEMERAL_VECTOR_STORE_MAX_BYTES,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        # key -> (expires_at, store)
+        self._stores = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[EphemeralVectorStore]:
+        with self._lock:
+            self._evict_expired()
+            entry = self._stores.get(key)
+            if entry is None:
+                CACHE_REQUESTS.labels("ephemeral_vector_store", "miss").inc()
+                return None
+            self._stores[key] = (time.monotonic() + self.ttl_seconds, entry[1])
+            self._stores.move_to_end(key)
+            CACHE_REQUESTS.labels("ephemeral_vector_store", "hit").inc()
+            return entry[1]
+
+    def put(self, key, store: EphemeralVectorStore):
+        with self._lock:
+            self._stores[key] = (time.monotonic() + self.ttl_seconds, store)
+            self._stores.move_to_end(key)
+            self._evict_expired()
+            # the new store stays, even if it alone exceeds the budget
+            while len(self._stores) > 1 and self.nbytes > self.max_bytes:
+                self._stores.popitem(last=False)
+                CACHE_INVALIDATIONS.labels("ephemeral_vector_store").inc()
+
+    @property
+    def nbytes(self) -> int:
+        return sum(store.nbytes for _, store in self._stores.values())
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        for key in [
+            key for key, (expires_at, _) in self._stores.items() if expires_at < now
+        ]:
+            del self._stores[key]
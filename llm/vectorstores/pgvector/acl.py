@@ -0,0 +1,176 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+
+from llm.config import CONNECTION_STRING
+from llm.database import get_engine
+from llm.vectorstores.pgvector.data_model import get_document_uuids_by_email
+from monitoring.tracing import CACHE_INVALIDATIONS, CACHE_REQUESTS
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# upper bound for a stale entry if a notification is lost, e.g. while the listener reconnects
+ACL_CACHE_TTL_SECONDS = int(os.getenv("ACL_CACHE_TTL_SECONDS", "300"))
+ACL_CACHE_MAX_SIZE = int(os.getenv("ACL_CACHE_MAX_SIZE", "10000"))
+ACL_NOTIFY_CHANNEL = "aishe_acl_changed"
+ACL_LISTENER_RECONNECT_SECONDS = 5
+
+# the payload is the affected member email, empty if every member may be affected
+ACL_NOTIFY_FUNCTION_SQL = f"""
+CREATE OR REPLACE FUNCTION aishe_notify_acl_changed() RETURNS trigger AS $$
+DECLARE
+    row_data jsonb;
+    member_email text;
+BEGIN
+    FOREACH row_data IN ARRAY ARRAY[
+        CASE WHEN TG_OP <> 'INSERT' THEN to_jsonb(OLD) END,
+        CASE WHEN TG_OP <> 'DELETE' THEN to_jsonb(NEW) END
+    ] LOOP
+        CONTINUE WHEN row_data IS NULL;
+        member_email := CASE TG_TABLE_NAME
+            WHEN 'member' THEN row_data->>'email'
+            WHEN 'membership' THEN (
+                SELECT email FROM member WHERE uuid = (row_data->>'member_uuid')::uuid
+            )
+            ELSE ''
+        END;
+        PERFORM pg_notify('{ACL_NOTIFY_CHANNEL}', COALESCE(member_email, ''));
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+ACL_TABLE_NAMES = ("membership", "member", "datasource")
+
+
+def install_acl_triggers(engine: Engine):
+    # one statement per execute, prepared statements cannot hold several
+    with engine.begin() as conn:
+        conn.exec_driver_sql(ACL_NOTIFY_FUNCTION_SQL)
+        for table_name in ACL_TABLE_NAMES:
+            conn.exec_driver_sql(
+                f"DROP TRIGGER IF EXISTS aishe_acl_changed ON {table_name}"
+            )
+            conn.exec_driver_sql(
+                f"CREATE TRIGGER aishe_acl_changed "
+                f"AFTER INSERT OR UPDATE OR DELETE ON {table_name} "
+                f"FOR EACH ROW EXECUTE FUNCTION aishe_notify_acl_changed()"
+            )
+
+
+class MemberACLCache:
+    """
+    Document uuids a member may read (see get_document_uuids_by_email) per member email.
+    Entries expire after the ttl, a listener thread drops them earlier on the notifications
+    of the acl triggers, so a revoked membership is effective within a round trip.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        ttl_seconds: int = ACL_CACHE_TTL_SECONDS,
+        max_size: int = ACL_CACHE_MAX_SIZE,
+    ):
+        self.engine = engine
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        # member email -> (expires_at, document table name -> document uuids)
+        self._entries = OrderedDict()
+        # bumped by every invalidation, a lookup which raced with one is not stored
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._listener = None
+        self._stop = threading.Event()
+
+    def get(self, db: Session, member_email: str) -> Dict[str, List[uuid.UUID]]:
+        self.start_listener()
+        with self._lock:
+            entry = self._entries.get(member_email)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(member_email)
+                CACHE_REQUESTS.labels("member_acl", "hit").inc()
+                return entry[1]
+            generation = self._generation
+
+        CACHE_REQUESTS.labels("member_acl", "miss").inc()
+        document_uuids = get_document_uuids_by_email(db, member_email)
+        with self._lock:
+            if generation == self._generation:
+                self._entries[member_email] = (
+                    time.monotonic() + self.ttl_seconds,
+                    document_uuids,
+                )
+                self._entries.move_to_end(member_email)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return document_uuids
+
+    def invalidate(self, member_email: Optional[str] = None):
+        """
+        Drops the entry of a member, or all entries without an email
+        """
+        with self._lock:
+            self._generation += 1
+            if member_email:
+                dropped = int(self._entries.pop(member_email, None) is not None)
+            else:
+                dropped = len(self._entries)
+                self._entries.clear()
+        if dropped:
+            CACHE_INVALIDATIONS.labels("member_acl").inc(dropped)
+
+    def start_listener(self):
+        if self._listener is not None:
+            return
+        with self._lock:
+            if self._listener is not None:
+                return
+            self._listener = threading.Thread(
+                target=self._listen, name="acl-listener", daemon=True
+            )
+            self._listener.start()
+
+    def stop_listener(self):
+        self._stop.set()
+
+    def _listen(self):
+        import psycopg
+
+        conninfo = self.engine.url.set(drivername="postgresql").render_as_string(
+            hide_password=False
+        )
+        while not self._stop.is_set():
+            try:
+                with psycopg.connect(conninfo, autocommit=True) as conn:
+                    conn.execute(f"LISTEN {ACL_NOTIFY_CHANNEL}")
+                    # changes while not listening were missed
+                    self.invalidate()
+                    while not self._stop.is_set():
+                        for notify in conn.notifies(timeout=1.0):
+                            self.invalidate(notify.payload or None)
+            except Exception as error:
+                logger.warning(f"ACL listener disconnected, reconnecting: {error}")
+                self.invalidate()
+                self._stop.wait(ACL_LISTENER_RECONNECT_SECONDS)
+
+
+@lru_cache(maxsize=None)
+def get_member_acl_cache(url: str = CONNECTION_STRING) -> MemberACLCache:
+    return MemberACLCache(get_engine(url))
+
+
+if __name__ == "__main__":
+    # once per database, after the rbac tables exist
+    install_acl_triggers(get_engine())
+    print(f"installed acl triggers, notifications on {ACL_NOTIFY_CHANNEL}")
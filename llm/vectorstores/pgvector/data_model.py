@@ -4,19 +4,244 @@ import os
 # needed, dont ask me why
 import uuid as uuid_pkg
 import random
-from typing import List, Optional
+import threading
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, Type
 
+import numpy as np
 from sqlmodel import Field, Relationship, SQLModel, Session, select
 
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
 from sqlalchemy.dialects.postgresql import UUID as SQLAlchemyUUID
-from sqlalchemy import Column, ForeignKey, Index, text
+from sqlalchemy import Column, Computed, ForeignKey, Index, text
 
 from pgvector.sqlalchemy import Vector
 
 from langchain.docstore.document import Document
 
 NON_RBAC_TABLE_NAME = os.environ.get("NON_RBAC_TABLE_NAME", "document")
+# hardcoded because not setable in openai api
+EMBEDDING_DIMENSIONS = 1536
+# candidates of an hnsw/ivfflat index scan, higher values trade latency for recall
+# unset keeps the server defaults (ef_search 40, probes 1)
+PGVECTOR_HNSW_EF_SEARCH = os.environ.get("PGVECTOR_HNSW_EF_SEARCH")
+PGVECTOR_IVFFLAT_PROBES = os.environ.get("PGVECTOR_IVFFLAT_PROBES")
+HNSW_DEFAULT_EF_SEARCH = 40
+# rows read from a halfvec/bit index of a table, then re-ranked with the full vectors
+PGVECTOR_RERANK_CANDIDATES = int(os.environ.get("PGVECTOR_RERANK_CANDIDATES", "100"))
+# distance expressions of the quantized expression indexes of
+# llm.vectorstores.pgvector.quantization, the planner only uses an index for the same expression
+QUANTIZED_DISTANCES = {
+    "halfvec": (
+        f"CAST({{column}} AS halfvec({EMBEDDING_DIMENSIONS})) "
+        f"<=> CAST(:embedding AS halfvec({EMBEDDING_DIMENSIONS}))"
+    ),
+    "bit": (
+        f"CAST(binary_quantize({{column}}) AS bit({EMBEDDING_DIMENSIONS})) "
+        f"<~> binary_quantize(CAST(:embedding AS vector({EMBEDDING_DIMENSIONS})))"
+    ),
+}
+# full text plus vector search fused by reciprocal rank, needs the content_tsv column
+# (added to existing tables by the migrations, sql/4-hybrid-search.sql for the non rbac one)
+PGVECTOR_HYBRID_SEARCH = (
+    os.environ.get("PGVECTOR_HYBRID_SEARCH", "false").lower() == "true"
+)
+# rows taken from each ranking before fusing
+PGVECTOR_HYBRID_CANDIDATES = int(os.environ.get("PGVECTOR_HYBRID_CANDIDATES", "40"))
+# the usual rrf constant, damps the weight of the first ranks
+RRF_K = 60
+# stemmed and without stop words, so the OR of the question's words ranks by the rare ones
+TEXT_SEARCH_CONFIG = "english"
+TEXT_SEARCH_COLUMN = "content_tsv"
+
+
+def vector_param(embedding: List[float]) -> np.ndarray:
+    # bound as a binary vector parameter by the pgvector adapters of llm.database,
+    # instead of ~30 KB of float literals in the query text
+    return np.asarray(embedding, dtype=np.float32)
+
+
+def set_search_parameters(
+    db: Session,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    min_ef_search: Optional[int] = None,
+):
+    """
+    Sets the index search parameters for the current transaction only, the pooled
+    connection is returned without them.
+    """
+    ef_search = ef_search or PGVECTOR_HNSW_EF_SEARCH
+    probes = probes or PGVECTOR_IVFFLAT_PROBES
+    if min_ef_search:
+        # an hnsw scan returns at most ef_search rows
+        ef_search = max(int(ef_search or HNSW_DEFAULT_EF_SEARCH), min_ef_search)
+    if ef_search:
+        db.execute(
+            text("SELECT set_config('hnsw.ef_search', :value, true)"),
+            {"value": str(int(ef_search))},
+        )
+    if probes:
+        db.execute(
+            text("SELECT set_config('ivfflat.probes', :value, true)"),
+            {"value": str(int(probes))},
+        )
+
+
+def quote_identifier(name: str) -> str:
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+def nearest_rows_sql(
+    table_name: str,
+    columns: List[Tuple[str, str]],
+    where: str,
+    limit: str,
+    quantization: Optional[str] = None,
+) -> str:
+    """
+    SELECT of the columns (alias, expression) and the cosine distance of the limit rows
+    nearest to :embedding. With a quantization, the quantized index of the table yields
+    :rerank_candidates rows, which are then ordered by their full precision distance.
+    """
+    table = quote_identifier(table_name)
+    selected = ", ".join(f"{expression} AS {alias}" for alias, expression in columns)
+    where = f" WHERE {where}" if where else ""
+    if not quantization:
+        # ordered by the bare distance operator, so the hnsw index serves the top k
+        return (
+            f"SELECT {selected}, {table}.embeddings <=> :embedding AS distance "
+            f"FROM {table}{where} ORDER BY {table}.embeddings <=> :embedding "
+            f"LIMIT {limit}"
+        )
+
+    quantized_distance = QUANTIZED_DISTANCES[quantization].format(
+        column=f"{table}.embeddings"
+    )
+    aliases = ", ".join(alias for alias, _ in columns)
+    return (
+        f"SELECT {aliases}, embeddings <=> :embedding AS distance FROM ("
+        f"SELECT {selected}, {table}.embeddings FROM {table}{where} "
+        f"ORDER BY {quantized_distance} LIMIT :rerank_candidates"
+        f") AS quantized ORDER BY distance LIMIT {limit}"
+    )
+
+
+def quantized_search_parameters(
+    quantizations: Dict[str, str], k: int, candidates: Optional[int] = None
+) -> dict:
+    if not quantizations:
+        return {}
+    return {"rerank_candidates": max(candidates or PGVECTOR_RERANK_CANDIDATES, k)}
+
+
+def text_search_index_name(table_name: str) -> str:
+    # the same for the document table classes, the migrations and sql/4-hybrid-search.sql
+    return f"{table_name}_{TEXT_SEARCH_COLUMN}_idx"
+
+
+def text_search_statements(
+    table_name: str, content_column: str, concurrently: bool = False
+) -> List[str]:
+    """
+    Adds the generated tsvector column and its gin index to an existing document table,
+    one statement per entry. The column rewrites the table, the index can be built
+    concurrently (outside of a transaction).
+    """
+    table = quote_identifier(table_name)
+    return [
+        f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {TEXT_SEARCH_COLUMN} tsvector "
+        f"GENERATED ALWAYS AS (to_tsvector('{TEXT_SEARCH_CONFIG}', "
+        f"coalesce({quote_identifier(content_column)}, ''))) STORED",
+        f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS "
+        f"{quote_identifier(text_search_index_name(table_name))} "
+        f"ON {table} USING gin ({TEXT_SEARCH_COLUMN})",
+    ]
+
+
+def hybrid_search_query(sources: List[Tuple[str, str, str, Optional[str]]]) -> str:
+    """
+    Reciprocal rank fusion of the vector and the full text ranking of one or more document
+    tables, in one statement. sources are (table name, content column, where clause,
+    quantization) and the query binds :embedding, :query, :candidates, :rrf_k and :k
+    (and :rerank_candidates for quantized tables).
+
+    Rows are identified by table and ctid, which is stable within the statement, so no
+    table needs a known primary key.
+    """
+    semantic_queries = []
+    keyword_queries = []
+    for index, (table_name, content_column, where, quantization) in enumerate(sources):
+        table = quote_identifier(table_name)
+        content = f"{table}.{quote_identifier(content_column)}"
+        columns = [
+            ("source", str(index)),
+            ("row_id", f"{table}.ctid"),
+            ("content", content),
+            ("context_data", f"{table}.context_data"),
+        ]
+        semantic_queries.append(
+            f"({nearest_rows_sql(table_name, columns, where, ':candidates', quantization)})"
+        )
+        where = f" AND {where}" if where else ""
+        # the @@ match is served by the gin index on the generated column
+        keyword_queries.append(
+            f"(SELECT {index} AS source, {table}.ctid AS row_id, {content} AS content, "
+            f"{table}.context_data, "
+            f"ts_rank_cd({table}.{TEXT_SEARCH_COLUMN}, keywords.query) AS text_rank "
+            f"FROM {table}, keywords "
+            f"WHERE {table}.{TEXT_SEARCH_COLUMN} @@ keywords.query{where} "
+            f"ORDER BY text_rank DESC LIMIT :candidates)"
+        )
+
+    return f"""
+        WITH keywords AS (
+            -- any of the question's words, plainto_tsquery alone requires all of them
+            SELECT CAST(
+                replace(
+                    CAST(plainto_tsquery('{TEXT_SEARCH_CONFIG}', :query) AS text),
+                    ' & ',
+                    ' | '
+                ) AS tsquery
+            ) AS query
+        ),
+        semantic AS (
+            SELECT *, row_number() OVER (ORDER BY distance) AS rank
+            FROM ({" UNION ALL ".join(semantic_queries)}) AS candidates
+            ORDER BY distance LIMIT :candidates
+        ),
+        keyword AS (
+            SELECT *, row_number() OVER (ORDER BY text_rank DESC) AS rank
+            FROM ({" UNION ALL ".join(keyword_queries)}) AS candidates
+            ORDER BY text_rank DESC LIMIT :candidates
+        )
+        SELECT
+            coalesce(semantic.content, keyword.content) AS content,
+            coalesce(semantic.context_data, keyword.context_data) AS context_data,
+            coalesce(1.0 / (:rrf_k + semantic.rank), 0)
+                + coalesce(1.0 / (:rrf_k + keyword.rank), 0) AS score
+        FROM semantic
+        FULL OUTER JOIN keyword
+            ON semantic.source = keyword.source AND semantic.row_id = keyword.row_id
+        ORDER BY score DESC
+        LIMIT :k
+    """
+
+
+def hybrid_search_parameters(
+    query: str,
+    reference_embedding: List[float],
+    k: int,
+    candidates: Optional[int] = None,
+) -> dict:
+    return {
+        "embedding": vector_param(reference_embedding),
+        "query": query,
+        "candidates": max(candidates or PGVECTOR_HYBRID_CANDIDATES, k),
+        "rrf_k": RRF_K,
+        "k": k,
+    }
 
 
 class Organization(SQLModel, table=True):
@@ -72,8 +297,19 @@ class BaseDocumentTableTemplate(SQLModel, table=False):
         )
     )
     # hardcoded because not setable in openai api
-    embeddings: List[float] = Field(sa_column=Column(Vector(1536)))
+    embeddings: List[float] = Field(sa_column=Column(Vector(EMBEDDING_DIMENSIONS)))
     content: Optional[str] = None
+    # maintained by postgres, for the full text half of the hybrid search
+    content_tsv: Optional[str] = Field(
+        default=None,
+        sa_column=Column(
+            TSVECTOR,
+            Computed(
+                f"to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce(content, ''))",
+                persisted=True,
+            ),
+        ),
+    )
     # Add other common fields or relationships here
 
 
@@ -157,11 +393,26 @@ def create_document(organization, data_source, raw_document):
     )
 
 
-def document_table_factory(organization, data_source) -> SQLModel:
+# a concurrent first use would define the same table twice
+_document_table_lock = threading.Lock()
+
+
+def document_table_factory(organization, data_source) -> Type[SQLModel]:
+    with _document_table_lock:
+        return get_document_table(organization.name, data_source.name)
+
+
+@lru_cache(maxsize=None)
+def get_document_table(organization_name: str, data_source_name: str) -> Type[SQLModel]:
+    """
+    Document table class of an organization and data source, defined once per process.
+    Each definition registers the table and its indexes in SQLModel.metadata, use
+    document_table_factory for the lock.
+    """
+
     # You can add or override other fields specific to this table if needed
     class DocumentTableTemplate(BaseDocumentTableTemplate, table=True):
-        __tablename__ = f"document_table__{organization.name}_{data_source.name}"  #
-        __table_args__ = {"extend_existing": True}  # Add this line
+        __tablename__ = f"document_table__{organization_name}_{data_source_name}"
         data_source_uuid: uuid_pkg.UUID = Field(
             sa_column=Column(
                 SQLAlchemyUUID, ForeignKey("datasource.uuid", ondelete="CASCADE")
@@ -170,93 +421,130 @@ def document_table_factory(organization, data_source) -> SQLModel:
 
     # Define the pgvector index for the subclass
     Index(
-        f"embedding_idx_{organization.name}_{data_source.name}",
+        f"embedding_idx_{organization_name}_{data_source_name}",
         DocumentTableTemplate.embeddings,
         postgresql_using="hnsw",
         postgresql_with={"m": 16, "ef_construction": 200},
-        postgresql_ops={"embeddings": "vector_l2_ops"},
+        # same operator as the queries (<=>), otherwise the index is never used
+        postgresql_ops={"embeddings": "vector_cosine_ops"},
+    )
+    Index(
+        text_search_index_name(DocumentTableTemplate.__tablename__),
+        DocumentTableTemplate.content_tsv,
+        postgresql_using="gin",
     )
 
     return DocumentTableTemplate
 
 
-def get_memberships_by_email(db: Session, member_email: str) -> List[Membership]:
-    return db.exec(
-        select(Membership, DataSource)
+def register_document_tables(db) -> List[Type[SQLModel]]:
+    """
+    Document table classes of all data sources in the database, so SQLModel.metadata
+    holds their tables and indexes, e.g. for alembic
+    """
+    rows = db.execute(
+        select(Organization.name, DataSource.name).join(
+            Organization, Organization.uuid == DataSource.organization_uuid
+        )
+    ).all()
+    with _document_table_lock:
+        return [
+            get_document_table(organization_name, data_source_name)
+            for organization_name, data_source_name in rows
+        ]
+
+
+def create_document_tables(conn) -> List[str]:
+    """
+    Creates the missing document tables and indexes of all data sources on a connection,
+    ahead of the first ingestion. Returns the table names.
+    """
+    tables = [table.__table__ for table in register_document_tables(conn)]
+    SQLModel.metadata.create_all(conn, tables=tables, checkfirst=True)
+    return [table.name for table in tables]
+
+
+def get_document_uuids_by_email(
+    db: Session, member_email: str
+) -> Dict[str, List[uuid_pkg.UUID]]:
+    """
+    Document uuids a member may read, grouped by the document table of their data source
+    """
+    rows = db.exec(
+        select(
+            DataSource.document_table_metadata["name"].astext,
+            Membership.document_uuid,
+        )
         .join(DataSource, DataSource.uuid == Membership.data_source_uuid)
         .join(Member, Member.uuid == Membership.member_uuid)
         .where(Member.email == member_email)
     ).all()
 
+    document_uuids = defaultdict(list)
+    for document_table_name, document_uuid in rows:
+        if document_table_name:
+            document_uuids[document_table_name].append(document_uuid)
+    return dict(document_uuids)
+
 
 def get_nearest_rbac_docs(
-    db: Session, member_email: str, reference_embedding: List[float], k: int = 0.8
+    db: Session,
+    member_email: str,
+    reference_embedding: List[float],
+    k: int = 4,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    document_uuids: Optional[Dict[str, List[uuid_pkg.UUID]]] = None,
+    quantizations: Optional[Dict[str, str]] = None,
 ):
-    # Query to get memberships and datasources for a member
-    memberships_data = get_memberships_by_email(db, member_email)
-    docs = []
-
-    for membership, data_source in memberships_data:
-        # Extract the document table name from data_source metadata
-        document_table_name = data_source.document_table_metadata["name"]
-
-        # Construct and execute a raw SQL query for each document table
-        if document_table_name:
-            safe_table_name = f'"{document_table_name}"'
-
-            # Flatten the reference_embedding into a comma-separated string and cast it as a PostgreSQL vector type
-            reference_embeddings_str = ",".join(map(str, reference_embedding))
-            reference_array_str = f"ARRAY[{reference_embeddings_str}]::vector"
-
-            # Here we insert the reference embedding string and limit into the SQL statement
-            # We use 1 - (embeddings <=> reference_array_str) to calculate cosine similarity
-            query = text(
-                f"SELECT content, context_data FROM {safe_table_name} "
-                f"WHERE uuid = :document_uuid AND "
-                f"(1 - (embeddings <=> {reference_array_str})) < :k"
-            )
+    # one query for the memberships (none if passed from the acl cache), one for the
+    # documents, independent of the number of memberships and document tables
+    if document_uuids is None:
+        document_uuids = get_document_uuids_by_email(db, member_email)
+    if not document_uuids:
+        return []
+
+    # quantized tables (halfvec/bit index) by name, all others use the full vectors
+    quantizations = {
+        name: quantization
+        for name, quantization in (quantizations or {}).items()
+        if name in document_uuids
+    }
+    parameters = {
+        "embedding": vector_param(reference_embedding),
+        "k": k,
+        **quantized_search_parameters(quantizations, k),
+    }
+    set_search_parameters(
+        db,
+        ef_search=ef_search,
+        probes=probes,
+        min_ef_search=parameters.get("rerank_candidates"),
+    )
 
-            results = db.execute(
-                query,
-                {
-                    "document_uuid": membership.document_uuid,
-                    "k": k,
-                },
-            ).fetchall()
-
-            for row in results:
-                doc = Document(
-                    page_content=row[0],
-                    metadata=row[1],
-                    # {"source": "downloads/meetups.pdf", "page": 0}
-                )
-                docs.append(doc)
-    return docs
+    # top k per document table, served by the table's index, then the global top k of all
+    # tables
+    table_queries = []
+    for index, (document_table_name, uuids) in enumerate(document_uuids.items()):
+        safe_table_name = quote_identifier(document_table_name)
+        columns = [
+            ("content", f"{safe_table_name}.content"),
+            ("context_data", f"{safe_table_name}.context_data"),
+        ]
+        nearest_rows = nearest_rows_sql(
+            document_table_name,
+            columns,
+            f"{safe_table_name}.uuid = ANY(:document_uuids_{index})",
+            ":k",
+            quantizations.get(document_table_name),
+        )
+        table_queries.append(f"({nearest_rows})")
+        parameters[f"document_uuids_{index}"] = uuids
 
+    query = text(" UNION ALL ".join(table_queries) + " ORDER BY distance LIMIT :k")
+    results = db.execute(query, parameters).fetchall()
 
-def get_nearest_docs(db: Session, reference_embedding: List[float], k: int = 0.8):
-    # Query to get memberships and datasources for a member
     docs = []
-
-    # Flatten the reference_embedding into a comma-separated string and cast it as a PostgreSQL vector type
-    reference_embeddings_str = ",".join(map(str, reference_embedding))
-    reference_array_str = f"ARRAY[{reference_embeddings_str}]::vector"
-
-    # Here we insert the reference embedding string and limit into the SQL statement
-    # We use 1 - (embeddings <=> reference_array_str) to calculate cosine similarity
-    query = text(
-        f"SELECT page_content, context_data FROM {NON_RBAC_TABLE_NAME} "
-        f"WHERE (1 - (embeddings <=> {reference_array_str})) < :k "
-        f"LIMIT 20"
-    )
-
-    results = db.execute(
-        query,
-        {
-            "k": k,
-        },
-    ).fetchall()
-
     for row in results:
         doc = Document(
             page_content=row[0],
@@ -264,5 +552,58 @@ def get_nearest_docs(db: Session, reference_embedding: List[float], k: int = 0.8
             # {"source": "downloads/meetups.pdf", "page": 0}
         )
         docs.append(doc)
-
     return docs
+
+
+def get_hybrid_rbac_docs(
+    db: Session,
+    member_email: str,
+    query: str,
+    reference_embedding: List[float],
+    k: int = 4,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    document_uuids: Optional[Dict[str, List[uuid_pkg.UUID]]] = None,
+    candidates: Optional[int] = None,
+    quantizations: Optional[Dict[str, str]] = None,
+):
+    """
+    Like get_nearest_rbac_docs, with the vector and the full text ranking of all readable
+    document tables fused by reciprocal rank
+    """
+    if document_uuids is None:
+        document_uuids = get_document_uuids_by_email(db, member_email)
+    if not document_uuids:
+        return []
+
+    quantizations = {
+        name: quantization
+        for name, quantization in (quantizations or {}).items()
+        if name in document_uuids
+    }
+    parameters = {
+        **hybrid_search_parameters(query, reference_embedding, k, candidates),
+        **quantized_search_parameters(quantizations, k),
+    }
+    set_search_parameters(
+        db,
+        ef_search=ef_search,
+        probes=probes,
+        min_ef_search=parameters.get("rerank_candidates"),
+    )
+
+    sources = []
+    for index, (document_table_name, uuids) in enumerate(document_uuids.items()):
+        sources.append(
+            (
+                document_table_name,
+                "content",
+                f"{quote_identifier(document_table_name)}.uuid "
+                f"= ANY(:document_uuids_{index})",
+                quantizations.get(document_table_name),
+            )
+        )
+        parameters[f"document_uuids_{index}"] = uuids
+
+    results = db.execute(text(hybrid_search_query(sources)), parameters).fetchall()
+    return [Document(page_content=row[0], metadata=row[1]) for row in results]
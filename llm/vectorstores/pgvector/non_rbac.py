@@ -1,6 +1,7 @@
 import os
 import logging
 import enum
+from functools import lru_cache
 from typing import (
     Any,
     Callable,
@@ -10,21 +11,30 @@ from typing import (
 )
 
 import sqlalchemy
-from sqlmodel import create_engine, Session
+from sqlmodel import Session
 from sqlalchemy import text
 
 
 from langchain.embeddings.base import Embeddings
 from langchain_community.vectorstores.pgvector import PGVector
-from langchain_openai import OpenAIEmbeddings
 from langchain.docstore.document import Document
 from langchain.memory import ConversationBufferMemory
 from langchain.chains import ConversationalRetrievalChain
 
 from llm.vectorstores.pgvector.data_model import (
-    get_nearest_docs,
+    PGVECTOR_HYBRID_SEARCH,
+    hybrid_search_parameters,
+    hybrid_search_query,
+    nearest_rows_sql,
+    quantized_search_parameters,
+    set_search_parameters,
+    vector_param,
 )
-from llm.config import GPT_4_CHAT_MODEL, CONNECTION_STRING
+from llm.vectorstores.pgvector.quantization import get_table_quantizations
+from llm.config import CONNECTION_STRING
+from llm.database import get_engine
+from llm.embeddings import get_embeddings
+from monitoring.tracing import span
 
 
 class DistanceStrategy(str, enum.Enum):
@@ -42,23 +52,48 @@ NON_RBAC_TABLE_NAME = os.environ.get("NON_RBAC_TABLE_NAME", "document")
 
 
 def get_nearest_docs(
-    db: Session, reference_embedding: List[float], max_results: int = 10
+    db: Session,
+    reference_embedding: List[float],
+    max_results: int = 10,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    quantization: Optional[str] = None,
 ):
-    # Flatten the reference_embedding into a comma-separated string and cast it as a PostgreSQL vector type
-    reference_embeddings_str = ",".join(map(str, reference_embedding))
-    reference_array_str = f"ARRAY[{reference_embeddings_str}]::vector"
+    parameters = {
+        "embedding": vector_param(reference_embedding),
+        "max_results": max_results,
+        **quantized_search_parameters(
+            {NON_RBAC_TABLE_NAME: quantization} if quantization else {}, max_results
+        ),
+    }
+    set_search_parameters(
+        db,
+        ef_search=ef_search,
+        probes=probes,
+        min_ef_search=parameters.get("rerank_candidates"),
+    )
 
-    # Query to get the nearest documents based on cosine similarity
-    # 1 - (embeddings <=> reference_array_str) to calculate cosine similarity
+    # Query to get the nearest documents based on cosine distance
+    # ordered by the bare distance operator, so an hnsw/ivfflat index with vector_cosine_ops
+    # serves the top k instead of a sequential scan, or over the halfvec/bit index and
+    # re-ranked with the full vectors
+    # the embedding is a bound binary parameter, so the statement text stays the same and
+    # is prepared once per connection
+    nearest_rows = nearest_rows_sql(
+        NON_RBAC_TABLE_NAME,
+        [("page_content", "page_content"), ("context_data", "context_data")],
+        "",
+        ":max_results",
+        quantization,
+    )
     query = text(
         f"""
-        SELECT page_content, context_data, (1 - (embeddings <=> {reference_array_str})) AS similarity 
-        FROM {NON_RBAC_TABLE_NAME}
-        ORDER BY similarity ASC
-        LIMIT {max_results}
+        SELECT page_content, context_data, (1 - distance) AS similarity
+        FROM ({nearest_rows}) AS nearest
+        ORDER BY distance
         """
     )
-    results = db.execute(query).fetchall()
+    results = db.execute(query, parameters).fetchall()
 
     docs = []
     for row in results:
@@ -68,17 +103,55 @@ def get_nearest_docs(
                 "source": {"name": "postgres vector db", "table": NON_RBAC_TABLE_NAME}
             },
         )
-        print(doc)
         docs.append(doc)
 
     return docs
 
 
+def get_hybrid_docs(
+    db: Session,
+    query: str,
+    reference_embedding: List[float],
+    max_results: int = 10,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    candidates: Optional[int] = None,
+    quantization: Optional[str] = None,
+):
+    parameters = {
+        **hybrid_search_parameters(query, reference_embedding, max_results, candidates),
+        **quantized_search_parameters(
+            {NON_RBAC_TABLE_NAME: quantization} if quantization else {}, max_results
+        ),
+    }
+    set_search_parameters(
+        db,
+        ef_search=ef_search,
+        probes=probes,
+        min_ef_search=parameters.get("rerank_candidates"),
+    )
+
+    # exact names and identifiers are found by the full text ranking, paraphrases by the
+    # vector ranking, both fused in one round trip
+    sources = [(NON_RBAC_TABLE_NAME, "page_content", "", quantization)]
+    results = db.execute(text(hybrid_search_query(sources)), parameters).fetchall()
+
+    return [
+        Document(
+            page_content=str(row),
+            metadata={
+                "source": {"name": "postgres vector db", "table": NON_RBAC_TABLE_NAME}
+            },
+        )
+        for row in results
+    ]
+
+
 class NonRBACVectorStore(PGVector):
     def __init__(
         self,
         connection_string: str = CONNECTION_STRING,
-        embedding_function: Embeddings = OpenAIEmbeddings(),
+        embedding_function: Optional[Embeddings] = None,
         collection_name: str = _LANGCHAIN_DEFAULT_COLLECTION_NAME,
         collection_metadata: Optional[dict] = None,
         distance_strategy: DistanceStrategy = DEFAULT_DISTANCE_STRATEGY,
@@ -87,7 +160,8 @@ class NonRBACVectorStore(PGVector):
         relevance_score_fn: Optional[Callable[[float], float]] = None,
     ) -> None:
         self.connection_string = connection_string
-        self.embedding_function = embedding_function
+        # not a default argument, which would build the client on import
+        self.embedding_function = embedding_function or get_embeddings()
         self.collection_name = collection_name
         self.collection_metadata = collection_metadata
         self._distance_strategy = distance_strategy
@@ -98,18 +172,12 @@ class NonRBACVectorStore(PGVector):
 
     # Custom initialization logic
     def __post_init__(self):
-        self._conn = self.connect()
-
-    def connect(self) -> sqlalchemy.engine.Connection:
-        try:
-            engine = create_engine(self.connection_string)
-            conn = engine.connect()
-            self._bind = engine
-            self._dbapi_connection = conn
-            return conn
-        except Exception as error:
-            print("Couldnt connect to db", error)
-            return None
+        self._bind = self.connect()
+        self.table_quantizations = get_table_quantizations(self.connection_string)
+
+    def connect(self) -> sqlalchemy.engine.Engine:
+        # shared pool, a connection is only checked out per query
+        return get_engine(self.connection_string)
 
     def similarity_search(
         self,
@@ -124,6 +192,10 @@ class NonRBACVectorStore(PGVector):
             query (str): Query text to search for.
             k (int): Number of results to return. Defaults to 4.
             filter (Optional[Dict[str, str]]): Filter by metadata. Defaults to None.
+            ef_search (Optional[int]): hnsw.ef_search for this query.
+            probes (Optional[int]): ivfflat.probes for this query.
+            hybrid (Optional[bool]): Fuse with the full text ranking, defaults to
+                PGVECTOR_HYBRID_SEARCH.
 
         Returns:
             List of Documents most similar to the query.
@@ -132,6 +204,9 @@ class NonRBACVectorStore(PGVector):
             query=query,
             k=k,
             filter=filter,
+            ef_search=kwargs.get("ef_search"),
+            probes=kwargs.get("probes"),
+            hybrid=kwargs.get("hybrid"),
         )
 
     def run_similarity_search(
@@ -139,22 +214,53 @@ class NonRBACVectorStore(PGVector):
         query: str,
         k: int = 4,
         filter: Optional[dict] = None,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        hybrid: Optional[bool] = None,
     ) -> List[Tuple[Document, float]]:
-        reference_embedding = self.embedding_function.embed_query(text=query)
+        with span("query_embedding"):
+            reference_embedding = self.embedding_function.embed_query(text=query)
 
         docs = []
-        with Session(self._conn) as session:
-            # print(query, filter)
-
-            docs = get_nearest_docs(session, reference_embedding)
-        print(len(docs))
+        with span("pgvector_query"), Session(self._bind) as session:
+            quantization = self.table_quantizations.get(session).get(
+                NON_RBAC_TABLE_NAME
+            )
+
+            if PGVECTOR_HYBRID_SEARCH if hybrid is None else hybrid:
+                docs = get_hybrid_docs(
+                    session,
+                    query,
+                    reference_embedding,
+                    max_results=k,
+                    ef_search=ef_search,
+                    probes=probes,
+                    quantization=quantization,
+                )
+            else:
+                docs = get_nearest_docs(
+                    session,
+                    reference_embedding,
+                    max_results=k,
+                    ef_search=ef_search,
+                    probes=probes,
+                    quantization=quantization,
+                )
+        self.logger.debug(f"Found {len(docs)} documents for: {query}")
         return docs
 
 
+@lru_cache(maxsize=None)
+def get_non_rbac_vector_store() -> NonRBACVectorStore:
+    # stateless apart from the engine and the embeddings client, shared by all tool calls
+    return NonRBACVectorStore()
+
+
 # Add write functionality as needed
 
 if __name__ == "__main__":
-    print(CONNECTION_STRING)
+    from llm.config import GPT_4_CHAT_MODEL
+
     non_rbac_vector_store = NonRBACVectorStore()
 
     prompt = "Return the oldest person"
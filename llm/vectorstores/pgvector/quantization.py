@@ -0,0 +1,187 @@
+"""
+Quantized hnsw indexes for document tables whose full precision index no longer fits in
+shared_buffers. The embeddings column stays a full vector, the index is built over an expression:
+
+- halfvec: 16 bit floats, half the index size, about the same recall
+- bit: binary quantization, 1/32 of the index size, needs the re-ranking
+
+The searches of data_model use the quantized index of a table for :rerank_candidates rows and
+order those by their full precision distance. Migration of existing tables, without blocking
+writes:
+
+    python -m llm.vectorstores.pgvector.quantization halfvec document_table__acme_confluence
+    python -m llm.vectorstores.pgvector.quantization bit --all --drop-full-index
+"""
+
+import re
+import time
+import argparse
+import threading
+from functools import lru_cache
+from typing import Dict, List
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlmodel import Session
+
+from llm.config import CONNECTION_STRING
+from llm.database import get_engine
+from llm.vectorstores.pgvector.data_model import (
+    EMBEDDING_DIMENSIONS,
+    NON_RBAC_TABLE_NAME,
+    quote_identifier,
+)
+from monitoring.tracing import CACHE_REQUESTS
+
+# index expressions and operator classes, the same expressions as QUANTIZED_DISTANCES
+QUANTIZED_INDEXES = {
+    "halfvec": (
+        f"(CAST(embeddings AS halfvec({EMBEDDING_DIMENSIONS}))) halfvec_cosine_ops"
+    ),
+    "bit": (
+        f"(CAST(binary_quantize(embeddings) AS bit({EMBEDDING_DIMENSIONS}))) "
+        f"bit_hamming_ops"
+    ),
+}
+# a new or dropped index is picked up by the searches after at most this long
+QUANTIZATION_CACHE_TTL_SECONDS = 300
+
+VECTOR_INDEXES_SQL = """
+SELECT table_class.relname, pg_get_indexdef(pg_index.indexrelid), index_class.relname
+FROM pg_index
+JOIN pg_class AS table_class ON table_class.oid = pg_index.indrelid
+JOIN pg_class AS index_class ON index_class.oid = pg_index.indexrelid
+JOIN pg_namespace ON pg_namespace.oid = table_class.relnamespace
+WHERE pg_namespace.nspname = current_schema()
+    AND pg_index.indisvalid
+    AND pg_get_indexdef(pg_index.indexrelid) ~ 'USING (hnsw|ivfflat)'
+"""
+
+
+def index_quantization(definition: str):
+    for quantization, index in QUANTIZED_INDEXES.items():
+        operator_class = index.rsplit(" ", 1)[1]
+        if re.search(rf"\b{operator_class}\b", definition):
+            return quantization
+    return None
+
+
+def get_vector_indexes(conn) -> List[tuple]:
+    """
+    Valid hnsw/ivfflat indexes of the schema as (table name, quantization or None, index
+    name), an index still built concurrently is not valid yet
+    """
+    return [
+        (table_name, index_quantization(definition), index_name)
+        for table_name, definition, index_name in conn.execute(text(VECTOR_INDEXES_SQL))
+    ]
+
+
+class TableQuantizations:
+    """
+    Quantization of the index of each document table, refreshed after the ttl. Tables with
+    a halfvec and a bit index use the halfvec one, it needs fewer candidates.
+    """
+
+    def __init__(self, ttl_seconds: int = QUANTIZATION_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._quantizations: Dict[str, str] = {}
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, db: Session) -> Dict[str, str]:
+        with self._lock:
+            if self._expires_at > time.monotonic():
+                CACHE_REQUESTS.labels("table_quantization", "hit").inc()
+                return self._quantizations
+
+        CACHE_REQUESTS.labels("table_quantization", "miss").inc()
+        quantizations = {}
+        for table_name, quantization, _ in get_vector_indexes(db):
+            if quantization and quantizations.get(table_name) != "halfvec":
+                quantizations[table_name] = quantization
+        with self._lock:
+            self._quantizations = quantizations
+            self._expires_at = time.monotonic() + self.ttl_seconds
+        return quantizations
+
+
+@lru_cache(maxsize=None)
+def get_table_quantizations(url: str = CONNECTION_STRING) -> TableQuantizations:
+    return TableQuantizations()
+
+
+def get_document_table_names(conn: Connection) -> List[str]:
+    return list(
+        conn.scalars(
+            text(
+                "SELECT tablename FROM pg_tables WHERE schemaname = current_schema() "
+                "AND (tablename LIKE 'document\\_table\\_\\_%' OR tablename = :non_rbac)"
+            ),
+            {"non_rbac": NON_RBAC_TABLE_NAME},
+        )
+    )
+
+
+def quantized_index_statement(table_name: str, quantization: str) -> str:
+    index_name = quote_identifier(f"{table_name}_embeddings_{quantization}_idx")
+    return (
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} "
+        f"ON {quote_identifier(table_name)} "
+        f"USING hnsw ({QUANTIZED_INDEXES[quantization]}) "
+        f"WITH (m = 16, ef_construction = 200)"
+    )
+
+
+def migrate_table(
+    conn: Connection, table_name: str, quantization: str, drop_full_index: bool
+):
+    """
+    Builds the quantized index next to the existing one, the full precision index is only
+    dropped once the new one is valid. conn must be in autocommit mode.
+    """
+    started_at = time.monotonic()
+    conn.execute(text(quantized_index_statement(table_name, quantization)))
+    print(
+        f"{table_name}: {quantization} index built in "
+        f"{time.monotonic() - started_at:.1f}s"
+    )
+
+    if not drop_full_index:
+        return
+    indexes = [index for index in get_vector_indexes(conn) if index[0] == table_name]
+    if not any(quantization == index[1] for index in indexes):
+        # e.g. a failed concurrent build, which leaves an invalid index behind
+        print(f"{table_name}: no valid {quantization} index, full index kept")
+        return
+    for _, existing_quantization, index_name in indexes:
+        if existing_quantization is None:
+            conn.execute(
+                text(
+                    f"DROP INDEX CONCURRENTLY IF EXISTS {quote_identifier(index_name)}"
+                )
+            )
+            print(f"{table_name}: dropped full precision index {index_name}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("quantization", choices=list(QUANTIZED_INDEXES))
+    parser.add_argument("tables", nargs="*", help="document tables to migrate")
+    parser.add_argument(
+        "--all",
+        action="store_true",
+        help="all rbac document tables and the non rbac one",
+    )
+    parser.add_argument(
+        "--drop-full-index",
+        action="store_true",
+        help="drop the full precision vector indexes once the quantized one is valid",
+    )
+    args = parser.parse_args()
+
+    # CREATE/DROP INDEX CONCURRENTLY cannot run in a transaction
+    with get_engine().connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        table_names = get_document_table_names(conn) if args.all else args.tables
+        for table_name in table_names:
+            migrate_table(conn, table_name, args.quantization, args.drop_full_index)
@@ -12,19 +12,22 @@ from typing import (
 import sqlalchemy
 from sqlmodel import Session
 
-from langchain_community.embeddings.base import Embeddings
+from langchain.embeddings.base import Embeddings
 from langchain_community.vectorstores.pgvector import PGVector
-from langchain_openai import OpenAIEmbeddings
 from langchain.docstore.document import Document
 from langchain.memory import ConversationBufferMemory
 from langchain.chains import ConversationalRetrievalChain
 
-from llm.config import GPT_4_CHAT_MODEL, CONNECTION_STRING
-
-from data_model import (
-    get_memberships_by_email,
+from llm.config import CONNECTION_STRING
+from llm.database import get_engine
+from llm.vectorstores.pgvector.acl import get_member_acl_cache
+from llm.vectorstores.pgvector.quantization import get_table_quantizations
+from llm.vectorstores.pgvector.data_model import (
+    PGVECTOR_HYBRID_SEARCH,
+    get_hybrid_rbac_docs,
     get_nearest_rbac_docs,
 )
+from monitoring.tracing import span
 
 
 class DistanceStrategy(str, enum.Enum):
@@ -63,12 +66,13 @@ class RBACVector(PGVector):
 
     # Custom initialization logic
     def __post_init__(self):
-        self._conn = self.connect()
+        self._bind = self.connect()
+        self.acl_cache = get_member_acl_cache(self.connection_string)
+        self.table_quantizations = get_table_quantizations(self.connection_string)
 
-    def connect(self) -> sqlalchemy.engine.Connection:
-        engine = sqlalchemy.create_engine(self.connection_string)
-        conn = engine.connect()
-        return conn
+    def connect(self) -> sqlalchemy.engine.Engine:
+        # shared pool, a connection is only checked out per query
+        return get_engine(self.connection_string)
 
     def similarity_search(
         self,
@@ -83,6 +87,10 @@ class RBACVector(PGVector):
             query (str): Query text to search for.
             k (int): Number of results to return. Defaults to 4.
             filter (Optional[Dict[str, str]]): Filter by metadata. Defaults to None.
+            ef_search (Optional[int]): hnsw.ef_search for this query.
+            probes (Optional[int]): ivfflat.probes for this query.
+            hybrid (Optional[bool]): Fuse with the full text ranking, defaults to
+                PGVECTOR_HYBRID_SEARCH.
 
         Returns:
             List of Documents most similar to the query.
@@ -91,6 +99,9 @@ class RBACVector(PGVector):
             query=query,
             k=k,
             filter=filter,
+            ef_search=kwargs.get("ef_search"),
+            probes=kwargs.get("probes"),
+            hybrid=kwargs.get("hybrid"),
         )
 
     def run_similarity_search(
@@ -98,27 +109,55 @@ class RBACVector(PGVector):
         query: str,
         k: int = 4,
         filter: Optional[dict] = None,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        hybrid: Optional[bool] = None,
     ) -> List[Tuple[Document, float]]:
         member_email = filter["user"]
-        embedding = self.embedding_function.embed_query(text=query)
+        with span("query_embedding"):
+            embedding = self.embedding_function.embed_query(text=query)
 
         docs = []
-        with Session(self._conn) as session:
-            memberships = get_memberships_by_email(session, member_email)
-            print(query, member_email, len(memberships))
-
-            docs = get_nearest_rbac_docs(session, member_email, embedding)
-        print(docs)
+        with span("pgvector_query"), Session(self._bind) as session:
+            document_uuids = self.acl_cache.get(session, member_email)
+            quantizations = self.table_quantizations.get(session)
+            if PGVECTOR_HYBRID_SEARCH if hybrid is None else hybrid:
+                docs = get_hybrid_rbac_docs(
+                    session,
+                    member_email,
+                    query,
+                    embedding,
+                    k=k,
+                    ef_search=ef_search,
+                    probes=probes,
+                    document_uuids=document_uuids,
+                    quantizations=quantizations,
+                )
+            else:
+                docs = get_nearest_rbac_docs(
+                    session,
+                    member_email,
+                    embedding,
+                    k=k,
+                    ef_search=ef_search,
+                    probes=probes,
+                    document_uuids=document_uuids,
+                    quantizations=quantizations,
+                )
+        self.logger.debug(f"Found {len(docs)} documents of {member_email} for: {query}")
         return docs
 
 
 # # Add write functionality as needed
 
 if __name__ == "__main__":
+    from llm.embeddings import get_embeddings
+    from llm.config import GPT_4_CHAT_MODEL
+
     # This block will only run if the script is executed directly (not imported as a module)
     rbac_vector_store = RBACVector(
         connection_string=CONNECTION_STRING,
-        embedding_function=OpenAIEmbeddings(),
+        embedding_function=get_embeddings(),
     )
 
     prompt = "Summerize given context to you"
@@ -131,8 +170,6 @@ if __name__ == "__main__":
     )
 
     llm = GPT_4_CHAT_MODEL
-    # result = llm.invoke("hello")
-    # print(result)
 
     retriever = rbac_vector_store.as_retriever()
     retriever.search_kwargs = {"filter": {"user": "testmember@example.com"}}
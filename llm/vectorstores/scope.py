@@ -0,0 +1,18 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+# set per slack thread by the app, the agent tools run within it and key their ephemeral
+# vector stores by it
+VECTOR_STORE_SCOPE: ContextVar[Optional[str]] = ContextVar(
+    "vector_store_scope", default=None
+)
+
+
+@contextmanager
+def vector_store_scope(scope: Optional[str]):
+    token = VECTOR_STORE_SCOPE.set(scope)
+    try:
+        yield
+    finally:
+        VECTOR_STORE_SCOPE.reset(token)
@@ -0,0 +1,67 @@
+"""
+Migrations of the rbac schema (organization, datasource, member, membership). After every
+upgrade the document tables of all data sources and their indexes are created if missing, so
+ingestion never creates a table.
+
+    alembic upgrade head
+    alembic revision --autogenerate -m "..."
+"""
+
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine, pool
+from sqlmodel import SQLModel
+
+from llm.config import CONNECTION_STRING
+from llm.database import driver_url
+from llm.vectorstores.pgvector.data_model import create_document_tables
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = SQLModel.metadata
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    # one document table per data source, created after the revisions instead of by them
+    table = object if type_ == "table" else getattr(object, "table", None)
+    if table is not None and table.name.startswith("document_table__"):
+        return False
+    # tables and indexes of langchain, airbyte, the caches and the quantized indexes are
+    # managed elsewhere, autogenerate must not drop them
+    return not (reflected and compare_to is None)
+
+
+def run_migrations_offline() -> None:
+    # the document tables depend on the data sources in the database, only the revisions
+    context.configure(
+        url=driver_url(CONNECTION_STRING),
+        target_metadata=target_metadata,
+        include_object=include_object,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    engine = create_engine(driver_url(CONNECTION_STRING), poolclass=pool.NullPool)
+    with engine.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            include_object=include_object,
+        )
+        with context.begin_transaction():
+            context.run_migrations()
+            # missing ones of new data sources, ahead of the first ingestion into them
+            create_document_tables(connection)
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
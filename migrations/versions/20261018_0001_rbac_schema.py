@@ -0,0 +1,85 @@
+"""rbac schema
+
+Baseline of the organization, datasource, member and membership tables, which existed before
+the migrations, so each is only created if missing.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 21:00:00
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def create_table_if_missing(name: str, *columns):
+    if not sa.inspect(op.get_bind()).has_table(name):
+        op.create_table(name, *columns)
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS vector")
+    create_table_if_missing(
+        "organization",
+        sa.Column("uuid", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("description", sa.String(), nullable=True),
+    )
+    create_table_if_missing(
+        "datasource",
+        sa.Column("uuid", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column(
+            "organization_uuid",
+            postgresql.UUID(as_uuid=True),
+            sa.ForeignKey("organization.uuid"),
+            nullable=False,
+        ),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("description", sa.String(), nullable=True),
+        sa.Column("bot_auth_data", postgresql.JSONB(), nullable=True),
+        sa.Column("document_table_metadata", postgresql.JSONB(), nullable=True),
+        sa.Column("airbyte_meta_data", postgresql.JSONB(), nullable=True),
+    )
+    create_table_if_missing(
+        "member",
+        sa.Column("uuid", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column(
+            "organization_uuid",
+            postgresql.UUID(as_uuid=True),
+            sa.ForeignKey("organization.uuid"),
+            nullable=False,
+        ),
+        sa.Column("email", sa.String(), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+    )
+    create_table_if_missing(
+        "membership",
+        sa.Column("uuid", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column(
+            "data_source_uuid",
+            postgresql.UUID(as_uuid=True),
+            sa.ForeignKey("datasource.uuid"),
+            nullable=False,
+        ),
+        sa.Column(
+            "member_uuid",
+            postgresql.UUID(as_uuid=True),
+            sa.ForeignKey("member.uuid"),
+            nullable=False,
+        ),
+        sa.Column("document_uuid", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("data_source_meta_data", postgresql.JSONB(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    # the baseline holds the data of all organizations, it is never dropped
+    pass
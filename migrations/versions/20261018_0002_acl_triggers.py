@@ -0,0 +1,38 @@
+"""acl triggers
+
+Notifications of membership, member and datasource changes for the member acl cache, the same
+as python -m llm.vectorstores.pgvector.acl
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 21:00:00
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+from llm.vectorstores.pgvector.acl import ACL_NOTIFY_FUNCTION_SQL, ACL_TABLE_NAMES
+
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # one statement per execute, prepared statements cannot hold several
+    op.execute(ACL_NOTIFY_FUNCTION_SQL)
+    for table_name in ACL_TABLE_NAMES:
+        op.execute(f"DROP TRIGGER IF EXISTS aishe_acl_changed ON {table_name}")
+        op.execute(
+            f"CREATE TRIGGER aishe_acl_changed "
+            f"AFTER INSERT OR UPDATE OR DELETE ON {table_name} "
+            f"FOR EACH ROW EXECUTE FUNCTION aishe_notify_acl_changed()"
+        )
+
+
+def downgrade() -> None:
+    for table_name in ACL_TABLE_NAMES:
+        op.execute(f"DROP TRIGGER IF EXISTS aishe_acl_changed ON {table_name}")
+    op.execute("DROP FUNCTION IF EXISTS aishe_notify_acl_changed()")
@@ -0,0 +1,73 @@
+"""cosine vector indexes
+
+Rebuilds the hnsw/ivfflat indexes over the embeddings column which were created with the
+default (l2) or inner product operator class. The searches order by the cosine distance <=>,
+which only an index with vector_cosine_ops serves. Each index is built concurrently next to the
+old one and replaces it once valid, so the tables stay writable. Needs a database connection,
+there is nothing to render in offline mode.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 22:00:00
+"""
+
+import re
+from typing import Sequence, Union
+
+from alembic import op
+from sqlalchemy import text
+
+from llm.vectorstores.pgvector.data_model import quote_identifier
+from llm.vectorstores.pgvector.quantization import VECTOR_INDEXES_SQL
+
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# the index column as pg_get_indexdef prints it, the default operator class is omitted
+NON_COSINE_COLUMN = re.compile(
+    r"(USING (?:hnsw|ivfflat) )\(embeddings(?: vector_l2_ops| vector_ip_ops)?\)"
+)
+INDEX_NAME = re.compile(r'^CREATE INDEX (?:"[^"]*"|\S+) ON ')
+
+
+def cosine_index_statement(definition: str, index_name: str) -> str:
+    """
+    The definition of an existing index with vector_cosine_ops, built concurrently under
+    index_name, the access method and its WITH parameters stay the same
+    """
+    statement = INDEX_NAME.sub(
+        f"CREATE INDEX CONCURRENTLY {quote_identifier(index_name)} ON ", definition
+    )
+    return NON_COSINE_COLUMN.sub(r"\1(embeddings vector_cosine_ops)", statement)
+
+
+def upgrade() -> None:
+    if op.get_context().as_sql:
+        return
+    indexes = [
+        (index_name, definition)
+        for _, definition, index_name in op.get_bind().execute(text(VECTOR_INDEXES_SQL))
+        if NON_COSINE_COLUMN.search(definition)
+    ]
+    # CREATE/DROP INDEX CONCURRENTLY cannot run in a transaction
+    with op.get_context().autocommit_block():
+        for index_name, definition in indexes:
+            new_name = f"{index_name}_cosine"[:63]
+            # left invalid by an interrupted run
+            op.execute(
+                f"DROP INDEX CONCURRENTLY IF EXISTS {quote_identifier(new_name)}"
+            )
+            op.execute(cosine_index_statement(definition, new_name))
+            op.execute(f"DROP INDEX CONCURRENTLY {quote_identifier(index_name)}")
+            # the old name, the document table classes define their indexes by it
+            op.execute(
+                f"ALTER INDEX {quote_identifier(new_name)} "
+                f"RENAME TO {quote_identifier(index_name)}"
+            )
+
+
+def downgrade() -> None:
+    # the queries need the cosine operator class, the old indexes are not rebuilt
+    pass
@@ -0,0 +1,90 @@
+"""text search columns
+
+Adds the generated content_tsv column and its gin index of the hybrid search to the document
+tables which existed before the document table classes defined them, so the classes match the
+schema. Adding the stored column rewrites each table, the index is built concurrently. Indexes
+created under the former name content_tsv_idx_<organization>_<data source> are renamed to
+<table>_content_tsv_idx. Needs a database connection, there is nothing to render in offline
+mode.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 22:30:00
+"""
+
+from typing import Optional, Sequence, Union
+
+from alembic import op
+from sqlalchemy import text
+
+from llm.vectorstores.pgvector.data_model import (
+    NON_RBAC_TABLE_NAME,
+    TEXT_SEARCH_COLUMN,
+    quote_identifier,
+    text_search_index_name,
+    text_search_statements,
+)
+from llm.vectorstores.pgvector.quantization import get_document_table_names
+
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+DOCUMENT_TABLE_PREFIX = "document_table__"
+
+
+def content_column(table_name: str) -> str:
+    # the non rbac table is written by langchain/airbyte
+    return "page_content" if table_name == NON_RBAC_TABLE_NAME else "content"
+
+
+def index_valid(index_name: str) -> Optional[bool]:
+    # None if there is no such index, False if a concurrent build was interrupted
+    return op.get_bind().scalar(
+        text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"),
+        {"name": quote_identifier(index_name)},
+    )
+
+
+def upgrade() -> None:
+    if op.get_context().as_sql:
+        return
+    table_names = get_document_table_names(op.get_bind())
+    for table_name in table_names:
+        add_column, _ = text_search_statements(table_name, content_column(table_name))
+        op.execute(add_column)
+        if table_name.startswith(DOCUMENT_TABLE_PREFIX):
+            former_name = (
+                f"{TEXT_SEARCH_COLUMN}_idx_{table_name[len(DOCUMENT_TABLE_PREFIX):]}"
+            )
+            index_name = text_search_index_name(table_name)
+            if index_valid(former_name) and index_valid(index_name) is None:
+                op.execute(
+                    f"ALTER INDEX {quote_identifier(former_name)} "
+                    f"RENAME TO {quote_identifier(index_name)}"
+                )
+
+    # CREATE INDEX CONCURRENTLY cannot run in a transaction
+    with op.get_context().autocommit_block():
+        for table_name in table_names:
+            index_name = text_search_index_name(table_name)
+            if index_valid(index_name) is False:
+                op.execute(f"DROP INDEX CONCURRENTLY {quote_identifier(index_name)}")
+            _, create_index = text_search_statements(
+                table_name, content_column(table_name), concurrently=True
+            )
+            op.execute(create_index)
+
+
+def downgrade() -> None:
+    if op.get_context().as_sql:
+        return
+    for table_name in get_document_table_names(op.get_bind()):
+        op.execute(
+            f"DROP INDEX IF EXISTS {quote_identifier(text_search_index_name(table_name))}"
+        )
+        op.execute(
+            f"ALTER TABLE {quote_identifier(table_name)} "
+            f"DROP COLUMN IF EXISTS {TEXT_SEARCH_COLUMN}"
+        )
@@ -0,0 +1,156 @@
+import os
+import time
+import inspect
+import functools
+from contextlib import contextmanager
+from typing import Tuple
+
+from dotenv import load_dotenv
+
+# PROMETHEUS_MULTIPROC_DIR is read by prometheus_client on import
+load_dotenv()
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# set for several uvicorn workers, each process writes its metrics into this directory
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# from fast in memory lookups up to full agent runs
+LATENCY_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+)
+
+STAGE_DURATION = Histogram(
+    "aishe_stage_duration_seconds",
+    "Duration of a request stage",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+STAGE_ERRORS = Counter(
+    "aishe_stage_errors_total",
+    "Stages which raised an exception",
+    ["stage"],
+)
+LLM_TOKENS = Counter(
+    "aishe_llm_tokens_total",
+    "Tokens used by llm calls, as reported by the provider",
+    ["model", "kind"],
+)
+
+DB_POOL_CONNECTIONS = Counter(
+    "aishe_db_pool_connections_total",
+    "New database connections opened by the pool",
+    ["engine"],
+)
+DB_POOL_CHECKOUTS = Counter(
+    "aishe_db_pool_checkouts_total",
+    "Connections checked out from the pool",
+    ["engine"],
+)
+DB_POOL_INVALIDATIONS = Counter(
+    "aishe_db_pool_invalidations_total",
+    "Pooled connections invalidated, e.g. by a failed pre ping",
+    ["engine"],
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "aishe_db_pool_checked_out",
+    "Connections currently in use",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+
+CACHE_REQUESTS = Counter(
+    "aishe_cache_requests_total",
+    "Lookups of in process caches",
+    ["cache", "result"],
+)
+CACHE_INVALIDATIONS = Counter(
+    "aishe_cache_invalidations_total",
+    "Entries dropped before their ttl, e.g. by a database notification",
+    ["cache"],
+)
+
+
+@contextmanager
+def span(stage: str):
+    """
+    Measures the wrapped block as stage, exceptions are counted and reraised
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.labels(stage).inc()
+        raise
+    finally:
+        STAGE_DURATION.labels(stage).observe(time.perf_counter() - start)
+
+
+def traced(stage: str):
+    """
+    Decorator version of span, for sync and async functions
+    """
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def observe(stage: str, seconds: float, error: bool = False):
+    """
+    For stages which start and end in different callbacks, like llm and tool runs
+    """
+    STAGE_DURATION.labels(stage).observe(seconds)
+    if error:
+        STAGE_ERRORS.labels(stage).inc()
+
+
+def metrics_payload() -> Tuple[bytes, str]:
+    """
+    Prometheus text format of all metrics, aggregated over all processes in multiprocess mode
+    """
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+
+    from prometheus_client import REGISTRY
+
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,125 @@
+import os
+import time
+import logging
+import threading
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+from llm.config import CONNECTION_STRING
+from llm.database import get_engine
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# any sqlalchemy url, e.g. sqlite:////tmp/slack_events.db as a local stand-in
+# for postgres, as long as all uvicorn workers point to the same database
+SLACK_DEDUP_DATABASE_URL = os.getenv("SLACK_DEDUP_DATABASE_URL") or CONNECTION_STRING
+SLACK_DEDUP_TTL_SECONDS = int(os.getenv("SLACK_DEDUP_TTL_SECONDS", "3600"))
+SLACK_DEDUP_TABLE_NAME = "slack_event_dedup"
+
+
+class EventDeduplicator:
+    """
+    Idempotency store for slack event ids, shared by all worker processes.
+    Slack resends an event with the same event_id if the ack was late, only the first
+    claim of an event id within the ttl wins.
+    """
+
+    def __init__(
+        self,
+        database_url: str = SLACK_DEDUP_DATABASE_URL,
+        ttl_seconds: int = SLACK_DEDUP_TTL_SECONDS,
+    ):
+        self.engine = get_engine(database_url)
+        self.ttl_seconds = ttl_seconds
+        self._table_ready = False
+        self._last_purge = 0.0
+        self._lock = threading.Lock()
+
+    def _ensure_table(self):
+        if self._table_ready:
+            return
+        with self._lock:
+            if self._table_ready:
+                return
+            with self.engine.begin() as conn:
+                conn.execute(
+                    text(
+                        f"CREATE TABLE IF NOT EXISTS {SLACK_DEDUP_TABLE_NAME} ("
+                        f"event_id VARCHAR(255) PRIMARY KEY, "
+                        f"claimed_at DOUBLE PRECISION NOT NULL)"
+                    )
+                )
+                conn.execute(
+                    text(
+                        f"CREATE INDEX IF NOT EXISTS {SLACK_DEDUP_TABLE_NAME}_claimed_at_idx "
+                        f"ON {SLACK_DEDUP_TABLE_NAME} (claimed_at)"
+                    )
+                )
+            self._table_ready = True
+
+    def claim(self, event_id: str) -> bool:
+        """
+        Returns True if the caller is the first one to see this event id and should process it
+        """
+        try:
+            self._ensure_table()
+            now = time.time()
+            with self.engine.begin() as conn:
+                # atomic across processes, an expired claim can be taken over again
+                result = conn.execute(
+                    text(
+                        f"INSERT INTO {SLACK_DEDUP_TABLE_NAME} (event_id, claimed_at) "
+                        f"VALUES (:event_id, :now) "
+                        f"ON CONFLICT (event_id) DO UPDATE SET claimed_at = excluded.claimed_at "
+                        f"WHERE {SLACK_DEDUP_TABLE_NAME}.claimed_at < :expired_before"
+                    ),
+                    {
+                        "event_id": event_id,
+                        "now": now,
+                        "expired_before": now - self.ttl_seconds,
+                    },
+                )
+                claimed = result.rowcount == 1
+        except Exception as error:
+            # rather answer twice than never, if the store is not reachable
+            logger.warning(
+                f"Slack event dedup unavailable, processing {event_id}: {error}"
+            )
+            return True
+        try:
+            self._purge_expired(now)
+        except Exception as error:
+            # the claim already holds, a later claim purges again
+            logger.warning(f"Couldnt purge expired slack events: {error}")
+        return claimed
+
+    def release(self, event_id: str):
+        """
+        Drops a claim, e.g. if the event couldnt be queued and slack should retry it
+        """
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(
+                    text(
+                        f"DELETE FROM {SLACK_DEDUP_TABLE_NAME} WHERE event_id = :event_id"
+                    ),
+                    {"event_id": event_id},
+                )
+        except Exception as error:
+            logger.warning(f"Couldnt release slack event {event_id}: {error}")
+
+    def _purge_expired(self, now: float):
+        # at most every tenth of the ttl, so the table stays small without a cron job
+        if now - self._last_purge < self.ttl_seconds / 10:
+            return
+        self._last_purge = now
+        with self.engine.begin() as conn:
+            conn.execute(
+                text(
+                    f"DELETE FROM {SLACK_DEDUP_TABLE_NAME} WHERE claimed_at < :expired_before"
+                ),
+                {"expired_before": now - self.ttl_seconds},
+            )
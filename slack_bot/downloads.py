@@ -0,0 +1,266 @@
+import os
+import uuid
+import asyncio
+import hashlib
+import fcntl
+import logging
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+import aiohttp
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SLACK_DOWNLOAD_DIR = os.getenv("SLACK_DOWNLOAD_DIR", "downloads/slack_files")
+SLACK_DOWNLOAD_MAX_BYTES = int(
+    os.getenv("SLACK_DOWNLOAD_MAX_BYTES", str(2 * 1024 * 1024 * 1024))
+)
+SLACK_DOWNLOAD_CHUNK_SIZE = int(
+    os.getenv("SLACK_DOWNLOAD_CHUNK_SIZE", str(1024 * 1024))
+)
+SLACK_DOWNLOAD_TIMEOUT_SECONDS = int(os.getenv("SLACK_DOWNLOAD_TIMEOUT_SECONDS", "300"))
+
+
+class SlackDownloadCache:
+    """
+    Content addressed cache of slack file downloads.
+    The content is stored once under objects/{sha256} and hardlinked to files/{file_id}/{name},
+    so tools get a stable path with the original file name while re-uploads share the disk space.
+    Slack file ids are immutable, a known id is never downloaded again.
+    Objects are evicted least recently used once the cache grows above max_bytes, except
+    files pinned by a running fetch or by the agent run which uses them.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        root: str = SLACK_DOWNLOAD_DIR,
+        max_bytes: int = SLACK_DOWNLOAD_MAX_BYTES,
+        chunk_size: int = SLACK_DOWNLOAD_CHUNK_SIZE,
+        timeout_seconds: int = SLACK_DOWNLOAD_TIMEOUT_SECONDS,
+    ):
+        self.token = token
+        self.root = root
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.timeout_seconds = timeout_seconds
+        self.objects_dir = os.path.join(root, "objects")
+        self.files_dir = os.path.join(root, "files")
+        self._session: Optional[aiohttp.ClientSession] = None
+        # file_id -> lock, concurrent events for the same file share one download, dropped
+        # when no fetch holds or waits for it
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._lock_users: Counter = Counter()
+        self._evict_lock = asyncio.Lock()
+        # path -> descriptors holding a shared flock on its inode, one per pin. Eviction
+        # (of any process on the directory) skips objects it cannot lock exclusively.
+        self._pins: Dict[str, List[int]] = {}
+
+    async def start(self):
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.files_dir, exist_ok=True)
+        self._session = aiohttp.ClientSession(
+            headers={"Authorization": f"Bearer {self.token}"},
+            timeout=aiohttp.ClientTimeout(total=self.timeout_seconds),
+        )
+
+    async def stop(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def file_path(self, file_id: str, file_name: str) -> str:
+        # the name comes from the uploading user, never let it leave the file directory
+        return os.path.join(self.files_dir, file_id, os.path.basename(file_name))
+
+    async def fetch_all(self, files: List[dict]) -> List[Optional[str]]:
+        """
+        Downloads all files of one slack message in parallel, None for failed downloads.
+        The paths stay pinned until they are passed to release, e.g. after the agent run.
+        """
+        return await asyncio.gather(*[self.fetch(file_info) for file_info in files])
+
+    def release(self, file_paths: List[Optional[str]]):
+        """
+        Unpins the paths returned by fetch/fetch_all, they can be evicted afterwards
+        """
+        for file_path in file_paths:
+            if file_path is not None:
+                self._unpin(file_path)
+
+    async def fetch(self, file_info: dict) -> Optional[str]:
+        """
+        file_info: slack file object of a message event
+        Returns the local path of the file, pinned until release, or None if it couldnt be
+        downloaded
+        """
+        file_id = file_info["id"]
+        file_path = self.file_path(file_id, file_info["name"])
+
+        lock = self._locks.setdefault(file_id, asyncio.Lock())
+        self._lock_users[file_id] += 1
+        try:
+            async with lock:
+                if not await self._fetch(file_info, file_path):
+                    return None
+        finally:
+            self._lock_users[file_id] -= 1
+            if not self._lock_users[file_id]:
+                del self._lock_users[file_id]
+                del self._locks[file_id]
+        await self.evict()
+        return file_path
+
+    async def _fetch(self, file_info: dict, file_path: str) -> bool:
+        object_path = None
+        try:
+            if self._pin(file_path):
+                # hardlinks share the inode, this marks the object as recently used
+                os.utime(file_path)
+                return True
+
+            object_path = await self._download(file_info["url_private_download"])
+            if object_path is None:
+                return False
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            try:
+                os.link(object_path, file_path)
+            except FileExistsError:
+                # linked by another process sharing the directory
+                pass
+            return self._pin(file_path)
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+            logger.error(f"Couldnt download slack file {file_info['id']}: {e}")
+            return False
+        finally:
+            # the file link holds its own pin by now
+            if object_path is not None:
+                self._unpin(object_path)
+
+    def _pin(self, path: str) -> bool:
+        """
+        Takes a shared flock on the inode of path. Returns False if the path doesnt exist
+        or was evicted before the lock was granted.
+        """
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            return False
+        # waits only while an eviction removes this very inode
+        fcntl.flock(fd, fcntl.LOCK_SH)
+        if os.fstat(fd).st_nlink == 0:
+            os.close(fd)
+            return False
+        self._pins.setdefault(path, []).append(fd)
+        return True
+
+    def _unpin(self, path: str):
+        fds = self._pins[path]
+        fd = fds.pop()
+        if not fds:
+            del self._pins[path]
+        os.close(fd)
+
+    async def _download(self, file_url: str) -> Optional[str]:
+        """
+        Returns the object path, pinned until the caller unpins it
+        """
+        temp_path = os.path.join(self.objects_dir, f".{uuid.uuid4().hex}.part")
+        digest = hashlib.sha256()
+        try:
+            async with self._session.get(file_url, allow_redirects=True) as resp:
+                if resp.status != 200:
+                    logger.error(f"Slack file download failed with {resp.status}")
+                    return None
+                with open(temp_path, "wb") as f:
+                    async for chunk in resp.content.iter_chunked(self.chunk_size):
+                        digest.update(chunk)
+                        await asyncio.to_thread(f.write, chunk)
+
+            object_path = os.path.join(self.objects_dir, digest.hexdigest())
+            if self._pin(object_path):
+                os.utime(object_path)
+                return object_path
+            os.replace(temp_path, object_path)
+            return object_path if self._pin(object_path) else None
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    async def evict(self):
+        """
+        Removes the least recently used objects and their files above max_bytes, pinned
+        ones are skipped
+        """
+        async with self._evict_lock:
+            await asyncio.to_thread(self._evict)
+
+    def _evict(self):
+        objects = []
+        total_bytes = 0
+        with os.scandir(self.objects_dir) as entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    # evicted by another process meanwhile
+                    continue
+                objects.append((stat.st_mtime, stat.st_size, stat.st_ino, entry.path))
+                total_bytes += stat.st_size
+        if total_bytes <= self.max_bytes:
+            return
+
+        # the named links of an object share its inode
+        links = defaultdict(list)
+        for dir_path, _, file_names in os.walk(self.files_dir):
+            for file_name in file_names:
+                path = os.path.join(dir_path, file_name)
+                try:
+                    links[os.stat(path).st_ino].append(path)
+                except FileNotFoundError:
+                    pass
+
+        for _, size, inode, object_path in sorted(objects):
+            if total_bytes <= self.max_bytes:
+                break
+            if self._remove_object(object_path, links.get(inode, [])):
+                total_bytes -= size
+
+    def _remove_object(self, object_path: str, link_paths: List[str]) -> bool:
+        """
+        Returns False if the object is pinned, True once it is gone
+        """
+        try:
+            fd = os.open(object_path, os.O_RDONLY)
+        except FileNotFoundError:
+            # evicted by another process
+            return True
+        try:
+            try:
+                # fails while a fetch or an agent run of any process pins the inode
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            for path in [*link_paths, object_path]:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    # unlinked by another process
+                    pass
+            for path in link_paths:
+                try:
+                    os.rmdir(os.path.dirname(path))
+                except OSError:
+                    # other files left in the directory, e.g. tool output
+                    pass
+            logger.info(f"Evicted slack download {os.path.basename(object_path)}")
+            return True
+        finally:
+            os.close(fd)
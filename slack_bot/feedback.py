@@ -0,0 +1,141 @@
+import os
+import asyncio
+import logging
+from functools import lru_cache
+from typing import Awaitable, Callable, List, Optional
+
+from dotenv import load_dotenv
+from langfuse import Langfuse
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+FEEDBACK_BATCH_SIZE = int(os.getenv("FEEDBACK_BATCH_SIZE", "50"))
+FEEDBACK_FLUSH_INTERVAL = float(os.getenv("FEEDBACK_FLUSH_INTERVAL", "5"))
+FEEDBACK_QUEUE_SIZE = int(os.getenv("FEEDBACK_QUEUE_SIZE", "1000"))
+# queued by stop, the pending batch is flushed before the pipeline ends
+_STOP = object()
+
+
+@lru_cache(maxsize=None)
+def get_langfuse_client() -> Langfuse:
+    # one client per process, it batches and sends its events in its own thread
+    return Langfuse()
+
+
+class FeedbackPipeline:
+    """
+    Buffers slack ratings and sends them to langfuse in batches, flushed on size or time.
+    Keeps the rating endpoint free of langfuse and slack round trips.
+    """
+
+    def __init__(
+        self,
+        fetch_chat_history: Callable[[str], Awaitable[List[dict]]],
+        batch_size: int = FEEDBACK_BATCH_SIZE,
+        flush_interval: float = FEEDBACK_FLUSH_INTERVAL,
+        max_size: int = FEEDBACK_QUEUE_SIZE,
+    ):
+        self.fetch_chat_history = fetch_chat_history
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        # behind the queued ratings, so the running batch and the queue are flushed first
+        await self._queue.put(_STOP)
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        # submitted while stopping
+        batch = []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        if batch:
+            await self._flush(batch)
+
+    def submit(self, feedback: dict) -> bool:
+        """
+        feedback: rating data, channel_id is set if the chat history should be attached
+        """
+        try:
+            self._queue.put_nowait(feedback)
+            return True
+        except asyncio.QueueFull:
+            logger.warning(f"Feedback queue full, dropping rating {feedback['id']}")
+            return False
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            feedback = await self._queue.get()
+            if feedback is _STOP:
+                return
+            batch = [feedback]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    feedback = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if feedback is _STOP:
+                    stopping = True
+                    break
+                batch.append(feedback)
+            try:
+                await self._flush(batch)
+            except Exception as error:
+                logger.exception(f"Couldnt send {len(batch)} ratings: {error}")
+
+    async def _flush(self, batch: List[dict]):
+        # one history fetch per channel, concurrently for the whole batch
+        channel_ids = list(
+            {feedback["channel_id"] for feedback in batch if feedback.get("channel_id")}
+        )
+        histories = await asyncio.gather(
+            *[self.fetch_chat_history(channel_id) for channel_id in channel_ids],
+            return_exceptions=True,
+        )
+        chat_histories = {
+            channel_id: history
+            for channel_id, history in zip(channel_ids, histories)
+            if not isinstance(history, Exception)
+        }
+        for feedback in batch:
+            if feedback.get("channel_id") in chat_histories:
+                feedback["metadata"]["chat_history"] = chat_histories[
+                    feedback["channel_id"]
+                ]
+
+        # the langfuse sdk is synchronous
+        await asyncio.to_thread(self._send, batch)
+
+    def _send(self, batch: List[dict]):
+        langfuse_client = get_langfuse_client()
+        for feedback in batch:
+            # Create a trace in Langfuse
+            trace = langfuse_client.trace(
+                name=feedback["name"],
+                input={"message_text": feedback["message_text"]},
+                metadata=feedback["metadata"],
+            )
+            # Send the score to Langfuse with the message text as a comment
+            trace.score(
+                name="quality",
+                value=feedback["value"],
+                comment=feedback["comment"],
+                id=feedback["id"],  # Unique idempotency key
+            )
+        langfuse_client.flush()
@@ -0,0 +1,291 @@
+import os
+import json
+import time
+import bisect
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+from slack_sdk.errors import SlackApiError
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from llm.config import CONNECTION_STRING
+from llm.database import get_engine
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# messages kept per channel
+SLACK_HISTORY_SIZE = int(os.getenv("SLACK_HISTORY_SIZE", "50"))
+# uvicorn reads its --workers default from WEB_CONCURRENCY, the Dockerfile sets it to nproc
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY") or "1")
+# "memory" is exact for a single uvicorn worker, with several workers each one only sees
+# the events routed to it, "postgres" shares the buffers between them
+SLACK_HISTORY_BACKEND = os.getenv("SLACK_HISTORY_BACKEND") or (
+    "postgres" if WEB_CONCURRENCY > 1 else "memory"
+)
+# a buffer is synced with slack again after this time, covers missed/foreign events
+SLACK_HISTORY_MAX_AGE_SECONDS = int(os.getenv("SLACK_HISTORY_MAX_AGE_SECONDS", "900"))
+
+# only these fields are needed for llm memory and rating context
+MESSAGE_FIELDS = ("ts", "text", "user", "bot_id", "client_msg_id")
+
+
+def compact_message(message: dict) -> dict:
+    return {field: message[field] for field in MESSAGE_FIELDS if field in message}
+
+
+class ChannelBuffer:
+    """
+    Ring buffer of the most recent messages of one channel, ordered by ts
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.messages = {}
+        self.order = []
+        self.synced_at = 0.0
+        # True if the last slack sync returned the whole channel history
+        self.complete = False
+
+    def __len__(self):
+        return len(self.order)
+
+    def add(self, message: dict):
+        ts = message["ts"]
+        if ts not in self.messages:
+            bisect.insort(self.order, ts, key=float)
+        self.messages[ts] = message
+        while len(self.order) > self.size:
+            del self.messages[self.order.pop(0)]
+            self.complete = False
+
+    def remove(self, ts: str):
+        if self.messages.pop(ts, None) is not None:
+            self.order.remove(ts)
+
+    def clear(self):
+        self.messages = {}
+        self.order = []
+
+    def latest(self, limit: int) -> List[dict]:
+        # newest first, like conversations.history
+        return [self.messages[ts] for ts in reversed(self.order[-limit:])]
+
+    def is_stale(self, max_age_seconds: int) -> bool:
+        return time.time() - self.synced_at > max_age_seconds
+
+
+class PostgresHistoryBacking:
+    """
+    Shares the channel buffers between worker processes
+    """
+
+    def __init__(self, connection_string: str = CONNECTION_STRING):
+        self.engine = get_engine(connection_string)
+        self._table_ready = False
+
+    def _ensure_tables(self):
+        if self._table_ready:
+            return
+        with self.engine.begin() as conn:
+            conn.execute(
+                text(
+                    "CREATE TABLE IF NOT EXISTS slack_message ("
+                    "channel VARCHAR(64) NOT NULL, ts VARCHAR(32) NOT NULL, "
+                    "message JSONB NOT NULL, PRIMARY KEY (channel, ts))"
+                )
+            )
+            conn.execute(
+                text(
+                    "CREATE TABLE IF NOT EXISTS slack_channel_sync ("
+                    "channel VARCHAR(64) PRIMARY KEY, "
+                    "synced_at DOUBLE PRECISION NOT NULL, complete BOOLEAN NOT NULL)"
+                )
+            )
+        self._table_ready = True
+
+    def save(self, channel: str, messages: List[dict], size: int):
+        self._ensure_tables()
+        with self.engine.begin() as conn:
+            for message in messages:
+                conn.execute(
+                    text(
+                        "INSERT INTO slack_message (channel, ts, message) "
+                        "VALUES (:channel, :ts, CAST(:message AS JSONB)) "
+                        "ON CONFLICT (channel, ts) DO UPDATE SET message = excluded.message"
+                    ),
+                    {
+                        "channel": channel,
+                        "ts": message["ts"],
+                        "message": json.dumps(message),
+                    },
+                )
+            # keep only the newest messages, same as the in memory ring buffer
+            conn.execute(
+                text(
+                    "DELETE FROM slack_message WHERE channel = :channel AND ts <= ("
+                    "SELECT ts FROM slack_message WHERE channel = :channel "
+                    "ORDER BY ts DESC OFFSET :size LIMIT 1)"
+                ),
+                {"channel": channel, "size": size},
+            )
+
+    def delete(self, channel: str, ts: str):
+        self._ensure_tables()
+        with self.engine.begin() as conn:
+            conn.execute(
+                text("DELETE FROM slack_message WHERE channel = :channel AND ts = :ts"),
+                {"channel": channel, "ts": ts},
+            )
+
+    def mark_synced(self, channel: str, complete: bool):
+        self._ensure_tables()
+        with self.engine.begin() as conn:
+            conn.execute(
+                text(
+                    "INSERT INTO slack_channel_sync (channel, synced_at, complete) "
+                    "VALUES (:channel, :synced_at, :complete) "
+                    "ON CONFLICT (channel) DO UPDATE SET "
+                    "synced_at = excluded.synced_at, complete = excluded.complete"
+                ),
+                {"channel": channel, "synced_at": time.time(), "complete": complete},
+            )
+
+    def load(self, channel: str, buffer: ChannelBuffer):
+        self._ensure_tables()
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                text(
+                    "SELECT message FROM slack_message WHERE channel = :channel "
+                    "ORDER BY ts DESC LIMIT :size"
+                ),
+                {"channel": channel, "size": buffer.size},
+            ).fetchall()
+            sync = conn.execute(
+                text(
+                    "SELECT synced_at, complete FROM slack_channel_sync WHERE channel = :channel"
+                ),
+                {"channel": channel},
+            ).fetchone()
+        # the table is the shared truth, drops messages deleted by other workers
+        buffer.clear()
+        for row in rows:
+            buffer.add(row[0])
+        if sync:
+            buffer.synced_at, buffer.complete = sync
+
+
+class SlackHistoryStore:
+    """
+    Recent messages per channel, maintained from the slack events and our own posts.
+    conversations.history is only called for cold, stale or too short buffers.
+    """
+
+    def __init__(
+        self,
+        slack_client,
+        size: int = SLACK_HISTORY_SIZE,
+        max_age_seconds: int = SLACK_HISTORY_MAX_AGE_SECONDS,
+        backing: Optional[PostgresHistoryBacking] = None,
+    ):
+        self.slack_client = slack_client
+        self.size = size
+        self.max_age_seconds = max_age_seconds
+        self.backing = backing
+        self._channels: Dict[str, ChannelBuffer] = {}
+
+    def _buffer(self, channel: str) -> ChannelBuffer:
+        buffer = self._channels.get(channel)
+        if buffer is None:
+            buffer = self._channels[channel] = ChannelBuffer(self.size)
+        return buffer
+
+    async def _call_backing(self, method, *args) -> bool:
+        """
+        Runs a backing method in a thread. An unreachable database only costs the sharing
+        between workers, the in memory buffer keeps serving.
+        """
+        try:
+            await asyncio.to_thread(method, *args)
+            return True
+        except SQLAlchemyError as e:
+            logger.warning(f"Slack history backing unavailable, {method.__name__}: {e}")
+            return False
+
+    async def record(self, channel: str, message: dict):
+        message = compact_message(message)
+        if "ts" not in message:
+            return
+        self._buffer(channel).add(message)
+        if self.backing:
+            await self._call_backing(self.backing.save, channel, [message], self.size)
+
+    async def remove(self, channel: str, ts: str):
+        self._buffer(channel).remove(ts)
+        if self.backing:
+            await self._call_backing(self.backing.delete, channel, ts)
+
+    async def record_event(self, event: dict):
+        """
+        Applies a slack message event (new, edited or deleted message) to the buffer
+        """
+        if event.get("type") != "message" or "channel" not in event:
+            return
+        subtype = event.get("subtype")
+        if subtype == "message_changed":
+            await self.record(event["channel"], event["message"])
+        elif subtype == "message_deleted":
+            await self.remove(event["channel"], event["deleted_ts"])
+        elif subtype in (None, "bot_message", "file_share", "thread_broadcast"):
+            await self.record(event["channel"], event)
+
+    async def record_response(self, response):
+        """
+        Records the message of a chat.postMessage/chat.update response, our own posts
+        """
+        message = dict(response.get("message") or {})
+        message.setdefault("ts", response.get("ts"))
+        message.setdefault("text", response.get("text", ""))
+        await self.record(response["channel"], message)
+
+    async def latest(self, channel: str, limit: int) -> List[dict]:
+        buffer = self._buffer(channel)
+        if self.backing:
+            # other workers might have seen newer events
+            await self._call_backing(self.backing.load, channel, buffer)
+
+        if buffer.is_stale(self.max_age_seconds) or (
+            len(buffer) < limit and not buffer.complete
+        ):
+            await self._sync(channel, buffer)
+        return buffer.latest(limit)
+
+    async def _sync(self, channel: str, buffer: ChannelBuffer):
+        try:
+            response = await self.slack_client.conversations_history(
+                channel=channel, limit=self.size
+            )
+        except SlackApiError as e:
+            logger.warning(
+                f"Couldnt sync slack history of {channel}: {e.response['error']}"
+            )
+            return
+        messages = [compact_message(message) for message in response["messages"]]
+        for message in messages:
+            buffer.add(message)
+        buffer.synced_at = time.time()
+        buffer.complete = not response.get("has_more", False)
+
+        if self.backing and await self._call_backing(
+            self.backing.save, channel, messages, self.size
+        ):
+            await self._call_backing(self.backing.mark_synced, channel, buffer.complete)
+
+
+def new_slack_history_store(slack_client) -> SlackHistoryStore:
+    backing = PostgresHistoryBacking() if SLACK_HISTORY_BACKEND == "postgres" else None
+    return SlackHistoryStore(slack_client, backing=backing)
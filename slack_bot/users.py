@@ -0,0 +1,193 @@
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+import aiohttp
+from dotenv import load_dotenv
+from slack_sdk.errors import SlackApiError
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SLACK_USER_CACHE_TTL_SECONDS = int(os.getenv("SLACK_USER_CACHE_TTL_SECONDS", "3600"))
+SLACK_USER_CACHE_NEGATIVE_TTL_SECONDS = int(
+    os.getenv("SLACK_USER_CACHE_NEGATIVE_TTL_SECONDS", "300")
+)
+SLACK_USER_CACHE_MAX_SIZE = int(os.getenv("SLACK_USER_CACHE_MAX_SIZE", "10000"))
+
+
+class SlackUserCache:
+    """
+    Cache of slack user profiles for mention detection.
+    Once the bot user id is known (auth.test or SLACK_BOT_ID) a mention check needs no slack call,
+    otherwise profiles are looked up once per ttl and shared between concurrent events.
+    A failed auth.test on start is retried on a later mention check, at most once per
+    negative ttl.
+    """
+
+    def __init__(
+        self,
+        slack_client,
+        bot_display_name: str,
+        bot_user_id: Optional[str] = None,
+        ttl_seconds: int = SLACK_USER_CACHE_TTL_SECONDS,
+        negative_ttl_seconds: int = SLACK_USER_CACHE_NEGATIVE_TTL_SECONDS,
+        max_size: int = SLACK_USER_CACHE_MAX_SIZE,
+    ):
+        self.slack_client = slack_client
+        self.bot_display_name = bot_display_name
+        self.bot_user_ids = {bot_user_id} if bot_user_id else set()
+        # set by auth.test, afterwards the bot id alone decides if the bot was mentioned
+        self.bot_user_id_resolved = False
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.max_size = max_size
+        # user_id -> (expires_at, user or None for unknown users)
+        self._users = OrderedDict()
+        self._inflight = {}
+        # monotonic time after which a failed auth.test is tried again
+        self._resolve_retry_at = 0.0
+        self._resolve_task = None
+
+    async def start(self):
+        if not await self.resolve_bot_user_id():
+            await self.warm()
+
+    async def resolve_bot_user_id(self) -> bool:
+        """
+        Looks up the bot user id with auth.test, concurrent callers share one call.
+        Returns False if slack couldnt be reached, the next try is after the negative ttl.
+        """
+        if self.bot_user_id_resolved:
+            return True
+        if self._resolve_task is None:
+            if self._resolve_retry_at > time.monotonic():
+                return False
+            self._resolve_task = asyncio.ensure_future(self._auth_test())
+            self._resolve_task.add_done_callback(
+                lambda _: setattr(self, "_resolve_task", None)
+            )
+        return await self._resolve_task
+
+    async def _auth_test(self) -> bool:
+        try:
+            response = await self.slack_client.auth_test()
+        except SlackApiError as e:
+            error = e.response["error"]
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            error = repr(e)
+        else:
+            self.bot_user_ids.add(response["user_id"])
+            self.bot_user_id_resolved = True
+            return True
+        logger.warning(f"Couldnt resolve slack bot user id: {error}")
+        self._resolve_retry_at = time.monotonic() + self.negative_ttl_seconds
+        return False
+
+    async def warm(self):
+        """
+        Fills the cache with users.list, one api call per 200 users instead of one per user
+        """
+        cursor = None
+        try:
+            while True:
+                response = await self.slack_client.users_list(cursor=cursor, limit=200)
+                for user in response["members"]:
+                    self._store(user["id"], user, self.ttl_seconds)
+                cursor = response.get("response_metadata", {}).get("next_cursor")
+                if not cursor:
+                    break
+        except SlackApiError as e:
+            logger.warning(f"Couldnt warm slack user cache: {e.response['error']}")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Couldnt warm slack user cache: {e!r}")
+
+    async def is_bot_mentioned(self, user_ids: Iterable[str]) -> bool:
+        user_ids = set(user_ids)
+        if user_ids & self.bot_user_ids:
+            return True
+        if not user_ids:
+            return False
+        if await self.resolve_bot_user_id():
+            return bool(user_ids & self.bot_user_ids)
+
+        users = await self.get_users(user_ids)
+        for user_id, user in users.items():
+            if self.is_bot(user):
+                # remember it, next mention is decided by id only
+                self.bot_user_ids.add(user_id)
+                return True
+        return False
+
+    def is_bot(self, user: Optional[dict]) -> bool:
+        # Check if the user is a bot and has a specific real name
+        return bool(
+            user
+            and user["is_bot"]
+            and user["profile"]["real_name"] == self.bot_display_name
+        )
+
+    async def get_users(self, user_ids: Iterable[str]) -> Dict[str, Optional[dict]]:
+        users = {}
+        missing = []
+        for user_id in set(user_ids):
+            cached = self._lookup(user_id)
+            if cached is not None:
+                users[user_id] = cached[1]
+            else:
+                missing.append(user_id)
+
+        if missing:
+            fetched = await asyncio.gather(
+                *[self._fetch(user_id) for user_id in missing]
+            )
+            users.update(zip(missing, fetched))
+        return users
+
+    def _lookup(self, user_id: str):
+        entry = self._users.get(user_id)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._users[user_id]
+            return None
+        self._users.move_to_end(user_id)
+        return entry
+
+    def _store(self, user_id: str, user: Optional[dict], ttl_seconds: int):
+        self._users[user_id] = (time.monotonic() + ttl_seconds, user)
+        self._users.move_to_end(user_id)
+        while len(self._users) > self.max_size:
+            self._users.popitem(last=False)
+
+    async def _fetch(self, user_id: str) -> Optional[dict]:
+        # concurrent events mentioning the same user share one users.info call
+        task = self._inflight.get(user_id)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_user(user_id))
+            self._inflight[user_id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(user_id, None))
+        return await task
+
+    async def _fetch_user(self, user_id: str) -> Optional[dict]:
+        try:
+            response = await self.slack_client.users_info(user=user_id)
+            self._store(user_id, response["user"], self.ttl_seconds)
+            return response["user"]
+        except SlackApiError as e:
+            if e.response["error"] == "user_not_found":
+                self._store(user_id, None, self.negative_ttl_seconds)
+            else:
+                # e.g. ratelimited, dont cache so the next event tries again
+                logger.warning(
+                    f"Couldnt look up slack user {user_id}: {e.response['error']}"
+                )
+            return None
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # not cached either, the next event tries again
+            logger.warning(f"Couldnt look up slack user {user_id}: {e!r}")
+            return None
@@ -0,0 +1,83 @@
+import os
+import asyncio
+import logging
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SLACK_WORKER_CONCURRENCY = int(os.getenv("SLACK_WORKER_CONCURRENCY", "4"))
+SLACK_QUEUE_SIZE = int(os.getenv("SLACK_QUEUE_SIZE", "100"))
+SLACK_WORKER_SHUTDOWN_TIMEOUT = float(os.getenv("SLACK_WORKER_SHUTDOWN_TIMEOUT", "30"))
+
+
+class EventQueue:
+    """
+    Bounded job queue which is drained by a fixed pool of async workers.
+    Lets the slack endpoints ack within slacks 3 second window, while the
+    expensive agent runs happen in the background with limited concurrency.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = SLACK_WORKER_CONCURRENCY,
+        max_size: int = SLACK_QUEUE_SIZE,
+    ):
+        self.concurrency = concurrency
+        self.max_size = max_size
+        self._queue = None
+        self._workers = []
+
+    async def start(self):
+        # queue must be created within the running event loop
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._workers = [
+            asyncio.create_task(self._worker(index))
+            for index in range(self.concurrency)
+        ]
+        logger.info(
+            f"Started {self.concurrency} slack workers, queue size {self.max_size}"
+        )
+
+    async def stop(self, timeout: float = SLACK_WORKER_SHUTDOWN_TIMEOUT):
+        if self._queue is None:
+            return
+        # give queued jobs a chance to finish before the workers are cancelled
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"Slack queue not drained after {timeout}s, {self._queue.qsize()} jobs dropped"
+            )
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def qsize(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def submit(self, handler, *args) -> bool:
+        """
+        Enqueue a coroutine function with its arguments, returns False if the queue is full
+        """
+        try:
+            self._queue.put_nowait((handler, args))
+            return True
+        except asyncio.QueueFull:
+            logger.warning(f"Slack queue full, rejecting job {handler.__name__}")
+            return False
+
+    async def _worker(self, index: int):
+        while True:
+            handler, args = await self._queue.get()
+            try:
+                await handler(*args)
+            except Exception as error:
+                logger.exception(
+                    f"Slack worker {index} failed on {handler.__name__}: {error}"
+                )
+            finally:
+                self._queue.task_done()
@@ -0,0 +1,17 @@
+\c aisheAI;
+
+-- Cosine index for the non rbac document table, the queries order by embeddings <=> :embedding
+-- Tables created later (e.g. by airbyte) need the same statement once they exist, existing
+-- indexes with the default (l2) operator class are rebuilt by `alembic upgrade head`
+DO $$
+BEGIN
+    IF to_regclass('public.document') IS NOT NULL THEN
+        CREATE INDEX IF NOT EXISTS document_embeddings_hnsw_idx
+            ON document USING hnsw (embeddings vector_cosine_ops)
+            WITH (m = 16, ef_construction = 200);
+    END IF;
+END $$;
+
+-- IVFFlat alternative, faster to build, needs rows before creation (lists ~ rows / 1000)
+-- CREATE INDEX document_embeddings_ivfflat_idx
+--     ON document USING ivfflat (embeddings vector_cosine_ops) WITH (lists = 100);
@@ -0,0 +1,32 @@
+\c aisheAI;
+
+-- Full text half of the hybrid search (PGVECTOR_HYBRID_SEARCH), a generated tsvector column with
+-- a gin index on the non rbac document table and on every rbac document table.
+-- The config must match TEXT_SEARCH_CONFIG of llm/vectorstores/pgvector/data_model.py, the index
+-- names text_search_index_name. Existing databases get the same by `alembic upgrade head`.
+DO $$
+DECLARE
+    document_table record;
+BEGIN
+    IF to_regclass('public.document') IS NOT NULL THEN
+        ALTER TABLE document ADD COLUMN IF NOT EXISTS content_tsv tsvector
+            GENERATED ALWAYS AS (to_tsvector('english', coalesce(page_content, ''))) STORED;
+        CREATE INDEX IF NOT EXISTS document_content_tsv_idx ON document USING gin (content_tsv);
+    END IF;
+
+    FOR document_table IN
+        SELECT tablename FROM pg_tables
+        WHERE schemaname = 'public' AND tablename LIKE 'document\_table\_\_%'
+    LOOP
+        EXECUTE format(
+            'ALTER TABLE %I ADD COLUMN IF NOT EXISTS content_tsv tsvector '
+            'GENERATED ALWAYS AS (to_tsvector(''english'', coalesce(content, ''''))) STORED',
+            document_table.tablename
+        );
+        EXECUTE format(
+            'CREATE INDEX IF NOT EXISTS %I ON %I USING gin (content_tsv)',
+            document_table.tablename || '_content_tsv_idx',
+            document_table.tablename
+        );
+    END LOOP;
+END $$;
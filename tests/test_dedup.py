@@ -0,0 +1,57 @@
+from slack_bot.dedup import EventDeduplicator
+
+
+def new_deduplicator(tmp_path, ttl_seconds: int = 3600) -> EventDeduplicator:
+    # sqlite as a local stand-in for postgres, like SLACK_DEDUP_DATABASE_URL allows
+    return EventDeduplicator(f"sqlite:///{tmp_path / 'dedup.db'}", ttl_seconds)
+
+
+def test_only_the_first_claim_wins(tmp_path):
+    deduplicator = new_deduplicator(tmp_path)
+
+    assert deduplicator.claim("Ev1")
+    assert not deduplicator.claim("Ev1")
+    assert deduplicator.claim("Ev2")
+
+
+def test_claims_are_shared_between_instances(tmp_path):
+    # e.g. two uvicorn workers on the same database
+    assert new_deduplicator(tmp_path).claim("Ev1")
+    assert not new_deduplicator(tmp_path).claim("Ev1")
+
+
+def test_released_event_can_be_claimed_again(tmp_path):
+    deduplicator = new_deduplicator(tmp_path)
+    deduplicator.claim("Ev1")
+
+    deduplicator.release("Ev1")
+
+    assert deduplicator.claim("Ev1")
+
+
+def test_expired_claim_is_taken_over(tmp_path):
+    deduplicator = new_deduplicator(tmp_path, ttl_seconds=-1)
+
+    assert deduplicator.claim("Ev1")
+    assert deduplicator.claim("Ev1")
+
+
+def test_unreachable_store_processes_the_event(tmp_path):
+    deduplicator = EventDeduplicator(
+        f"sqlite:///{tmp_path / 'missing' / 'dedup.db'}", 3600
+    )
+
+    assert deduplicator.claim("Ev1")
+    assert deduplicator.claim("Ev1")
+
+
+def test_failing_purge_keeps_the_claim(tmp_path, monkeypatch):
+    deduplicator = new_deduplicator(tmp_path)
+
+    def failing_purge(now: float):
+        raise RuntimeError("purge failed")
+
+    monkeypatch.setattr(deduplicator, "_purge_expired", failing_purge)
+
+    assert deduplicator.claim("Ev1")
+    assert not deduplicator.claim("Ev1")
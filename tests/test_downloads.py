@@ -0,0 +1,134 @@
+import os
+import asyncio
+
+from slack_bot.downloads import SlackDownloadCache
+
+
+class FakeContent:
+    def __init__(self, body: bytes):
+        self.body = body
+
+    async def iter_chunked(self, size: int):
+        for start in range(0, len(self.body), size):
+            # lets concurrent fetches interleave
+            await asyncio.sleep(0.01)
+            yield self.body[start : start + size]
+
+
+class FakeResponse:
+    def __init__(self, body: bytes):
+        self.status = 200
+        self.content = FakeContent(body)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+
+class FakeSession:
+    def __init__(self, bodies: dict):
+        self.bodies = bodies
+        self.requests = []
+
+    def get(self, url: str, allow_redirects: bool = True):
+        self.requests.append(url)
+        return FakeResponse(self.bodies[url])
+
+
+def new_cache(tmp_path, bodies: dict, max_bytes: int = 1024) -> SlackDownloadCache:
+    cache = SlackDownloadCache("token", root=str(tmp_path), max_bytes=max_bytes)
+    os.makedirs(cache.objects_dir, exist_ok=True)
+    os.makedirs(cache.files_dir, exist_ok=True)
+    cache._session = FakeSession(bodies)
+    return cache
+
+
+def file_info(file_id: str) -> dict:
+    return {"id": file_id, "name": f"{file_id}.txt", "url_private_download": file_id}
+
+
+def test_concurrent_fetches_of_one_file_share_the_download(tmp_path):
+    cache = new_cache(tmp_path, {"F1": b"a" * 100})
+
+    async def fetch_concurrently():
+        return await asyncio.gather(*[cache.fetch(file_info("F1")) for _ in range(5)])
+
+    paths = asyncio.run(fetch_concurrently())
+
+    assert paths == [cache.file_path("F1", "F1.txt")] * 5
+    assert cache._session.requests == ["F1"]
+    with open(paths[0], "rb") as f:
+        assert f.read() == b"a" * 100
+    assert not cache._locks
+    # one pin per returned path, the download's pin of the object is gone
+    assert {path: len(fds) for path, fds in cache._pins.items()} == {paths[0]: 5}
+    cache.release(paths)
+    assert not cache._pins
+
+
+def test_fetch_after_the_lock_was_dropped_reuses_the_file(tmp_path):
+    cache = new_cache(tmp_path, {"F1": b"a" * 100})
+
+    first = asyncio.run(cache.fetch(file_info("F1")))
+    second = asyncio.run(cache.fetch(file_info("F1")))
+
+    assert first == second
+    assert cache._session.requests == ["F1"]
+
+
+def test_eviction_removes_least_recently_used_objects(tmp_path):
+    cache = new_cache(tmp_path, {"F1": b"a" * 600, "F2": b"b" * 600}, max_bytes=1000)
+
+    first = asyncio.run(cache.fetch(file_info("F1")))
+    cache.release([first])
+    os.utime(first, (0, 0))
+    second = asyncio.run(cache.fetch(file_info("F2")))
+
+    assert not os.path.exists(first)
+    assert os.path.exists(second)
+    assert len(os.listdir(cache.objects_dir)) == 1
+
+
+def test_files_of_one_message_stay_until_released(tmp_path):
+    cache = new_cache(tmp_path, {"F1": b"a" * 600, "F2": b"b" * 600}, max_bytes=1000)
+
+    paths = asyncio.run(cache.fetch_all([file_info("F1"), file_info("F2")]))
+
+    # above the budget, but both are used by the agent run
+    assert all(os.path.exists(path) for path in paths)
+    cache.release(paths)
+    asyncio.run(cache.evict())
+    assert sum(os.path.exists(path) for path in paths) == 1
+
+
+def test_files_pinned_by_another_process_are_not_evicted(tmp_path):
+    bodies = {"F1": b"a" * 600, "F2": b"b" * 600}
+    # e.g. two uvicorn workers on the same download directory
+    agent_worker = new_cache(tmp_path, bodies, max_bytes=1000)
+    other_worker = new_cache(tmp_path, bodies, max_bytes=1000)
+    first = asyncio.run(agent_worker.fetch(file_info("F1")))
+    os.utime(first, (0, 0))
+
+    second = asyncio.run(other_worker.fetch(file_info("F2")))
+
+    assert os.path.exists(first)
+    assert os.path.exists(second)
+    agent_worker.release([first])
+    other_worker.release([second])
+    asyncio.run(other_worker.evict())
+    assert not os.path.exists(first)
+    assert os.path.exists(second)
+
+
+def test_eviction_tolerates_files_removed_by_another_process(tmp_path):
+    cache = new_cache(tmp_path, {"F1": b"a" * 600}, max_bytes=1000)
+    path = asyncio.run(cache.fetch(file_info("F1")))
+    cache.release([path])
+    object_path = os.path.join(cache.objects_dir, os.listdir(cache.objects_dir)[0])
+    os.remove(path)
+
+    assert cache._remove_object(object_path, [path])
+    assert not os.path.exists(object_path)
+    assert cache._remove_object(object_path, [path])
@@ -0,0 +1,146 @@
+import httpx
+import openai
+import pytest
+from langchain_core.documents import Document
+
+from llm import embedding_scheduler
+from llm.embedding_scheduler import (
+    EmbeddingScheduler,
+    TokenBucket,
+    is_retryable,
+    token_batches,
+)
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/embeddings")
+
+
+def status_error(status_code: int) -> openai.APIStatusError:
+    response = httpx.Response(status_code, request=REQUEST)
+    return openai.APIStatusError("error", response=response, body=None)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(embedding_scheduler.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(embedding_scheduler.time, "sleep", clock.sleep)
+    return clock
+
+
+@pytest.fixture
+def word_tokens(monkeypatch):
+    # independent of the tiktoken download
+    monkeypatch.setattr(
+        embedding_scheduler, "count_tokens", lambda text: len(text.split())
+    )
+
+
+def test_token_bucket_waits_for_the_refill(clock):
+    bucket = TokenBucket(60)
+
+    bucket.acquire(60)
+    assert clock.sleeps == []
+    bucket.acquire(30)
+    assert clock.sleeps == [pytest.approx(30)]
+
+
+def test_token_bucket_amount_above_capacity_waits_for_a_full_bucket(clock):
+    bucket = TokenBucket(60)
+    bucket.acquire(10)
+
+    bucket.acquire(100)
+    assert sum(clock.sleeps) == pytest.approx(10)
+    # the debt is paid off before the next acquire
+    bucket.acquire(1)
+    assert sum(clock.sleeps) == pytest.approx(51)
+
+
+def test_token_batches_split_by_tokens_and_inputs(word_tokens):
+    documents = [Document(page_content="word " * count) for count in (3, 3, 3, 1, 1)]
+    ids = [str(index) for index in range(len(documents))]
+
+    batches = list(token_batches(documents, ids, max_tokens=6, max_inputs=2))
+
+    assert [batch.ids for batch in batches] == [["0", "1"], ["2", "3"], ["4"]]
+    assert [batch.tokens for batch in batches] == [6, 4, 1]
+
+
+def test_token_batches_document_above_the_limit_is_a_batch_of_its_own(word_tokens):
+    documents = [Document(page_content=text) for text in ("a", "b " * 10, "c")]
+
+    batches = list(token_batches(documents, ["0", "1", "2"], max_tokens=5))
+
+    assert [batch.ids for batch in batches] == [["0"], ["1"], ["2"]]
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        openai.APIConnectionError(request=REQUEST),
+        openai.APITimeoutError(request=REQUEST),
+        httpx.ConnectError("refused"),
+        TimeoutError(),
+        status_error(429),
+        status_error(503),
+    ],
+)
+def test_transient_errors_are_retried(error):
+    assert is_retryable(error)
+
+
+@pytest.mark.parametrize(
+    "error",
+    [status_error(400), status_error(401), ValueError("bad input"), KeyError("data")],
+)
+def test_other_errors_are_not_retried(error):
+    assert not is_retryable(error)
+
+
+class FlakyEmbeddings:
+    def __init__(self, error: Exception):
+        self.error = error
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        if self.calls == 1:
+            raise self.error
+        return [[float(len(text))] for text in texts]
+
+
+def test_scheduler_retries_transient_errors(clock, word_tokens):
+    embeddings = FlakyEmbeddings(status_error(429))
+    stored = []
+
+    embedded = EmbeddingScheduler(embeddings, concurrency=1).embed_into(
+        [Document(page_content="one two")],
+        ["0"],
+        sink=lambda **batch: stored.append(batch),
+    )
+
+    assert embedded == 1
+    assert embeddings.calls == 2
+    assert stored[0]["embeddings"] == [[7.0]]
+
+
+def test_scheduler_raises_other_errors(clock, word_tokens):
+    embeddings = FlakyEmbeddings(ValueError("bad input"))
+
+    with pytest.raises(ValueError):
+        EmbeddingScheduler(embeddings, concurrency=1).embed_into(
+            [Document(page_content="one two")], ["0"], sink=lambda **batch: None
+        )
+    assert embeddings.calls == 1
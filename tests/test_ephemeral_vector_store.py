@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from llm.vectorstores.ephemeral import (
+    EphemeralVectorStore,
+    EphemeralVectorStoreRegistry,
+)
+
+
+class LetterEmbeddings:
+    """
+    Counts of the letters a-e, texts sharing letters are similar
+    """
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        return [float(text.count(letter)) for letter in "abcde"]
+
+
+def new_store(texts) -> EphemeralVectorStore:
+    return EphemeralVectorStore.from_texts(
+        texts, LetterEmbeddings(), metadatas=[{"index": i} for i in range(len(texts))]
+    )
+
+
+def test_top_k_is_ordered_by_cosine_similarity():
+    store = new_store(["aaaa", "aab", "abc", "ddd", "eee", "aaab"])
+
+    results = store.similarity_search_with_score("aa", k=3)
+
+    assert [document.page_content for document, _ in results] == ["aaaa", "aaab", "aab"]
+    assert [score for _, score in results] == sorted(
+        [score for _, score in results], reverse=True
+    )
+    assert results[0][1] == pytest.approx(1.0)
+
+
+def test_top_k_matches_a_full_sort():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(500, 16))
+    store = EphemeralVectorStore(LetterEmbeddings())
+    store.add_embeddings([str(index) for index in range(500)], vectors.tolist())
+    query = rng.normal(size=16)
+
+    results = store.similarity_search_by_vector(query.tolist(), k=10)
+
+    similarities = vectors @ query / np.linalg.norm(vectors, axis=1)
+    expected = [str(index) for index in np.argsort(-similarities)[:10]]
+    assert [document.page_content for document in results] == expected
+
+
+def test_k_above_the_number_of_documents_returns_all():
+    store = new_store(["a", "b"])
+
+    assert len(store.similarity_search("a", k=10)) == 2
+    assert EphemeralVectorStore(LetterEmbeddings()).similarity_search("a") == []
+
+
+def test_registry_evicts_least_recently_used_above_the_budget():
+    first, second, third = (new_store(["a" * 100]) for _ in range(3))
+    registry = EphemeralVectorStoreRegistry(ttl_seconds=60, max_bytes=2 * first.nbytes)
+    registry.put("first", first)
+    registry.put("second", second)
+    # used again, so second is the least recently used one
+    assert registry.get("first") is first
+
+    registry.put("third", third)
+
+    assert registry.get("second") is None
+    assert registry.get("first") is first
+    assert registry.get("third") is third
+
+
+def test_registry_drops_expired_stores():
+    registry = EphemeralVectorStoreRegistry(ttl_seconds=-1)
+    registry.put("first", new_store(["a"]))
+
+    assert registry.get("first") is None
@@ -0,0 +1,127 @@
+import asyncio
+
+from slack_bot.feedback import FeedbackPipeline
+
+
+class FakeHistories:
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.calls = []
+
+    async def __call__(self, channel_id: str):
+        self.calls.append(channel_id)
+        if channel_id in self.failing:
+            raise RuntimeError("slack unreachable")
+        return [{"text": f"history of {channel_id}"}]
+
+
+def new_pipeline(histories, **kwargs) -> FeedbackPipeline:
+    pipeline = FeedbackPipeline(histories, **kwargs)
+    pipeline.sent = []
+    # instead of langfuse
+    pipeline._send = lambda batch: pipeline.sent.append(batch)
+    return pipeline
+
+
+def rating(id: str, channel_id=None) -> dict:
+    return {
+        "id": id,
+        "name": "rating",
+        "message_text": "answer",
+        "value": 1,
+        "comment": "",
+        "metadata": {},
+        "channel_id": channel_id,
+    }
+
+
+def test_full_batch_is_flushed_with_one_history_fetch_per_channel():
+    histories = FakeHistories(failing={"C2"})
+    pipeline = new_pipeline(histories, batch_size=3, flush_interval=60)
+
+    async def run():
+        await pipeline.start()
+        for feedback in [rating("1", "C1"), rating("2", "C1"), rating("3", "C2")]:
+            assert pipeline.submit(feedback)
+        for _ in range(100):
+            if pipeline.sent:
+                break
+            await asyncio.sleep(0.01)
+        await pipeline.stop()
+
+    asyncio.run(run())
+
+    assert len(pipeline.sent) == 1
+    batch = pipeline.sent[0]
+    assert [feedback["id"] for feedback in batch] == ["1", "2", "3"]
+    assert sorted(histories.calls) == ["C1", "C2"]
+    assert batch[0]["metadata"]["chat_history"] == [{"text": "history of C1"}]
+    # the rating is still sent without the history of an unreachable channel
+    assert "chat_history" not in batch[2]["metadata"]
+
+
+def test_partial_batch_is_flushed_after_the_interval():
+    pipeline = new_pipeline(FakeHistories(), batch_size=50, flush_interval=0.05)
+
+    async def run():
+        await pipeline.start()
+        pipeline.submit(rating("1"))
+        await asyncio.sleep(0.2)
+        sent = list(pipeline.sent)
+        await pipeline.stop()
+        return sent
+
+    sent = asyncio.run(run())
+
+    assert [[feedback["id"] for feedback in batch] for batch in sent] == [["1"]]
+
+
+def test_stop_flushes_buffered_ratings():
+    pipeline = new_pipeline(FakeHistories(), batch_size=50, flush_interval=60)
+
+    async def run():
+        await pipeline.start()
+        pipeline.submit(rating("1"))
+        pipeline.submit(rating("2"))
+        await pipeline.stop()
+
+    asyncio.run(run())
+
+    assert [feedback["id"] for batch in pipeline.sent for feedback in batch] == [
+        "1",
+        "2",
+    ]
+
+
+def test_stop_flushes_the_batch_taken_off_the_queue():
+    pipeline = new_pipeline(FakeHistories(), batch_size=50, flush_interval=60)
+
+    async def run():
+        await pipeline.start()
+        pipeline.submit(rating("1"))
+        # _run takes the rating and waits for more to fill the batch
+        for _ in range(100):
+            if pipeline._queue.empty():
+                break
+            await asyncio.sleep(0.01)
+        assert pipeline._queue.empty()
+        await pipeline.stop()
+
+    asyncio.run(run())
+
+    assert [[feedback["id"] for feedback in batch] for batch in pipeline.sent] == [
+        ["1"]
+    ]
+
+
+def test_full_queue_drops_ratings():
+    pipeline = new_pipeline(FakeHistories(), max_size=1)
+
+    async def run():
+        await pipeline.start()
+        # the flush task has not run yet, the first rating is still queued
+        accepted = [pipeline.submit(rating("1")), pipeline.submit(rating("2"))]
+        await pipeline.stop()
+        return accepted
+
+    assert asyncio.run(run()) == [True, False]
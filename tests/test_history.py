@@ -0,0 +1,49 @@
+import asyncio
+
+from sqlalchemy.exc import OperationalError
+
+from slack_bot.history import SlackHistoryStore
+
+
+class UnreachableBacking:
+    def fail(self, *args):
+        raise OperationalError("SELECT 1", {}, Exception("connection refused"))
+
+    save = delete = load = mark_synced = fail
+
+
+class FakeSlackClient:
+    def __init__(self, messages):
+        self.messages = messages
+        self.calls = 0
+
+    async def conversations_history(self, channel: str, limit: int):
+        self.calls += 1
+        return {"messages": self.messages, "has_more": False}
+
+
+def message_event(ts: str, text: str) -> dict:
+    return {"type": "message", "channel": "C1", "ts": ts, "text": text}
+
+
+def test_events_are_served_from_memory_while_the_backing_is_down():
+    client = FakeSlackClient([{"ts": "1.0", "text": "synced"}])
+    store = SlackHistoryStore(client, backing=UnreachableBacking())
+
+    async def run():
+        await store.record_event(message_event("2.0", "hello"))
+        await store.record_event(message_event("3.0", "world"))
+        await store.record_event(
+            {
+                "type": "message",
+                "subtype": "message_deleted",
+                "channel": "C1",
+                "deleted_ts": "3.0",
+            }
+        )
+        return await store.latest("C1", 10)
+
+    messages = asyncio.run(run())
+
+    assert [message["text"] for message in messages] == ["hello", "synced"]
+    assert client.calls == 1
@@ -0,0 +1,84 @@
+import os
+
+import pytest
+from sqlalchemy import text
+
+from llm.vectorstores.pgvector.data_model import (
+    get_document_table,
+    hybrid_search_parameters,
+    hybrid_search_query,
+    text_search_statements,
+)
+
+# a postgres database with the vector extension, the ranking tests are skipped without one
+TEST_CONNECTION_STRING = os.getenv("TEST_CONNECTION_STRING")
+
+
+def test_document_table_and_statements_use_the_same_text_search_index():
+    table = get_document_table("acme", "wiki").__table__
+    index_name = "document_table__acme_wiki_content_tsv_idx"
+
+    assert index_name in {index.name for index in table.indexes}
+    assert f'"{index_name}"' in text_search_statements(table.name, "content")[1]
+
+
+def test_hybrid_search_query_fuses_all_sources():
+    query = hybrid_search_query(
+        [("document_a", "content", "", None), ("document_b", "content", "", "halfvec")]
+    )
+
+    assert query.count("UNION ALL") == 2
+    assert ":rerank_candidates" in query
+    assert "FULL OUTER JOIN keyword" in query
+
+
+@pytest.fixture
+def connection():
+    if not TEST_CONNECTION_STRING:
+        pytest.skip("TEST_CONNECTION_STRING not set")
+    from llm.database import get_engine
+
+    with get_engine(TEST_CONNECTION_STRING).connect() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        conn.execute(
+            text(
+                "CREATE TEMPORARY TABLE hybrid_test (content text, context_data jsonb, "
+                "embeddings vector(3), content_tsv tsvector GENERATED ALWAYS AS "
+                "(to_tsvector('english', coalesce(content, ''))) STORED)"
+            )
+        )
+        yield conn
+        conn.rollback()
+
+
+def test_rows_ranked_by_both_searches_come_first(connection):
+    rows = [
+        # nearest, but without the keyword
+        ("paraphrase of the question", [1.0, 0.0, 0.0]),
+        # second nearest and the best keyword match
+        ("invoice INV-4711, see INV-4711", [0.9, 0.1, 0.0]),
+        # keyword only
+        ("appendix to INV-4711", [0.0, 0.0, 1.0]),
+        # third nearest, without the keyword
+        ("unrelated", [0.5, 0.5, 0.0]),
+    ]
+    for content, embedding in rows:
+        connection.execute(
+            text(
+                "INSERT INTO hybrid_test (content, context_data, embeddings) "
+                "VALUES (:content, '{}', CAST(:embedding AS vector))"
+            ),
+            {"content": content, "embedding": str(embedding)},
+        )
+
+    results = connection.execute(
+        text(hybrid_search_query([("hybrid_test", "content", "", None)])),
+        hybrid_search_parameters("INV-4711", [1.0, 0.0, 0.0], k=3, candidates=3),
+    ).fetchall()
+
+    assert [row.content for row in results] == [
+        "invoice INV-4711, see INV-4711",
+        "paraphrase of the question",
+        "appendix to INV-4711",
+    ]
+    assert results[0].score > results[1].score > results[2].score
@@ -0,0 +1,60 @@
+import socket
+import asyncio
+import threading
+
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+from prometheus_client import REGISTRY
+
+from benchmarks.load_test.fake_openai import FakeOpenAIConfig, new_fake_openai_app
+from benchmarks.load_test.run import start_site
+from llm.callbacks.metrics import METRICS_CALLBACK_HANDLER, token_usage
+from llm.config import new_gpt_4_chat_model
+
+
+def tokens(model: str, kind: str) -> float:
+    return (
+        REGISTRY.get_sample_value(
+            "aishe_llm_tokens_total", {"model": model, "kind": kind}
+        )
+        or 0
+    )
+
+
+def start_fake_openai() -> str:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    config = FakeOpenAIConfig(chat_latency=0, token_latency=0)
+    asyncio.run_coroutine_threadsafe(
+        start_site(new_fake_openai_app(config), port), loop
+    ).result()
+    return f"http://127.0.0.1:{port}/v1"
+
+
+def test_token_usage_of_streamed_messages():
+    message = AIMessage(
+        content="hi",
+        usage_metadata={"input_tokens": 7, "output_tokens": 3, "total_tokens": 10},
+    )
+    response = LLMResult(generations=[[ChatGeneration(message=message)]])
+
+    assert token_usage(response) == {"prompt_tokens": 7, "completion_tokens": 3}
+
+
+def test_streaming_chat_model_counts_tokens(monkeypatch):
+    openai_url = start_fake_openai()
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("OPENAI_API_BASE", openai_url)
+    monkeypatch.setenv("OPENAI_BASE_URL", openai_url)
+    prompt_before = tokens("gpt-4o", "prompt_tokens")
+    completion_before = tokens("gpt-4o", "completion_tokens")
+
+    new_gpt_4_chat_model().invoke(
+        "hello", config={"callbacks": [METRICS_CALLBACK_HANDLER]}
+    )
+
+    assert tokens("gpt-4o", "prompt_tokens") > prompt_before
+    assert tokens("gpt-4o", "completion_tokens") > completion_before
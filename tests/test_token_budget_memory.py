@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+
+from llm.memory import token_budget_memory
+from llm.memory.token_budget_memory import TokenBudgetMemory
+
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    # one token per word, independent of the tiktoken download
+    monkeypatch.setattr(
+        token_budget_memory,
+        "count_tokens",
+        lambda messages, model_name: sum(
+            len(str(message.content).split()) for message in messages
+        ),
+    )
+
+
+def new_memory(max_token_limit: int, summary_llm=None) -> TokenBudgetMemory:
+    memory = TokenBudgetMemory(max_token_limit=max_token_limit, summary_llm=summary_llm)
+    memory.chat_memory.messages = [
+        HumanMessage(content="one two three"),
+        AIMessage(content="four five"),
+        HumanMessage(content="six seven eight nine"),
+        AIMessage(content="ten"),
+    ]
+    return memory
+
+
+def test_oldest_messages_are_pruned_until_the_buffer_fits():
+    memory = new_memory(max_token_limit=5)
+
+    pruned = asyncio.run(memory.aprune())
+
+    assert [message.content for message in pruned] == ["one two three", "four five"]
+    assert [message.content for message in memory.chat_memory.messages] == [
+        "six seven eight nine",
+        "ten",
+    ]
+    assert memory.summary == ""
+
+
+def test_buffer_within_the_budget_is_kept():
+    memory = new_memory(max_token_limit=100)
+
+    assert asyncio.run(memory.aprune()) == []
+    assert len(memory.chat_memory.messages) == 4
+
+
+def buffer_tokens(memory: TokenBudgetMemory) -> int:
+    return token_budget_memory.count_tokens(memory.buffer_messages(), memory.model_name)
+
+
+def test_pruned_messages_are_summarized_within_the_budget():
+    summary_llm = FakeListChatModel(responses=["greeting", "greeting and numbers"])
+    memory = new_memory(max_token_limit=9, summary_llm=summary_llm)
+
+    pruned = asyncio.run(memory.aprune())
+    messages = memory.load_memory_variables({})["chat_history"]
+
+    # the first summary pushed the buffer over the budget again, so more turns went
+    # into the second one
+    assert [message.content for message in pruned] == [
+        "one two three",
+        "four five",
+        "six seven eight nine",
+    ]
+    assert memory.summary == "greeting and numbers"
+    assert [message.content for message in messages] == [
+        "Summary of the earlier conversation: greeting and numbers",
+        "ten",
+    ]
+    assert buffer_tokens(memory) <= memory.max_token_limit
+
+
+def test_summary_above_the_budget_is_truncated():
+    summary_llm = FakeListChatModel(responses=[" ".join(["word"] * 50)])
+    memory = new_memory(max_token_limit=8, summary_llm=summary_llm)
+
+    asyncio.run(memory.aprune())
+
+    assert memory.chat_memory.messages == []
+    assert buffer_tokens(memory) == memory.max_token_limit
@@ -0,0 +1,69 @@
+import asyncio
+
+import aiohttp
+
+from slack_bot.users import SlackUserCache
+
+
+class FakeSlackClient:
+    def __init__(self, auth_errors: int, users_info_errors: int = 0):
+        self.auth_errors = auth_errors
+        self.auth_calls = 0
+        self.users_info_errors = users_info_errors
+        self.users_info_calls = 0
+
+    async def auth_test(self):
+        self.auth_calls += 1
+        if self.auth_calls <= self.auth_errors:
+            raise aiohttp.ClientConnectionError("slack unreachable")
+        return {"user_id": "UBOT"}
+
+    async def users_list(self, cursor=None, limit=200):
+        raise asyncio.TimeoutError()
+
+    async def users_info(self, user):
+        self.users_info_calls += 1
+        if self.users_info_calls <= self.users_info_errors:
+            raise aiohttp.ClientConnectionError("slack unreachable")
+        return {"user": {"id": user, "is_bot": False, "profile": {"real_name": user}}}
+
+
+def test_start_survives_unreachable_slack_and_resolves_the_bot_later():
+    client = FakeSlackClient(auth_errors=1)
+    cache = SlackUserCache(client, "aishe", negative_ttl_seconds=0)
+
+    async def run():
+        await cache.start()
+        assert not cache.bot_user_id_resolved
+        return await cache.is_bot_mentioned(["UBOT"])
+
+    assert asyncio.run(run())
+    assert cache.bot_user_id_resolved
+    assert client.auth_calls == 2
+
+
+def test_failed_resolve_is_not_retried_within_the_negative_ttl():
+    client = FakeSlackClient(auth_errors=1)
+    cache = SlackUserCache(client, "aishe", negative_ttl_seconds=300)
+
+    async def run():
+        await cache.start()
+        return await asyncio.gather(*[cache.resolve_bot_user_id() for _ in range(3)])
+
+    assert asyncio.run(run()) == [False] * 3
+    assert client.auth_calls == 1
+
+
+def test_unreachable_users_info_is_not_cached():
+    client = FakeSlackClient(auth_errors=1, users_info_errors=1)
+    cache = SlackUserCache(client, "aishe", negative_ttl_seconds=300)
+
+    async def run():
+        first = await cache.get_users(["U1"])
+        second = await cache.get_users(["U1"])
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == {"U1": None}
+    assert second["U1"]["id"] == "U1"
+    assert client.users_info_calls == 2